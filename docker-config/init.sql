@@ -1,5 +1,11 @@
+-- Multiusuário: toda tabela com dados do usuário tem user_id (id externo, ex.: o dono da sessão)
+-- e índices começando por user_id, para que cada consulta custe O(dados do usuário).
+-- btree_gist permite combinar user_id (igualdade) com ranges nos índices GiST da agenda.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 CREATE TABLE IF NOT EXISTS categories (
   id           SERIAL PRIMARY KEY,
+  user_id      TEXT,                             -- NULL = categoria padrão, visível a todos
   name         VARCHAR(64) NOT NULL,             
   description  TEXT,
   created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()                        
@@ -12,6 +18,7 @@ CREATE TABLE IF NOT EXISTS transaction_types (
 
 CREATE TABLE IF NOT EXISTS transactions (
   id             BIGSERIAL PRIMARY KEY,
+  user_id        TEXT NOT NULL,
   amount         NUMERIC(14,2) NOT NULL , 	
   type           INT REFERENCES transaction_types(id) NOT NULL DEFAULT 2,          
   category_id    INT REFERENCES categories(id) ON DELETE SET NULL,
@@ -21,29 +28,89 @@ CREATE TABLE IF NOT EXISTS transactions (
   source_text    TEXT NOT NULL                                        
 );
 
--- Índices úteis para consultas comuns
-CREATE INDEX IF NOT EXISTS idx_transactions_occurred_at
-  ON transactions (occurred_at DESC);
+-- Índices úteis para consultas comuns (todas as tools filtram por user_id)
+CREATE INDEX IF NOT EXISTS idx_transactions_user_time
+  ON transactions (user_id, occurred_at DESC);
 
 CREATE INDEX IF NOT EXISTS idx_transactions_category_time
-  ON transactions (category_id, occurred_at DESC);
+  ON transactions (user_id, category_id, occurred_at DESC);
 
 CREATE INDEX IF NOT EXISTS idx_transactions_localday
-  ON transactions ( ((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date) );
+  ON transactions (user_id, ((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date));
+
+-- Varreduras por tempo de todos os usuários (arquivamento, manutenção)
+CREATE INDEX IF NOT EXISTS idx_transactions_occurred_at
+  ON transactions (occurred_at DESC);
 
 CREATE TABLE IF NOT EXISTS events (
   id           BIGSERIAL PRIMARY KEY,
+  user_id      TEXT NOT NULL,
   title        TEXT NOT NULL,                                          
   start_time   TIMESTAMPTZ NOT NULL,                                   
   end_time     TIMESTAMPTZ,                                            
+  -- Intervalo ocupado pelo evento: [início, fim) ou o instante [início, início] quando não há fim
+  span         TSTZRANGE GENERATED ALWAYS AS (
+                 CASE WHEN end_time IS NULL OR end_time = start_time
+                      THEN tstzrange(start_time, start_time, '[]')
+                      ELSE tstzrange(start_time, end_time, '[)')
+                 END
+               ) STORED,
   location     TEXT,
   notes        TEXT,
+  cancelled_at TIMESTAMPTZ,
   recorded_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),                     
-  source_text  TEXT NOT NULL                                           
+  source_text  TEXT NOT NULL,
+  CHECK (end_time IS NULL OR end_time >= start_time)
 );
 
 CREATE INDEX IF NOT EXISTS idx_events_start_time
-  ON events (start_time DESC);
+  ON events (user_id, start_time DESC);
+
+-- Consultas de sobreposição (user_id = ? AND span && janela) usam este índice em vez de varrer a tabela
+CREATE INDEX IF NOT EXISTS idx_events_span
+  ON events USING GIST (user_id, span)
+  WHERE cancelled_at IS NULL;
+
+-- Opcional: impedir no próprio banco que dois eventos ativos do mesmo usuário se sobreponham
+-- ALTER TABLE events ADD CONSTRAINT events_no_overlap
+--   EXCLUDE USING GIST (user_id WITH =, span WITH &&) WHERE (cancelled_at IS NULL);
+
+-- Compromissos recorrentes: uma linha por série; as ocorrências são expandidas sob demanda na aplicação
+CREATE TABLE IF NOT EXISTS event_series (
+  id             BIGSERIAL PRIMARY KEY,
+  user_id        TEXT NOT NULL,
+  title          TEXT NOT NULL,
+  dtstart        TIMESTAMPTZ NOT NULL,                               -- primeira ocorrência
+  duration       INTERVAL NOT NULL DEFAULT INTERVAL '1 hour',
+  freq           TEXT NOT NULL CHECK (freq IN ('DAILY', 'WEEKLY', 'MONTHLY')),
+  freq_interval  INT NOT NULL DEFAULT 1 CHECK (freq_interval > 0),
+  by_weekday     SMALLINT[],                                         -- 0=segunda ... 6=domingo
+  until          TIMESTAMPTZ,
+  count          INT CHECK (count IS NULL OR count > 0),
+  -- Período em que a série pode ter ocorrências; sem until fica aberto à direita
+  active_span    TSTZRANGE GENERATED ALWAYS AS (tstzrange(dtstart, until, '[]')) STORED,
+  location       TEXT,
+  notes          TEXT,
+  cancelled_at   TIMESTAMPTZ,
+  recorded_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  source_text    TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_series_active_span
+  ON event_series USING GIST (user_id, active_span)
+  WHERE cancelled_at IS NULL;
+
+-- Exceções por ocorrência (cancelada ou remarcada), identificadas pelo início original
+CREATE TABLE IF NOT EXISTS event_exceptions (
+  series_id       BIGINT NOT NULL REFERENCES event_series(id) ON DELETE CASCADE,
+  user_id         TEXT NOT NULL,
+  original_start  TIMESTAMPTZ NOT NULL,
+  cancelled       BOOLEAN NOT NULL DEFAULT FALSE,
+  new_start       TIMESTAMPTZ,
+  new_end         TIMESTAMPTZ,
+  title           TEXT,
+  PRIMARY KEY (series_id, original_start)
+);
 
 INSERT INTO transaction_types (type) VALUES
   ('INCOME'),
@@ -63,3 +130,166 @@ INSERT INTO categories (name) VALUES
   ('investimento'),
   ('presente'),
   ('outros');
+
+-- =====================================================================
+-- Variante particionada de transactions (RANGE mensal por occurred_at)
+-- ---------------------------------------------------------------------
+-- Cada mês local (America/Sao_Paulo) vira uma partição, então consultas com
+-- filtro em occurred_at só leem os meses envolvidos (poda de partições) e
+-- arquivar histórico antigo é um DETACH/DROP de partição em vez de DELETE.
+--
+-- Para ativar num banco existente (ou logo após o init), execute:
+--   SELECT migrate_transactions_to_partitioned();
+-- e agende a criação de partições futuras, por exemplo com pg_cron:
+--   SELECT cron.schedule('transactions-partitions', '0 3 1 * *',
+--                        $$SELECT ensure_transactions_partitions(CURRENT_DATE, 3)$$);
+-- A aplicação também chama ensure_transactions_partitions ao detectar a
+-- virada de mês (TRANSACTIONS_PARTITIONED=1).
+-- =====================================================================
+
+CREATE OR REPLACE FUNCTION ensure_transactions_partitions(p_from DATE, p_months_ahead INT DEFAULT 3)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+  m        DATE := date_trunc('month', p_from)::date;
+  last_m   DATE := (date_trunc('month', p_from) + make_interval(months => p_months_ahead))::date;
+  created  INT := 0;
+  part     TEXT;
+BEGIN
+  WHILE m <= last_m LOOP
+    part := format('transactions_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF transactions FOR VALUES FROM (%L) TO (%L)',
+        part,
+        (m::timestamp AT TIME ZONE 'America/Sao_Paulo'),
+        ((m + INTERVAL '1 month')::timestamp AT TIME ZONE 'America/Sao_Paulo')
+      );
+      created := created + 1;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION migrate_transactions_to_partitioned(p_months_ahead INT DEFAULT 3)
+RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+  first_day DATE;
+  moved     BIGINT;
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'transactions'::regclass) THEN
+    RAISE NOTICE 'transactions já é particionada';
+    RETURN 0;
+  END IF;
+
+  LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE;
+  ALTER TABLE transactions RENAME TO transactions_legacy;
+  ALTER INDEX IF EXISTS idx_transactions_user_time RENAME TO idx_transactions_legacy_user_time;
+  ALTER INDEX IF EXISTS idx_transactions_occurred_at RENAME TO idx_transactions_legacy_occurred_at;
+  ALTER INDEX IF EXISTS idx_transactions_category_time RENAME TO idx_transactions_legacy_category_time;
+  ALTER INDEX IF EXISTS idx_transactions_localday RENAME TO idx_transactions_legacy_localday;
+
+  -- A chave primária precisa conter a chave de partição; o id segue vindo da mesma sequence
+  CREATE TABLE transactions (
+    id             BIGINT NOT NULL DEFAULT nextval('transactions_id_seq'),
+    user_id        TEXT NOT NULL,
+    amount         NUMERIC(14,2) NOT NULL,
+    type           INT REFERENCES transaction_types(id) NOT NULL DEFAULT 2,
+    category_id    INT REFERENCES categories(id) ON DELETE SET NULL,
+    description    TEXT,
+    payment_method VARCHAR(32),
+    occurred_at    TIMESTAMPTZ NOT NULL,
+    source_text    TEXT NOT NULL,
+    PRIMARY KEY (id, occurred_at)
+  ) PARTITION BY RANGE (occurred_at);
+  ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id;
+
+  -- Índices no pai são criados em cada partição (atual e futuras)
+  CREATE INDEX idx_transactions_user_time ON transactions (user_id, occurred_at DESC);
+  CREATE INDEX idx_transactions_category_time ON transactions (user_id, category_id, occurred_at DESC);
+  CREATE INDEX idx_transactions_localday
+    ON transactions (user_id, ((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date));
+  CREATE INDEX idx_transactions_occurred_at ON transactions (occurred_at DESC);
+
+  -- Partição DEFAULT só como rede de segurança; mantenha-a vazia criando os meses antes
+  CREATE TABLE transactions_default PARTITION OF transactions DEFAULT;
+
+  SELECT COALESCE(MIN((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date), CURRENT_DATE)
+    INTO first_day FROM transactions_legacy;
+  PERFORM ensure_transactions_partitions(
+    first_day,
+    ((EXTRACT(YEAR FROM age(date_trunc('month', CURRENT_DATE), date_trunc('month', first_day))) * 12
+      + EXTRACT(MONTH FROM age(date_trunc('month', CURRENT_DATE), date_trunc('month', first_day))))::INT
+      + p_months_ahead)
+  );
+
+  INSERT INTO transactions
+    (id, user_id, amount, type, category_id, description, payment_method, occurred_at, source_text)
+  SELECT id, user_id, amount, type, category_id, description, payment_method, occurred_at, source_text
+  FROM transactions_legacy;
+  GET DIAGNOSTICS moved = ROW_COUNT;
+  ANALYZE transactions;
+  -- transactions_legacy é mantida para conferência; remova com DROP TABLE quando validado
+  RETURN moved;
+END;
+$$;
+
+-- =====================================================================
+-- Perfil de índices BRIN para históricos grandes
+-- ---------------------------------------------------------------------
+-- As transações chegam quase sempre em ordem de occurred_at, então um BRIN
+-- (min/max por bloco de páginas) filtra intervalos de tempo com um índice de
+-- poucos KB, no lugar das B-trees que crescem com a tabela e custam escrita
+-- a cada add_transaction.
+--
+-- As tools filtram sempre por user_id + intervalo de occurred_at, caminho da
+-- idx_transactions_user_time. No perfil 'brin' ela (com a B-tree global de
+-- tempo e idx_transactions_localday) dá lugar a um BRIN em
+-- (user_id, occurred_at): cada coluna tem seu min/max por bloco, o intervalo
+-- de tempo poda os blocos e user_id é conferido na leitura. Compensa quando
+-- cada shard guarda poucos usuários (assessor pessoal, shard por usuário);
+-- com muitos usuários intercalados no mesmo shard, o BRIN lê as linhas de
+-- todos no intervalo e o perfil 'btree' é o adequado.
+-- idx_transactions_category_time (filtro por categoria) é mantida.
+--
+--   SELECT set_transactions_index_profile('brin');   -- ou 'btree' para voltar
+-- =====================================================================
+
+CREATE OR REPLACE FUNCTION set_transactions_index_profile(p_profile TEXT)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+  is_heap BOOLEAN := (SELECT relkind = 'r' FROM pg_class WHERE oid = 'transactions'::regclass);
+BEGIN
+  IF p_profile = 'brin' THEN
+    DROP INDEX IF EXISTS idx_transactions_user_time;
+    DROP INDEX IF EXISTS idx_transactions_occurred_at;
+    DROP INDEX IF EXISTS idx_transactions_localday;
+    DROP INDEX IF EXISTS idx_transactions_occurred_at_brin;
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_time_brin
+      ON transactions USING BRIN (user_id, occurred_at)
+      WITH (pages_per_range = 32, autosummarize = on);
+    -- Inserções só no fim da tabela: páginas cheias mantêm os intervalos do BRIN estreitos
+    IF is_heap THEN
+      ALTER TABLE transactions SET (fillfactor = 100);
+    END IF;
+  ELSIF p_profile = 'btree' THEN
+    DROP INDEX IF EXISTS idx_transactions_user_time_brin;
+    DROP INDEX IF EXISTS idx_transactions_occurred_at_brin;
+    CREATE INDEX IF NOT EXISTS idx_transactions_user_time
+      ON transactions (user_id, occurred_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_transactions_occurred_at
+      ON transactions (occurred_at DESC);
+    CREATE INDEX IF NOT EXISTS idx_transactions_localday
+      ON transactions (user_id, ((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date));
+    IF is_heap THEN
+      ALTER TABLE transactions RESET (fillfactor);
+    END IF;
+  ELSE
+    RAISE EXCEPTION 'perfil inválido: % (use brin ou btree)', p_profile;
+  END IF;
+END;
+$$;
@@ -6,6 +6,10 @@ from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain.memory import ChatMessageHistory
+from receitas_mongo import ao_mudar_catalogo, buscar_receitas_por_corte, versao_catalogo
+from cache_receitas import CacheContextoReceitas
+from indice_receitas import IndiceReceitas, versao_gravada
+from detector_cortes import CORTES_VALIDOS, DetectorCortes
 load_dotenv()
 
 llm = ChatGoogleGenerativeAI(
@@ -14,13 +18,12 @@ llm = ChatGoogleGenerativeAI(
     google_api_key=os.getenv("GEMINI_API_KEY"),
 )
 
-CORTES_VALIDOS = [
-    "acém", "alcatra", "capa do file", "contrafilé", "costela", "coxão duro", "coxão mole",
-    "file mignon", "fraldinha", "lagarto", "maminha", "miúdos", "musculo", "paleta",
-    "patinho", "peito", "picanha", "ponta do contrafile"
-]
 CORTES_VALIDOS_NORMALIZADOS = {c.lower().strip(): c for c in CORTES_VALIDOS}
 
+# Detecção local (Aho-Corasick + tolerância a erros de digitação); o LLM verificador fica só para conversa fiada
+detector_cortes = DetectorCortes(CORTES_VALIDOS)
+uso_verificador = {"mensagens": 0, "chamadas_llm": 0}
+
 # =========================
 # CONEXÃO COM MONGODB (RAG)
 # =========================
@@ -28,13 +31,34 @@ mongo_client = MongoClient("mongodb://localhost:27017")
 db = mongo_client["friboi_pratica"]
 receitas_collection = db["receitas_pratica"]
 
-def buscar_no_mongo(corte: str):
+def buscar_no_mongo(corte: str, n: int = 3):
     """
-    implemente essa função para retornar pelo menos 3 receitas que tenham o corte que o agente_verificador encontrou
+    Retorna as n melhores receitas (maior ranking) com o corte que o agente_verificador encontrou,
+    pelo campo normalizado corte_norm (índice corte_norm_ranking criado na ingestão).
     """
-    query = {"Corte": {"$regex": corte, "$options": "i"}}
-    docs = list(receitas_collection.find(query).limit(3))
-    return docs
+    return buscar_receitas_por_corte(receitas_collection, corte, n)
+
+# Receitas + contexto formatado por (sessão, corte); descartado quando o catálogo é reingerido.
+# Ingestão em outro processo só é vista na próxima verificação: até CATALOGO_VERIFICACAO_S segundos depois
+CATALOGO_VERIFICACAO_S = float(os.getenv("CATALOGO_VERIFICACAO_S", "30"))
+cache_contexto = CacheContextoReceitas(lambda: versao_catalogo(receitas_collection),
+                                       intervalo_verificacao_s=CATALOGO_VERIFICACAO_S)
+ao_mudar_catalogo(cache_contexto.invalidar)
+
+# Índice local (vetorial + BM25) gravado pela ingestão; só é usado se estiver na mesma versão do catálogo
+indice_local = {"gravado": versao_gravada(), "atual": IndiceReceitas.carregar()}
+
+def indice_em_dia():
+    versao = cache_contexto.versao
+    atual = indice_local["atual"]
+    if atual is None or atual.versao != versao:
+        # Só relê do disco se o índice foi regravado desde a última tentativa; senão, com o catálogo mais novo
+        # que o índice, cada mensagem releria os mesmos arquivos para descartá-los
+        gravado = versao_gravada()
+        if gravado != indice_local["gravado"]:
+            indice_local["gravado"] = gravado
+            atual = indice_local["atual"] = IndiceReceitas.carregar()
+    return atual if atual is not None and atual.versao == versao else None
     
 # =========================
 # MEMÓRIA (por sessão/agente)
@@ -139,6 +163,18 @@ def formatar_contexto_rag(docs):
         f"## Corte\n{d.get('Corte','')}"
     )
 
+def contexto_do_corte(session_id: str, corte: str, pergunta: str = "", nova_busca: bool = False):
+    """
+    (docs, contexto_rag) do corte. Num pedido novo (`nova_busca`), as receitas do corte são ordenadas pela
+    pergunta no índice local (ou vêm do Mongo, se o índice não estiver em dia); perguntas seguintes
+    reaproveitam a mesma receita, do cache da sessão.
+    """
+    def carregar():
+        indice = indice_em_dia()
+        docs = indice.buscar(pergunta, corte) if indice is not None else buscar_no_mongo(corte)
+        return docs, formatar_contexto_rag(docs)
+    return cache_contexto.obter(session_id, corte, carregar, recarregar=nova_busca)
+
 def iniciar_chat():
     print("Digite 'sair' para encerrar.\n")
     corte_detectado = None
@@ -150,17 +186,27 @@ def iniciar_chat():
             continue
         if user_input.lower() in ["sair", "exit", "quit"]:
             print("IA: Até a próxima!")
+            print(f"[verificador: {uso_verificador['chamadas_llm']} chamadas ao LLM em {uso_verificador['mensagens']} mensagens]")
+            cache_contexto.encerrar_sessao(session_id)
             break
 
         cfg = {"configurable": {"session_id": session_id}}
 
-        resposta_verificador = agente_verificador.invoke({"input": user_input}, config=cfg).strip().lower()
+        uso_verificador["mensagens"] += 1
+        corte_local = detector_cortes.detectar(user_input)
+        if corte_local is not None:
+            resposta_verificador = corte_local
+        elif corte_detectado is not None:
+            # Continuação sobre o corte atual: a resposta do verificador não seria usada
+            resposta_verificador = ""
+        else:
+            uso_verificador["chamadas_llm"] += 1
+            resposta_verificador = agente_verificador.invoke({"input": user_input}, config=cfg).strip().lower()
 
         if resposta_verificador in CORTES_VALIDOS_NORMALIZADOS:
             corte_detectado = CORTES_VALIDOS_NORMALIZADOS[resposta_verificador]
 
-            docs = buscar_no_mongo(corte_detectado)
-            contexto_rag = formatar_contexto_rag(docs)
+            docs, contexto_rag = contexto_do_corte(session_id, corte_detectado, user_input, nova_busca=True)
 
             resposta = agente_gerador.invoke(
                 {
@@ -174,8 +220,7 @@ def iniciar_chat():
             if corte_detectado is None:
                 resposta = resposta_verificador
             else:
-                docs = buscar_no_mongo(corte_detectado)
-                contexto_rag = formatar_contexto_rag(docs)
+                docs, contexto_rag = contexto_do_corte(session_id, corte_detectado, user_input)
 
                 resposta = agente_gerador.invoke(
                     {
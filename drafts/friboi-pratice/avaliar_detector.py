@@ -0,0 +1,109 @@
+"""
+Avalia o detector local de cortes (detector_cortes) no lugar da chamada ao agente_verificador.
+
+- Conversas rotuladas (nomes, sinônimos, erros de digitação, conversa fiada, cortes de outros animais):
+  acurácia por mensagem, precisão e recall das menções a cortes.
+- Títulos do catálogo cujo campo Corte é um dos CORTES_VALIDOS: o detector acha esse corte no título?
+- Fração de chamadas ao LLM verificador evitadas, simulando o laço do iniciar_chat: antes, toda mensagem
+  passava pelo LLM; agora ele só é chamado quando o detector não acha corte e a sessão ainda não tem um.
+
+Uso: python avaliar_detector.py
+"""
+import csv
+import os
+import time
+
+from detector_cortes import CORTES_VALIDOS, DetectorCortes
+from receitas_mongo import CSV_PADRAO, normalizar_cortes, normalizar_texto
+
+CONVERSAS = [
+    [("Oi, tudo bem?", None), ("Queria fazer um churrasco no domingo", None), ("Tem receita de picanha?", "picanha"),
+     ("Quanto tempo deixo na brasa?", None), ("E com sal grosso ou fino?", None)],
+    [("boa noite", None), ("quero algo com filé mignon", "file mignon"), ("pode ser ao molho madeira?", None),
+     ("e se eu trocar por alcatra?", "alcatra")],
+    [("receita de contra-filé na frigideira", "contrafilé"), ("precisa marinar?", None)],
+    [("Tem alguma coisa com fraldnha?", "fraldinha"), ("obrigado!", None)],
+    [("pikanha no forno", "picanha"), ("quantas pessoas serve?", None)],
+    [("bife ancho grelhado", "contrafilé"), ("e o ponto certo?", None)],
+    [("capa do filé assada", "capa do file"), ("com batatas?", None)],
+    [("ponta de contra filé acebolada", "ponta do contrafile")],
+    [("costelinha no bafo", "costela"), ("quanto tempo de forno?", None), ("e costela janela?", "costela")],
+    [("coxão mole para bife à milanesa", "coxão mole"), ("pode ser chã de fora?", "coxão duro")],
+    [("lagatro recheado", "lagarto"), ("com cenoura e bacon", None)],
+    [("maminha na manteiga", "maminha")],
+    [("ossobuco com polenta", "musculo"), ("musculo na pressão", "musculo")],
+    [("receita com acem", "acém"), ("pode ser na panela de pressão?", None)],
+    [("fígado acebolado", "miúdos"), ("dobradinha com feijão branco", "miúdos")],
+    [("paleta assada lentamente", "paleta"), ("patinho moído para almôndegas", "patinho")],
+    [("brisket defumado", "peito"), ("peito bovino na cerveja", "peito")],
+    [("peito de frango empanado", None), ("filé de peixe grelhado", None), ("costela de porco", None)],
+    [("que planeta lindo hoje", None), ("tô sem jeito para cozinhar", None), ("me dá uma ideia de jantar", None)],
+    [("Olá!", None), ("vocês vendem carne?", None), ("qual a melhor carne para assar?", None),
+     ("gosto de fraldinha e maminha", "fraldinha")],
+    [("chorizo na grelha", "contrafilé"), ("medalhão de mignon com bacon", "file mignon")],
+    [("picanhas para 10 pessoas", "picanha"), ("quantos quilos?", None)],
+    [("alctra ao vinho", "alcatra"), ("coxao duro cozido", "coxão duro")],
+    [("tem receita com rabada?", "miúdos"), ("e língua ao molho?", "miúdos")],
+    [("qual a língua falada no Uruguai?", None), ("tenho um carro ancho", None), ("o rabo do cachorro", None),
+     ("vi um tatu no quintal", None), ("pia de granito", None), ("meu coração está acelerado", None)],
+    [("quero peixe, filé", None), ("me passa o arquivo, file", None), ("receita de tilápia, um filé bem fino", None),
+     ("filé ao molho madeira", "file mignon"), ("filé de peixe e picanha", "picanha")],
+    [("ancho na brasa", "contrafilé"), ("tatu assado com batatas", "lagarto"), ("rim e coração de boi", "miúdos")],
+]
+
+
+def avaliar_conversas(detector: DetectorCortes) -> dict:
+    acertos = total = vp = fp = fn = 0
+    chamadas_antes = chamadas_depois = 0
+    tempos = []
+    for conversa in CONVERSAS:
+        corte_sessao = None
+        for mensagem, esperado in conversa:
+            t0 = time.perf_counter()
+            achado = detector.detectar(mensagem)
+            tempos.append((time.perf_counter() - t0) * 1e3)
+            total += 1
+            acertos += achado == esperado
+            vp += achado is not None and achado == esperado
+            fp += achado is not None and achado != esperado
+            fn += esperado is not None and achado != esperado
+
+            chamadas_antes += 1
+            if achado is None and corte_sessao is None:
+                chamadas_depois += 1  # conversa fiada: o LLM verificador ainda responde
+            corte_sessao = achado or corte_sessao
+    tempos.sort()
+    return {
+        "mensagens": total,
+        "acuracia": round(acertos / total, 3),
+        "precisao": round(vp / (vp + fp), 3) if vp + fp else 0.0,
+        "recall": round(vp / (vp + fn), 3) if vp + fn else 0.0,
+        "chamadas_llm_antes": chamadas_antes,
+        "chamadas_llm_depois": chamadas_depois,
+        "chamadas_llm_evitadas": round(1 - chamadas_depois / chamadas_antes, 3),
+        "deteccao_mediana_ms": round(tempos[len(tempos) // 2], 4),
+    }
+
+
+def avaliar_titulos(detector: DetectorCortes) -> dict:
+    validos = {normalizar_texto(c): c for c in CORTES_VALIDOS}
+    total = acertos = 0
+    if not os.path.exists(CSV_PADRAO):
+        return {"titulos": 0}
+    with open(CSV_PADRAO, encoding="utf-8-sig", newline="") as f:
+        for linha in csv.DictReader(f, delimiter=";"):
+            cortes = [validos[c] for c in normalizar_cortes(linha.get("Corte", "")) if c in validos]
+            if not cortes:
+                continue
+            total += 1
+            acertos += bool(set(cortes) & set(detector.detectar_todos(linha.get("Título", ""))))
+    return {"titulos": total, "titulos_com_corte_certo": acertos, "recall_titulos": round(acertos / total, 3) if total else 0.0}
+
+
+if __name__ == "__main__":
+    detector = DetectorCortes()
+    conversas = avaliar_conversas(detector)
+    titulos = avaliar_titulos(detector)
+    for chave, valor in {**conversas, **titulos}.items():
+        print(f"{chave:<26}{valor}")
+    assert conversas["precisao"] >= 0.95, "detector marcando cortes errados"
@@ -0,0 +1,63 @@
+"""
+Confere o upsert do CSV (receitas_mongo.ingerir_csv) numa coleção temporária, apagada no final.
+
+- Linhas com a mesma chave (título/marca/corte): fica um documento só, o da linha de maior ranking, mesmo que
+  ela venha depois no arquivo; a outra conta em "repetidas".
+- Rodar de novo não muda nada; editar o texto de uma receita conta em "atualizadas", sem duplicar.
+
+Uso: python avaliar_ingestao.py   (MONGO_URI no ambiente; padrão localhost)
+"""
+import csv
+import os
+import tempfile
+import uuid
+
+from pymongo import MongoClient
+
+from receitas_mongo import CAMPO_RANKING, CAMPOS_CURTOS, CAMPOS_TEXTO, COLECAO_META, MONGO_DB, MONGO_URI, ingerir_csv
+
+DICA_SO_TITULO = {"Título": "Cozinhe sem desperdício", "Tipo": "Dica"}
+DICA_COMPLETA = {**DICA_SO_TITULO, "Introdução": "Reaproveitar está na moda.", "Modo de preparo": "Use as sobras."}
+RECEITA = {"Título": "Picanha na brasa", "Marca": "Friboi", "Corte": "Picanha", "Tipo": "Receita",
+           "Ingredientes": "1 peça de picanha; sal grosso", "Modo de preparo": "Asse na brasa."}
+
+
+def escrever_csv(caminho: str, linhas: list):
+    with open(caminho, "w", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=CAMPOS_CURTOS + CAMPOS_TEXTO, delimiter=";", restval="")
+        escritor.writeheader()
+        escritor.writerows(linhas)
+
+
+def avaliar(collection) -> dict:
+    pasta = tempfile.mkdtemp()
+    caminho = os.path.join(pasta, "receitas.csv")
+
+    # A cópia só com o título vem antes: a linha completa (maior ranking) é a que deve ficar
+    escrever_csv(caminho, [DICA_SO_TITULO, RECEITA, DICA_COMPLETA])
+    primeira = ingerir_csv(collection, caminho)
+    assert collection.count_documents({}) == 2, "chave repetida gravou mais de um documento"
+    dica = collection.find_one({"Título": DICA_SO_TITULO["Título"]})
+    assert dica["Introdução"] == DICA_COMPLETA["Introdução"], "ficou a linha de menor ranking"
+    assert (primeira["inseridas"], primeira["atualizadas"], primeira["repetidas"]) == (2, 0, 1), primeira
+
+    segunda = ingerir_csv(collection, caminho)
+    assert (segunda["inseridas"], segunda["atualizadas"], segunda["inalteradas"]) == (0, 0, 2), segunda
+
+    escrever_csv(caminho, [DICA_COMPLETA, {**RECEITA, "Modo de preparo": "Asse na brasa e sirva quente."}])
+    editada = ingerir_csv(collection, caminho)
+    assert collection.count_documents({}) == 2, "receita editada virou duplicata"
+    assert (editada["inseridas"], editada["atualizadas"], editada["inalteradas"]) == (0, 1, 1), editada
+    return {"primeira": primeira, "segunda": segunda, "editada": editada,
+            "ranking_dica": collection.find_one({"Título": DICA_SO_TITULO["Título"]})[CAMPO_RANKING]}
+
+
+if __name__ == "__main__":
+    client = MongoClient(MONGO_URI)
+    colecao = client[MONGO_DB][f"avaliar_ingestao_{uuid.uuid4().hex[:8]}"]
+    try:
+        for etapa, valor in avaliar(colecao).items():
+            print(f"{etapa:<14}{valor}")
+    finally:
+        colecao.drop()
+        colecao.database[COLECAO_META].delete_one({"_id": colecao.name})
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+from receitas_mongo import normalizar_texto
+
+
+class CacheContextoReceitas:
+    """
+    Receitas buscadas e contexto RAG já formatado, por (sessão, corte), com limite LRU somando todas as sessões.
+
+    A versão do catálogo (marcada a cada ingestão que muda receitas) é consultada no máximo a cada
+    `intervalo_verificacao_s`; se mudou, o cache inteiro é descartado. Entre as verificações, perguntas
+    seguidas sobre o mesmo corte não vão ao Mongo.
+
+    Janela de desatualização: depois de uma ingestão feita por outro processo (notebook, `python receitas_mongo.py`),
+    o chat pode servir o contexto antigo por até `intervalo_verificacao_s`. Com 0, a versão é conferida a cada
+    pergunta. Ingestões no mesmo processo avisam na hora: `invalidar` é registrado em
+    receitas_mongo.ao_mudar_catalogo e força a próxima verificação.
+    """
+
+    def __init__(self, carregar_versao: Callable[[], str], max_entradas: int = 256, intervalo_verificacao_s: float = 30.0):
+        self._carregar_versao = carregar_versao
+        self.max_entradas = max_entradas
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._versao = None
+        self._verificado_em = float("-inf")
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def _verificar_versao(self):
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo_verificacao_s:
+            return
+        versao = self._carregar_versao()
+        with self._lock:
+            self._verificado_em = agora
+            if versao != self._versao:
+                if self._versao is not None:
+                    self.invalidacoes += 1
+                self._entradas.clear()
+                self._versao = versao
+
+    @property
+    def versao(self) -> str:
+        """Versão do catálogo vista na última verificação."""
+        self._verificar_versao()
+        return self._versao
+
+    def obter(self, session_id: str, corte: str, carregar: Callable[[], tuple], recarregar: bool = False) -> tuple:
+        """
+        (docs, contexto_rag) do corte na sessão; `carregar()` só é chamado quando não está em cache
+        ou com `recarregar` (pedido novo sobre o corte, que substitui a entrada da sessão).
+        """
+        self._verificar_versao()
+        chave = (session_id, normalizar_texto(corte))
+        with self._lock:
+            if chave in self._entradas and not recarregar:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return self._entradas[chave]
+            self.falhas += 1
+        valor = carregar()
+        with self._lock:
+            self._entradas[chave] = valor
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas.clear()
+            # Sem versão conhecida, a próxima verificação não conta esta invalidação de novo
+            self._versao = None
+            self._verificado_em = float("-inf")
+            self.invalidacoes += 1
+
+    def encerrar_sessao(self, session_id: str):
+        with self._lock:
+            for chave in [c for c in self._entradas if c[0] == session_id]:
+                del self._entradas[chave]
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "entradas": len(self._entradas),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / total, 3) if total else 0.0,
+                "invalidacoes": self.invalidacoes,
+            }
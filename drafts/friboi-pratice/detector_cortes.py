@@ -0,0 +1,195 @@
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from receitas_mongo import normalizar_texto
+
+CORTES_VALIDOS = [
+    "acém", "alcatra", "capa do file", "contrafilé", "costela", "coxão duro", "coxão mole",
+    "file mignon", "fraldinha", "lagarto", "maminha", "miúdos", "musculo", "paleta",
+    "patinho", "peito", "picanha", "ponta do contrafile"
+]
+
+# Outras formas de citar cada corte (sem acento; o plural com "s" é gerado automaticamente)
+SINONIMOS = {
+    "capa do file": ["capa de file", "capa do file mignon"],
+    "contrafilé": ["contra file", "bife de contrafile", "bife ancho", "ancho", "bife de chorizo", "chorizo", "entrecot"],
+    "costela": ["costelinha", "costela janela", "costela minga", "assado de tira", "ripa de costela"],
+    "coxão duro": ["cha de fora", "cha fora", "coxao de fora"],
+    "coxão mole": ["cha de dentro", "cha dentro", "coxao de dentro"],
+    "file mignon": ["file", "mignon", "filet mignon", "filezinho", "medalhao", "tournedos", "chateaubriand"],
+    "lagarto": ["lagarto redondo", "tatu"],
+    "miúdos": ["miudo", "figado", "coracao", "bucho", "dobradinha", "rim", "lingua", "rabada", "rabo"],
+    "musculo": ["musculo mole", "musculo duro", "ossobuco"],
+    "paleta": ["raquete", "miolo da paleta"],
+    "patinho": ["bife de patinho"],
+    "peito": ["brisket", "granito"],
+    "ponta do contrafile": ["ponta de contrafile", "ponta do contra file", "ponta de contra file"],
+}
+
+# "peito de frango", "file de peixe": o corte é citado, mas não de carne bovina
+NAO_BOVINOS = {"frango", "galinha", "peru", "pato", "porco", "suino", "leitao", "cordeiro", "carneiro", "peixe",
+               "tilapia", "salmao", "merluza", "bacalhau", "atum", "chester"}
+CONECTIVOS = {"de", "do", "da"}
+# Sinônimos que também são palavras do dia a dia ("a língua falada", "um carro ancho"): só valem como corte
+# se a mensagem tiver contexto de carne (palavra de CONTEXTO_CARNE ou outro corte não ambíguo) e não citar
+# outro animal em nenhum ponto ("quero peixe, file")
+AMBIGUOS = {"file", "ancho", "lingua", "rim", "rabo", "tatu", "granito", "coracao"}
+CONTEXTO_CARNE = {"carne", "carnes", "bife", "bifes", "boi", "bovino", "bovina", "receita", "receitas", "assado",
+                  "assada", "assar", "grelhado", "grelhada", "grelha", "grelhar", "brasa", "churrasco", "forno",
+                  "panela", "pressao", "frigideira", "molho", "cozido", "cozida", "ensopado", "acebolado",
+                  "acebolada", "refogado", "marinar", "temperar", "tempero", "defumado", "defumada", "recheado",
+                  "recheada", "espeto", "acougue", "kg", "quilo", "quilos"}
+# Palavras comuns a um erro de digitação de um corte ("planeta" ~ "paleta"); nunca viram corte por aproximação
+NAO_APROXIMAR = {"planeta", "palito", "paletas", "pratinho", "patinhos", "pratinhos", "peitoril", "leito",
+                 "jeito", "feito", "aceito", "respeito", "direito", "perfeito", "lagartixa", "maminho",
+                 "costume", "fralda", "mole", "duro", "capa", "ponta", "file"}
+
+
+def _tokens(texto: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", normalizar_texto(texto))
+
+
+def _distancia(a: str, b: str, limite: int) -> int:
+    """Distância de edição com transposição (OSA), interrompida quando passa de `limite`."""
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        atual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            custo = 0 if a[i - 1] == b[j - 1] else 1
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                atual[j] = min(atual[j], anterior2[j - 2] + 1)
+        if min(atual) > limite:
+            return limite + 1
+        anterior2, anterior = anterior, atual
+    return anterior[-1]
+
+
+def _tolerancia(tamanho: int) -> int:
+    return 0 if tamanho < 5 else 1 if tamanho < 9 else 2
+
+
+class DetectorCortes:
+    """
+    Encontra cortes bovinos numa mensagem sem chamar o LLM.
+
+    Passo exato: Aho-Corasick sobre o texto sem acento com todas as formas (nome, sinônimos, plurais),
+    aceitando só ocorrências em fronteira de palavra e ficando com a mais longa a partir de cada posição
+    ("capa do file" ganha de "file"). Passo aproximado (só se o exato não achar nada): janelas de 1 a 3
+    palavras comparadas a cada forma com distância de edição até 1 (2 para formas com 9+ letras).
+    Formas de AMBIGUOS só contam com contexto de carne na mensagem.
+    """
+
+    def __init__(self, cortes: List[str] = CORTES_VALIDOS, sinonimos: Dict[str, List[str]] = SINONIMOS):
+        self.formas: Dict[str, str] = {}
+        self.ambiguas = {forma for palavra in AMBIGUOS for forma in (palavra, palavra + "s")}
+        for corte in cortes:
+            for forma in [corte] + sinonimos.get(corte, []):
+                forma = " ".join(_tokens(forma))
+                self.formas.setdefault(forma, corte)
+                self.formas.setdefault(forma + "s", corte)
+        self._montar_automato()
+        self._por_palavras: Dict[int, List[Tuple[str, str]]] = {}
+        for forma, corte in self.formas.items():
+            self._por_palavras.setdefault(forma.count(" ") + 1, []).append((forma, corte))
+
+    def _montar_automato(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._falha: List[int] = [0]
+        self._saida: List[List[str]] = [[]]
+        for forma in self.formas:
+            estado = 0
+            for ch in forma:
+                if ch not in self._goto[estado]:
+                    self._goto.append({})
+                    self._falha.append(0)
+                    self._saida.append([])
+                    self._goto[estado][ch] = len(self._goto) - 1
+                estado = self._goto[estado][ch]
+            self._saida[estado].append(forma)
+        fila = deque(self._goto[0].values())
+        while fila:
+            estado = fila.popleft()
+            for ch, prox in self._goto[estado].items():
+                fila.append(prox)
+                f = self._falha[estado]
+                while f and ch not in self._goto[f]:
+                    f = self._falha[f]
+                self._falha[prox] = self._goto[f].get(ch, 0)
+                self._saida[prox] = self._saida[prox] + self._saida[self._falha[prox]]
+
+    def _exatos(self, texto: str) -> List[Tuple[int, int, str]]:
+        ocorrencias = []
+        estado = 0
+        for i, ch in enumerate(texto):
+            while estado and ch not in self._goto[estado]:
+                estado = self._falha[estado]
+            estado = self._goto[estado].get(ch, 0)
+            for forma in self._saida[estado]:
+                inicio, fim = i - len(forma) + 1, i + 1
+                if (inicio == 0 or texto[inicio - 1] == " ") and (fim == len(texto) or texto[fim] == " "):
+                    ocorrencias.append((inicio, fim, forma))
+        # Mais à esquerda e, empatando, mais longa; descarta as que se sobrepõem a uma já escolhida
+        ocorrencias.sort(key=lambda o: (o[0], -(o[1] - o[0])))
+        escolhidas, ate = [], -1
+        for inicio, fim, forma in ocorrencias:
+            if inicio >= ate:
+                escolhidas.append((inicio, fim, forma))
+                ate = fim
+        return escolhidas
+
+    def _aproximados(self, tokens: List[str]) -> List[Tuple[int, int, str]]:
+        achados = []
+        i = 0
+        while i < len(tokens):
+            melhor = None
+            for n in (3, 2, 1):
+                janela = tokens[i:i + n]
+                if len(janela) < n or (n == 1 and janela[0] in NAO_APROXIMAR):
+                    continue
+                texto = " ".join(janela)
+                for forma, _ in self._por_palavras.get(n, []):
+                    limite = _tolerancia(len(forma))
+                    if limite and texto[0] == forma[0] and _distancia(texto, forma, limite) <= limite:
+                        melhor = (i, i + n, forma)
+                        break
+                if melhor:
+                    break
+            if melhor:
+                achados.append(melhor)
+                i = melhor[1]
+            else:
+                i += 1
+        return achados
+
+    def _bovino(self, tokens: List[str], fim_token: int) -> bool:
+        seguintes = tokens[fim_token:fim_token + 2]
+        return not (len(seguintes) == 2 and seguintes[0] in CONECTIVOS and seguintes[1] in NAO_BOVINOS)
+
+    def detectar_todos(self, mensagem: str) -> List[str]:
+        """Cortes citados, na ordem em que aparecem (sem repetição)."""
+        tokens = _tokens(mensagem)
+        texto = " ".join(tokens)
+        # posição no texto -> índice do token, para checar o contexto depois de cada ocorrência
+        fim_para_token = {}
+        pos = 0
+        for idx, tok in enumerate(tokens):
+            pos += len(tok)
+            fim_para_token[pos] = idx + 1
+            pos += 1
+        ocorrencias = [(fim_para_token[fim], forma) for _, fim, forma in self._exatos(texto)]
+        if not ocorrencias:
+            ocorrencias = [(fim, forma) for _, fim, forma in self._aproximados(tokens)]
+        ocorrencias = [(fim, forma) for fim, forma in ocorrencias if self._bovino(tokens, fim)]
+        contexto = NAO_BOVINOS.isdisjoint(tokens) and (
+            not CONTEXTO_CARNE.isdisjoint(tokens) or any(f not in self.ambiguas for _, f in ocorrencias))
+        cortes = [self.formas[forma] for _, forma in ocorrencias if contexto or forma not in self.ambiguas]
+        return list(dict.fromkeys(cortes))
+
+    def detectar(self, mensagem: str) -> Optional[str]:
+        """Primeiro corte citado (nome como em CORTES_VALIDOS) ou None."""
+        cortes = self.detectar_todos(mensagem)
+        return cortes[0] if cortes else None
@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import re
+import shutil
+import uuid
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from receitas_mongo import CAMPO_CORTE_NORM, CAMPO_HASH, CAMPO_RANKING, normalizar_texto, versao_catalogo
+
+PASTA_INDICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "indice_receitas")
+DIMENSAO = 4096
+NGRAMAS = (3, 5)
+# Peso de cada campo no texto indexado (repetição): título e ingredientes dizem mais sobre a receita
+PESOS_CAMPOS = {"Título": 3, "Ingredientes": 2, "Introdução": 1, "Modo de preparo": 1}
+# Campos guardados no índice para montar o contexto do gerador sem ir ao Mongo
+CAMPOS_EXIBICAO = ("Título", "Introdução", "Ingredientes", "Modo de preparo", "Marca", "Corte")
+K_RRF = 60
+
+STOPWORDS = set("""
+a o as os um uma de do da dos das em no na nos nas por para pra com sem e ou que se ao aos
+receita receitas quero queria tem algo alguma algum fazer faz como me uma pode
+""".split())
+
+
+def _palavras(texto: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", normalizar_texto(texto))
+
+
+def _termos(texto: str) -> List[str]:
+    return [p for p in _palavras(texto) if p not in STOPWORDS and len(p) > 1]
+
+
+def _texto_indexado(doc: dict) -> str:
+    return " ".join(" ".join([str(doc.get(campo, ""))] * peso) for campo, peso in PESOS_CAMPOS.items())
+
+
+def _contagens_hash(texto: str) -> Counter:
+    """n-gramas de caracteres de cada palavra (e a palavra inteira), projetados em DIMENSAO posições por crc32."""
+    contagens = Counter()
+    lo, hi = NGRAMAS
+    for palavra in _termos(texto):
+        contagens[zlib.crc32(f"w:{palavra}".encode()) % DIMENSAO] += 2
+        marcada = f" {palavra} "
+        for n in range(lo, hi + 1):
+            for i in range(len(marcada) - n + 1):
+                contagens[zlib.crc32(marcada[i:i + n].encode()) % DIMENSAO] += 1
+    return contagens
+
+
+def _vetorizar(textos: List[str], idf: np.ndarray) -> np.ndarray:
+    matriz = np.zeros((len(textos), DIMENSAO), dtype=np.float32)
+    for linha, texto in enumerate(textos):
+        contagens = _contagens_hash(texto)
+        if contagens:
+            colunas = np.fromiter(contagens.keys(), dtype=np.int64, count=len(contagens))
+            matriz[linha, colunas] = np.log1p(np.fromiter(contagens.values(), dtype=np.float32, count=len(contagens)))
+    matriz *= idf
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1.0, normas)
+
+
+class IndiceReceitas:
+    """
+    Índice local do catálogo: vetores TF-IDF de n-gramas com hashing (similaridade de cosseno) e BM25 sobre
+    título, ingredientes, introdução e modo de preparo. Construído na ingestão e gravado em disco;
+    a busca filtra pelo corte e ordena pelo restante da pergunta, sem consultar o Mongo.
+    """
+
+    def __init__(self, documentos: List[dict], vetores: np.ndarray, idf: np.ndarray, postings: Dict[str, list],
+                 comprimentos: List[int], versao: str = ""):
+        self.documentos = documentos
+        self.vetores = vetores
+        self.idf = idf
+        self.postings = postings
+        self.comprimentos = comprimentos
+        self.media_comprimento = (sum(comprimentos) / len(comprimentos)) if comprimentos else 0.0
+        self.versao = versao
+        self.por_corte: Dict[str, List[int]] = {}
+        for i, doc in enumerate(documentos):
+            for corte in doc.get(CAMPO_CORTE_NORM, []):
+                self.por_corte.setdefault(corte, []).append(i)
+
+    @classmethod
+    def construir(cls, documentos: List[dict], versao: str = "") -> "IndiceReceitas":
+        docs = [
+            {**{c: str(d.get(c, "")) for c in CAMPOS_EXIBICAO}, CAMPO_CORTE_NORM: list(d.get(CAMPO_CORTE_NORM, [])),
+             CAMPO_RANKING: float(d.get(CAMPO_RANKING, 0.0)), CAMPO_HASH: d.get(CAMPO_HASH, "")}
+            for d in documentos
+        ]
+        textos = [_texto_indexado(d) for d in docs]
+
+        frequencia = np.zeros(DIMENSAO, dtype=np.float32)
+        for texto in textos:
+            frequencia[list(_contagens_hash(texto).keys())] += 1
+        idf = np.log((1 + len(textos)) / (1 + frequencia)).astype(np.float32) + 1.0
+        vetores = _vetorizar(textos, idf)
+
+        postings: Dict[str, list] = {}
+        comprimentos = []
+        for i, texto in enumerate(textos):
+            contagem = Counter(_termos(texto))
+            comprimentos.append(sum(contagem.values()))
+            for termo, tf in contagem.items():
+                postings.setdefault(termo, []).append([i, tf])
+        return cls(docs, vetores, idf, postings, comprimentos, versao)
+
+    def salvar(self, pasta: str = PASTA_INDICE):
+        """
+        Grava numa subpasta nova e só então aponta CURRENT para ela (os.replace é atômico): o chat sempre acha
+        um índice inteiro. Fica também a versão anterior, que um leitor pode estar abrindo; as demais são apagadas.
+        """
+        os.makedirs(pasta, exist_ok=True)
+        nome = uuid.uuid4().hex
+        tmp = os.path.join(pasta, f".tmp-{nome}")
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vetores.npy"), np.asarray(self.vetores, dtype=np.float32))
+        np.save(os.path.join(tmp, "idf.npy"), self.idf)
+        with open(os.path.join(tmp, "documentos.json"), "w", encoding="utf-8") as f:
+            json.dump(self.documentos, f, ensure_ascii=False)
+        with open(os.path.join(tmp, "bm25.json"), "w", encoding="utf-8") as f:
+            json.dump({"postings": self.postings, "comprimentos": self.comprimentos}, f)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"versao": self.versao, "dimensao": DIMENSAO, "ngramas": NGRAMAS, "documentos": len(self.documentos)}, f)
+        os.replace(tmp, os.path.join(pasta, nome))
+
+        anterior = versao_gravada(pasta)
+        ponteiro = os.path.join(pasta, f".CURRENT-{os.getpid()}")
+        with open(ponteiro, "w", encoding="utf-8") as f:
+            f.write(nome)
+        os.replace(ponteiro, os.path.join(pasta, "CURRENT"))
+        for item in os.listdir(pasta):
+            caminho = os.path.join(pasta, item)
+            if os.path.isdir(caminho) and item not in (nome, anterior) and not item.startswith("."):
+                shutil.rmtree(caminho, ignore_errors=True)
+
+    @classmethod
+    def carregar(cls, pasta: str = PASTA_INDICE) -> Optional["IndiceReceitas"]:
+        nome = versao_gravada(pasta)
+        if nome is None:
+            return None
+        pasta = os.path.join(pasta, nome)
+        try:
+            with open(os.path.join(pasta, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["dimensao"] != DIMENSAO or tuple(manifest["ngramas"]) != NGRAMAS:
+                return None
+            with open(os.path.join(pasta, "documentos.json"), encoding="utf-8") as f:
+                documentos = json.load(f)
+            with open(os.path.join(pasta, "bm25.json"), encoding="utf-8") as f:
+                bm25 = json.load(f)
+            vetores = np.load(os.path.join(pasta, "vetores.npy"), mmap_mode="r")
+            idf = np.load(os.path.join(pasta, "idf.npy"))
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(documentos, vetores, idf, bm25["postings"], bm25["comprimentos"], manifest["versao"])
+
+    def _bm25(self, termos: List[str], candidatos: List[int], k1: float = 1.5, b: float = 0.75) -> Dict[int, float]:
+        aceitos = set(candidatos)
+        n = len(self.documentos)
+        pontos: Dict[int, float] = {}
+        for termo in set(termos):
+            lista = self.postings.get(termo, [])
+            if not lista:
+                continue
+            idf = math.log(1 + (n - len(lista) + 0.5) / (len(lista) + 0.5))
+            for i, tf in lista:
+                if i in aceitos:
+                    norma = tf + k1 * (1 - b + b * self.comprimentos[i] / self.media_comprimento)
+                    pontos[i] = pontos.get(i, 0.0) + idf * tf * (k1 + 1) / norma
+        return pontos
+
+    def _candidatos(self, corte_norm: str) -> List[int]:
+        """Receitas do corte (igualdade, depois prefixo, como buscar_receitas_por_corte); sem nenhuma, todas."""
+        if corte_norm in self.por_corte:
+            return self.por_corte[corte_norm]
+        por_prefixo = sorted({i for c, ids in self.por_corte.items() if corte_norm and c.startswith(corte_norm) for i in ids})
+        return por_prefixo or list(range(len(self.documentos)))
+
+    def buscar(self, consulta: str, corte: Optional[str] = None, k: int = 3) -> List[dict]:
+        """
+        As k receitas mais adequadas à pergunta. Com `corte`, só entram receitas desse corte (se o catálogo não
+        tiver nenhuma, a busca vale para todas). A ordem vem da fusão (RRF) dos rankings de cosseno e BM25 sobre
+        o restante da pergunta; se ela não tiver termos além do corte, vale o ranking gravado na ingestão.
+        """
+        corte_norm = normalizar_texto(corte) if corte else ""
+        candidatos = self._candidatos(corte_norm)
+        termos = [t for t in _termos(consulta) if t not in corte_norm.split()]
+        por_ranking = sorted(candidatos, key=lambda i: -self.documentos[i][CAMPO_RANKING])
+        if not termos:
+            return [self.documentos[i] for i in por_ranking[:k]]
+
+        consulta_vetor = _vetorizar([" ".join(termos)], self.idf)[0]
+        vetores = self.vetores if len(candidatos) == len(self.documentos) else self.vetores[candidatos]
+        similaridade = vetores @ consulta_vetor
+        ordem_vetor = [candidatos[j] for j in np.argsort(-similaridade)]
+        bm25 = self._bm25(termos, candidatos)
+        ordem_bm25 = sorted(bm25, key=bm25.get, reverse=True)
+
+        pontos: Dict[int, float] = {}
+        for ordem in (ordem_vetor, ordem_bm25):
+            for posicao, i in enumerate(ordem, start=1):
+                pontos[i] = pontos.get(i, 0.0) + 1.0 / (K_RRF + posicao)
+        melhores = sorted(candidatos, key=lambda i: (-pontos.get(i, 0.0), -self.documentos[i][CAMPO_RANKING]))
+        return [self.documentos[i] for i in melhores[:k]]
+
+
+def versao_gravada(pasta: str = PASTA_INDICE) -> Optional[str]:
+    """Subpasta apontada por CURRENT (muda a cada salvar), ou None se o índice nunca foi gravado."""
+    try:
+        with open(os.path.join(pasta, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def reconstruir_indice(collection, pasta: str = PASTA_INDICE) -> dict:
+    """Lê o catálogo inteiro do Mongo uma vez, monta o índice local e grava com a versão atual do catálogo."""
+    projecao = {c: 1 for c in CAMPOS_EXIBICAO + (CAMPO_CORTE_NORM, CAMPO_RANKING, CAMPO_HASH)}
+    indice = IndiceReceitas.construir(list(collection.find({}, projecao)), versao_catalogo(collection))
+    indice.salvar(pasta)
+    return {"documentos": len(indice.documentos), "versao": indice.versao}
@@ -0,0 +1,232 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+import uuid
+
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = "friboi_pratica"
+MONGO_COLLECTION = "receitas_pratica"
+CSV_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "receitas-e-dicas-friboi.csv")
+TAMANHO_LOTE = 500
+
+# Colunas do CSV; as curtas têm espaços colapsados, as de texto longo só perdem espaços nas pontas
+CAMPOS_CURTOS = ("Título", "Marca", "Corte", "Tipo")
+CAMPOS_TEXTO = ("Introdução", "Ingredientes", "Modo de preparo")
+
+# Campos derivados gravados na ingestão e usados pela busca do ai_friboi
+CAMPO_CORTE_NORM = "corte_norm"
+CAMPO_RANKING = "ranking"
+CAMPO_HASH = "hash_conteudo"
+CAMPO_CHAVE = "chave_receita"
+
+# Identidade estável da receita (não muda quando o texto é corrigido no CSV): chave de upsert
+CAMPOS_IDENTIDADE = ("Título", "Marca", "Corte")
+
+# Coleção com a versão de cada catálogo; muda a cada ingestão que altera receitas (invalida caches do chat)
+COLECAO_META = "catalogo_meta"
+
+# Chamados (sem argumentos) sempre que marcar_versao_catalogo muda a versão, para caches do mesmo processo
+_ouvintes_catalogo = []
+
+# Índice composto: busca exata/prefixo em corte_norm já volta ordenada por ranking, sem sort em memória
+INDICE_CORTE_RANKING = [(CAMPO_CORTE_NORM, ASCENDING), (CAMPO_RANKING, DESCENDING)]
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples: "Filé  Mignon" -> "file mignon"."""
+    sem_acento = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return " ".join(sem_acento.lower().split())
+
+
+def normalizar_cortes(corte: str) -> list:
+    """O campo Corte pode listar vários cortes ("Fraldinha, Hambúrguer"); vira uma lista normalizada."""
+    cortes = (normalizar_texto(c) for c in re.split(r"[,;/]", str(corte)))
+    return list(dict.fromkeys(c for c in cortes if c))
+
+
+def calcular_ranking(doc: dict) -> float:
+    """
+    Nota fixa da receita, gravada na ingestão: receitas completas primeiro.
+    Tipo "Receita" vale mais que "Dica"; ter ingredientes, modo de preparo e introdução soma pontos,
+    e um modo de preparo mais detalhado (até 1500 caracteres) desempata.
+    """
+    preparo = str(doc.get("Modo de preparo", "")).strip()
+    nota = 0.0
+    nota += 3.0 if normalizar_texto(doc.get("Tipo", "")) == "receita" else 0.0
+    nota += 2.0 if str(doc.get("Ingredientes", "")).strip() else 0.0
+    nota += 2.0 if preparo else 0.0
+    nota += 0.5 if str(doc.get("Introdução", "")).strip() else 0.0
+    nota += min(len(preparo), 1500) / 1500
+    return round(nota, 4)
+
+
+def preparar_documento(doc: dict) -> dict:
+    """Acrescenta corte_norm e ranking a uma linha do CSV antes de gravar no Mongo."""
+    return {**doc, CAMPO_CORTE_NORM: normalizar_cortes(doc.get("Corte", "")), CAMPO_RANKING: calcular_ranking(doc)}
+
+
+def criar_indices(collection):
+    collection.create_index(INDICE_CORTE_RANKING, name="corte_norm_ranking")
+    # O hash do conteúdo deixou de ser chave (uma receita editada mudava de hash e virava duplicata)
+    if "hash_conteudo_unico" in collection.index_information():
+        collection.drop_index("hash_conteudo_unico")
+    # Parcial: documentos antigos, sem chave, não colidem entre si até atualizar_campos_derivados preenchê-la
+    collection.create_index(
+        [(CAMPO_CHAVE, ASCENDING)], name="chave_receita_unica", unique=True,
+        partialFilterExpression={CAMPO_CHAVE: {"$exists": True}},
+    )
+
+
+def ao_mudar_catalogo(ouvinte):
+    """Registra `ouvinte()` para ser chamado a cada nova versão do catálogo marcada neste processo."""
+    _ouvintes_catalogo.append(ouvinte)
+
+
+def marcar_versao_catalogo(collection) -> str:
+    versao = uuid.uuid4().hex
+    collection.database[COLECAO_META].update_one(
+        {"_id": collection.name}, {"$set": {"versao": versao, "atualizado_em": time.time()}}, upsert=True
+    )
+    for ouvinte in _ouvintes_catalogo:
+        ouvinte()
+    return versao
+
+
+def versao_catalogo(collection) -> str:
+    meta = collection.database[COLECAO_META].find_one({"_id": collection.name}, {"versao": 1})
+    return meta["versao"] if meta else ""
+
+
+def normalizar_linha(linha: dict) -> dict:
+    doc = {campo: " ".join(str(linha.get(campo) or "").split()) for campo in CAMPOS_CURTOS}
+    doc.update({campo: str(linha.get(campo) or "").strip() for campo in CAMPOS_TEXTO})
+    return doc
+
+
+def _sha256(campos: dict) -> str:
+    return hashlib.sha256(json.dumps(campos, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def chave_receita(doc: dict) -> str:
+    """sha256 de Título, Marca e Corte normalizados: a mesma receita gera a mesma chave mesmo após edições."""
+    return _sha256({campo: normalizar_texto(doc.get(campo, "")) for campo in CAMPOS_IDENTIDADE})
+
+
+def hash_conteudo(doc: dict) -> str:
+    """sha256 de todos os campos do CSV já normalizados: muda quando qualquer texto da receita muda."""
+    return _sha256({campo: doc.get(campo, "") for campo in CAMPOS_CURTOS + CAMPOS_TEXTO})
+
+
+def documento_para_gravar(linha: dict) -> dict:
+    doc = preparar_documento(linha)
+    doc[CAMPO_CHAVE] = chave_receita(doc)
+    doc[CAMPO_HASH] = hash_conteudo(doc)
+    return doc
+
+
+def ler_csv(caminho: str):
+    """Lê o CSV (";", UTF-8 com ou sem BOM) linha a linha, sem carregar o arquivo inteiro."""
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        for linha in csv.DictReader(f, delimiter=";"):
+            doc = normalizar_linha(linha)
+            if any(doc.values()):
+                yield doc
+
+
+def ingerir_csv(collection, caminho: str = CSV_PADRAO, tamanho_lote: int = TAMANHO_LOTE) -> dict:
+    """
+    Upsert do CSV em lotes de `tamanho_lote` com bulk_write, chaveado por chave_receita.
+    Rodar de novo não duplica nada: linhas iguais às gravadas ficam inalteradas e linhas editadas (hash_conteudo
+    diferente) sobrescrevem a receita e contam em "atualizadas". Linhas do CSV com a mesma chave viram uma só
+    receita, a de maior ranking (o CSV tem cópias de dicas só com o título); as demais contam em "repetidas".
+    """
+    criar_indices(collection)
+    stats = {"linhas": 0, "inseridas": 0, "atualizadas": 0, "inalteradas": 0, "repetidas": 0, "lotes": 0}
+    inicio = time.perf_counter()
+
+    def gravar(lote):
+        resultado = collection.bulk_write(lote, ordered=False)
+        stats["lotes"] += 1
+        stats["inseridas"] += resultado.upserted_count
+        stats["atualizadas"] += resultado.modified_count
+        stats["inalteradas"] += resultado.matched_count - resultado.modified_count
+
+    # Uma linha por chave antes de gravar: duas UpdateOne da mesma chave num bulk_write não ordenado não têm
+    # ordem garantida (e dois upserts de chave nova colidem no índice único)
+    melhores = {}
+    for linha in ler_csv(caminho):
+        doc = documento_para_gravar(linha)
+        stats["linhas"] += 1
+        anterior = melhores.get(doc[CAMPO_CHAVE])
+        if anterior is not None:
+            stats["repetidas"] += 1
+            if anterior[CAMPO_RANKING] >= doc[CAMPO_RANKING]:
+                continue
+        melhores[doc[CAMPO_CHAVE]] = doc
+
+    docs = list(melhores.values())
+    for i in range(0, len(docs), tamanho_lote):
+        gravar([UpdateOne({CAMPO_CHAVE: doc[CAMPO_CHAVE]}, {"$set": doc}, upsert=True) for doc in docs[i:i + tamanho_lote]])
+    if stats["inseridas"] or stats["atualizadas"]:
+        marcar_versao_catalogo(collection)
+
+    segundos = time.perf_counter() - inicio
+    stats["segundos"] = round(segundos, 3)
+    stats["linhas_por_segundo"] = round(stats["linhas"] / segundos, 1) if segundos else 0.0
+    return stats
+
+
+def atualizar_campos_derivados(collection) -> dict:
+    """
+    Migra documentos sem chave_receita (insert_many do notebook antigo ou ingestões chaveadas pelo hash):
+    normaliza os campos e preenche corte_norm, ranking, chave_receita e hash_conteudo. Cópias de uma mesma
+    receita são removidas, ficando a mais recente (maior _id).
+    """
+    criar_indices(collection)
+    stats = {"atualizados": 0, "duplicados_removidos": 0}
+    for antigo in collection.find({CAMPO_CHAVE: {"$exists": False}}).sort("_id", DESCENDING):
+        doc = documento_para_gravar(normalizar_linha(antigo))
+        if collection.count_documents({CAMPO_CHAVE: doc[CAMPO_CHAVE]}, limit=1):
+            collection.delete_one({"_id": antigo["_id"]})
+            stats["duplicados_removidos"] += 1
+            continue
+        collection.update_one({"_id": antigo["_id"]}, {"$set": doc})
+        stats["atualizados"] += 1
+    if stats["atualizados"] or stats["duplicados_removidos"]:
+        marcar_versao_catalogo(collection)
+    return stats
+
+
+def buscar_receitas_por_corte(collection, corte: str, n: int = 3) -> list:
+    """
+    As n receitas de maior ranking para o corte, pelo índice corte_norm_ranking.
+    Tenta igualdade exata com o corte normalizado; se não houver nenhuma, busca por prefixo
+    ancorado ("^contrafile"), que o Mongo também resolve pelo índice.
+    """
+    corte_norm = normalizar_texto(corte)
+    if not corte_norm:
+        return []
+    ordem = [(CAMPO_RANKING, DESCENDING)]
+    docs = list(collection.find({CAMPO_CORTE_NORM: corte_norm}).sort(ordem).limit(n))
+    if docs:
+        return docs
+    prefixo = {"$regex": "^" + re.escape(corte_norm)}
+    return list(collection.find({CAMPO_CORTE_NORM: prefixo}).sort(ordem).limit(n))
+
+
+if __name__ == "__main__":
+    # Uso: python receitas_mongo.py [csv] [tamanho_lote]   (MONGO_URI no ambiente; padrão localhost)
+    caminho = sys.argv[1] if len(sys.argv) > 1 else CSV_PADRAO
+    tamanho_lote = int(sys.argv[2]) if len(sys.argv) > 2 else TAMANHO_LOTE
+    colecao = MongoClient(MONGO_URI)[MONGO_DB][MONGO_COLLECTION]
+    print(json.dumps(ingerir_csv(colecao, caminho, tamanho_lote), ensure_ascii=False))
+
+    from indice_receitas import reconstruir_indice
+    print(json.dumps({"indice_local": reconstruir_indice(colecao)}, ensure_ascii=False))
@@ -0,0 +1,703 @@
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+from typing import Iterator, List, Optional
+from zoneinfo import ZoneInfo
+from langchain.tools import tool
+from pydantic import BaseModel, Field
+from pg_tools import get_conn, close_conn
+from session_context import get_user_id
+from availability import free_slots
+from recurrence import FREQS, Occurrence, Series, SeriesException, occurrences_in_window
+
+TZ = ZoneInfo("America/Sao_Paulo")
+DEFAULT_DURATION_MINUTES = 60
+
+EVENT_COLUMNS = "e.id, e.title, e.start_time, e.end_time, e.location, e.notes, e.source_text"
+SERIES_COLUMNS = (
+    "s.id, s.title, s.dtstart, s.duration, s.freq, s.freq_interval, s.by_weekday, s.until, s.count, s.location, s.notes"
+)
+FAR_PAST = datetime(1970, 1, 1, tzinfo=TZ)
+FAR_FUTURE = datetime(9999, 1, 1, tzinfo=TZ)
+
+
+class CreateEventArgs(BaseModel):
+    title: str = Field(..., description="Título do compromisso.")
+    start_time: str = Field(..., description="Início em ISO 8601 (sem fuso = America/Sao_Paulo).")
+    source_text: str = Field(..., description="Texto original do usuário.")
+    end_time: Optional[str] = Field(default=None, description="Fim em ISO 8601 (opcional).")
+    duration_minutes: Optional[int] = Field(default=None, description="Duração em minutos quando end_time ausente (padrão 60).")
+    location: Optional[str] = Field(default=None, description="Local (opcional).")
+    notes: Optional[str] = Field(default=None, description="Observações (opcional).")
+    allow_conflict: bool = Field(default=False, description="Se True, cria mesmo havendo sobreposição.")
+
+
+class ListEventsArgs(BaseModel):
+    date_from_local: Optional[str] = Field(default=None, description="Data inicial local YYYY-MM-DD (America/Sao_Paulo) (opcional).")
+    date_to_local: Optional[str] = Field(default=None, description="Data final local YYYY-MM-DD, inclusiva (opcional).")
+    text: Optional[str] = Field(default=None, description="Texto a buscar em title/notes (opcional).")
+    limit: int = Field(default=20, description="Número máximo de eventos a retornar.")
+
+
+class UpdateEventArgs(BaseModel):
+    id: Optional[int] = Field(
+        default=None,
+        description="ID do evento. Se ausente, será feita uma busca por (match_text + date_local)."
+    )
+    match_text: Optional[str] = Field(default=None, description="Texto para localizar o evento (title/notes) quando id não for informado.")
+    date_local: Optional[str] = Field(default=None, description="Data local (YYYY-MM-DD) do evento; usado com match_text.")
+    title: Optional[str] = Field(default=None, description="Novo título.")
+    start_time: Optional[str] = Field(default=None, description="Novo início ISO 8601.")
+    end_time: Optional[str] = Field(default=None, description="Novo fim ISO 8601.")
+    location: Optional[str] = Field(default=None, description="Novo local.")
+    notes: Optional[str] = Field(default=None, description="Novas observações.")
+
+
+class CancelEventArgs(BaseModel):
+    id: Optional[int] = Field(default=None, description="ID do evento a cancelar.")
+    match_text: Optional[str] = Field(default=None, description="Texto para localizar o evento quando id não for informado.")
+    date_local: Optional[str] = Field(default=None, description="Data local (YYYY-MM-DD) do evento; usado com match_text.")
+
+
+class CreateRecurringEventArgs(BaseModel):
+    title: str = Field(..., description="Título do compromisso recorrente.")
+    start_time: str = Field(..., description="Primeira ocorrência em ISO 8601 (sem fuso = America/Sao_Paulo).")
+    freq: str = Field(..., description="Frequência: DAILY | WEEKLY | MONTHLY.")
+    source_text: str = Field(..., description="Texto original do usuário.")
+    freq_interval: int = Field(default=1, description="Repetir a cada N períodos (ex.: 2 = quinzenal com WEEKLY).")
+    by_weekday: Optional[List[int]] = Field(default=None, description="Dias da semana para WEEKLY (0=segunda ... 6=domingo).")
+    duration_minutes: int = Field(default=DEFAULT_DURATION_MINUTES, description="Duração de cada ocorrência em minutos.")
+    until_local: Optional[str] = Field(default=None, description="Última data local YYYY-MM-DD (opcional).")
+    count: Optional[int] = Field(default=None, description="Número total de ocorrências (opcional).")
+    location: Optional[str] = Field(default=None, description="Local (opcional).")
+    notes: Optional[str] = Field(default=None, description="Observações (opcional).")
+
+
+class UpdateOccurrenceArgs(BaseModel):
+    series_id: int = Field(..., description="ID da série recorrente.")
+    occurrence_start: str = Field(..., description="Início original da ocorrência em ISO 8601.")
+    cancel: bool = Field(default=False, description="Se True, cancela apenas esta ocorrência.")
+    new_start: Optional[str] = Field(default=None, description="Novo início desta ocorrência (remarcação).")
+    new_end: Optional[str] = Field(default=None, description="Novo fim desta ocorrência (opcional).")
+    title: Optional[str] = Field(default=None, description="Novo título só para esta ocorrência (opcional).")
+
+
+class CancelSeriesArgs(BaseModel):
+    series_id: int = Field(..., description="ID da série recorrente a cancelar (todas as ocorrências).")
+
+
+class FindFreeSlotsArgs(BaseModel):
+    date_from_local: str = Field(..., description="Data inicial local YYYY-MM-DD (America/Sao_Paulo).")
+    date_to_local: Optional[str] = Field(default=None, description="Data final local YYYY-MM-DD, inclusiva (padrão: date_from_local).")
+    min_duration_minutes: int = Field(default=30, description="Duração mínima de cada horário livre, em minutos.")
+    work_start: str = Field(default="08:00", description="Início do expediente HH:MM.")
+    work_end: str = Field(default="18:00", description="Fim do expediente HH:MM.")
+    include_weekends: bool = Field(default=True, description="Se False, ignora sábados e domingos.")
+    limit: int = Field(default=10, description="Número máximo de horários livres a retornar.")
+
+
+class FindConflictsArgs(BaseModel):
+    start_time: str = Field(..., description="Início da janela em ISO 8601 (sem fuso = America/Sao_Paulo).")
+    end_time: Optional[str] = Field(default=None, description="Fim da janela; se ausente, verifica apenas o instante start_time.")
+    exclude_id: Optional[int] = Field(default=None, description="ID de evento a ignorar (ex.: o próprio evento sendo remarcado).")
+
+
+def _parse_local_ts(value: str) -> datetime:
+    """Converte ISO 8601 em datetime com fuso; valores sem fuso são America/Sao_Paulo."""
+    dt = datetime.fromisoformat(value.strip())
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=TZ)
+    return dt
+
+
+def _local_day_window(date_from_local: Optional[str], date_to_local: Optional[str]):
+    """Janela [início do primeiro dia, início do dia seguinte ao último) em America/Sao_Paulo."""
+    start = _parse_local_ts(date_from_local) if date_from_local else None
+    end = _parse_local_ts(date_to_local) + timedelta(days=1) if date_to_local else None
+    return start, end
+
+
+def _range_bounds(start: datetime, end: Optional[datetime]) -> str:
+    # Um instante é o intervalo fechado [t, t]; '[)' deixaria o range vazio e nada sobreporia
+    return "[]" if end is None or end == start else "[)"
+
+
+def _event_row(r) -> dict:
+    return {
+        "id": r[0],
+        "title": r[1],
+        "start_time": r[2].astimezone(TZ).isoformat(),
+        "end_time": r[3].astimezone(TZ).isoformat() if r[3] else None,
+        "location": r[4],
+        "notes": r[5],
+        "source_text": r[6],
+    }
+
+
+def _occurrence_row(o: Occurrence) -> dict:
+    return {
+        "id": None,
+        "series_id": o.series_id,
+        "occurrence_start": o.original_start.astimezone(TZ).isoformat(),
+        "title": o.title,
+        "start_time": o.start.astimezone(TZ).isoformat(),
+        "end_time": o.end.astimezone(TZ).isoformat(),
+        "location": o.location,
+        "notes": o.notes,
+    }
+
+
+def _series_occurrences(cur, start: datetime, end: Optional[datetime], text: Optional[str] = None) -> Iterator[Occurrence]:
+    """
+    Ocorrências de séries recorrentes que sobrepõem a janela, em ordem de início.
+    Só as séries ativas no período (índice GiST em active_span) e suas exceções são lidas do banco;
+    as ocorrências são geradas sob demanda, sem materializar a série inteira.
+    """
+    # Uma janela de um instante vira [t, t + 1µs) para a expansão, que trabalha com intervalos semiabertos
+    if end is None or end <= start:
+        end = start + timedelta(microseconds=1)
+    # Folga de um dia para ocorrências iniciadas antes da janela (ou antes de until) que ainda a invadem
+    lookback = start - timedelta(days=1)
+
+    conditions = ["s.user_id = %s", "s.cancelled_at IS NULL", "s.active_span && tstzrange(%s, %s, '[)')"]
+    params: List[object] = [get_user_id(), lookback, end]
+    if text:
+        conditions.append("(s.title ILIKE %s OR s.notes ILIKE %s)")
+        params.extend([f"%{text}%", f"%{text}%"])
+    cur.execute(
+        f"SELECT {SERIES_COLUMNS} FROM event_series s WHERE {' AND '.join(conditions)};",
+        params,
+    )
+    series = [Series(*r) for r in cur.fetchall()]
+    if not series:
+        return iter(())
+
+    cur.execute(
+        """
+        SELECT x.series_id, x.original_start, x.cancelled, x.new_start, x.new_end, x.title
+        FROM event_exceptions x
+        WHERE x.user_id = %s
+          AND x.series_id = ANY(%s)
+          AND ((x.original_start >= %s AND x.original_start < %s)
+               OR (x.new_start < %s AND COALESCE(x.new_end, x.new_start) >= %s));
+        """,
+        (get_user_id(), [s.id for s in series], lookback, end, end, lookback),
+    )
+    exceptions = {}
+    for r in cur.fetchall():
+        exceptions.setdefault(r[0], {})[r[1]] = SeriesException(*r[1:])
+    return occurrences_in_window(series, start, end, exceptions)
+
+
+def _overlapping_events(cur, start: datetime, end: Optional[datetime], exclude_id: Optional[int] = None) -> List[dict]:
+    """
+    Eventos ativos (avulsos e ocorrências de séries) que sobrepõem a janela.
+    Os avulsos são resolvidos pelo índice GiST idx_events_span.
+    """
+    params: List[object] = [get_user_id(), start, end or start, _range_bounds(start, end)]
+    exclude_sql = ""
+    if exclude_id is not None:
+        exclude_sql = "AND e.id <> %s"
+        params.append(exclude_id)
+    cur.execute(
+        f"""
+        SELECT {EVENT_COLUMNS}
+        FROM events e
+        WHERE e.user_id = %s
+          AND e.cancelled_at IS NULL
+          AND e.span && tstzrange(%s, %s, %s)
+          {exclude_sql}
+        ORDER BY e.start_time ASC;
+        """,
+        params,
+    )
+    single = [(r[2], _event_row(r)) for r in cur.fetchall()]
+    recurring = ((o.start, _occurrence_row(o)) for o in _series_occurrences(cur, start, end))
+    return [row for _, row in heapq.merge(single, recurring, key=lambda x: x[0])]
+
+
+def _find_event_id(cur, match_text: Optional[str], date_local: Optional[str]) -> Optional[int]:
+    day_start, day_end = _local_day_window(date_local, date_local)
+    cur.execute(
+        """
+        SELECT e.id
+        FROM events e
+        WHERE e.user_id = %s
+          AND e.cancelled_at IS NULL
+          AND (e.title ILIKE %s OR e.notes ILIKE %s)
+          AND e.span && tstzrange(%s, %s, '[)')
+        ORDER BY e.start_time ASC
+        LIMIT 1;
+        """,
+        (get_user_id(), f"%{match_text}%", f"%{match_text}%", day_start, day_end),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+@tool("create_event", args_schema=CreateEventArgs)
+def create_event(
+    title: str,
+    start_time: str,
+    source_text: str,
+    end_time: Optional[str] = None,
+    duration_minutes: Optional[int] = None,
+    location: Optional[str] = None,
+    notes: Optional[str] = None,
+    allow_conflict: bool = False,
+) -> dict:
+    """
+    Cria um compromisso na agenda. Se houver sobreposição com eventos ativos e allow_conflict=False,
+    não cria e retorna status 'conflict' com os eventos conflitantes.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        start = _parse_local_ts(start_time)
+        if end_time:
+            end = _parse_local_ts(end_time)
+        else:
+            end = start + timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+        if end < start:
+            return {"status": "error", "message": "end_time deve ser posterior a start_time."}
+
+        if not allow_conflict:
+            conflicts = _overlapping_events(cur, start, end)
+            if conflicts:
+                return {"status": "conflict", "conflicts": conflicts}
+
+        cur.execute(
+            """
+            INSERT INTO events (user_id, title, start_time, end_time, location, notes, source_text)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING id, start_time, end_time;
+            """,
+            (get_user_id(), title, start, end, location, notes, source_text),
+        )
+        new_id, s, e = cur.fetchone()
+        conn.commit()
+        return {
+            "status": "ok",
+            "id": new_id,
+            "start_time": s.astimezone(TZ).isoformat(),
+            "end_time": e.astimezone(TZ).isoformat() if e else None,
+        }
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("list_events", args_schema=ListEventsArgs)
+def list_events(
+    date_from_local: Optional[str] = None,
+    date_to_local: Optional[str] = None,
+    text: Optional[str] = None,
+    limit: int = 20,
+) -> dict:
+    """
+    Lista compromissos ativos (avulsos e ocorrências de recorrentes) em ordem cronológica, filtrando por
+    intervalo de datas locais (America/Sao_Paulo) e/ou texto em title/notes. Sem datas, lista a partir de agora.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        start, end = _local_day_window(date_from_local, date_to_local)
+        if start is None and end is None:
+            start = datetime.now(TZ)
+
+        conditions, params = ["e.user_id = %s", "e.cancelled_at IS NULL"], [get_user_id()]
+        if start is not None or end is not None:
+            conditions.append("e.span && tstzrange(%s, %s, '[)')")
+            params.extend([start, end])
+        if text:
+            conditions.append("(e.title ILIKE %s OR e.notes ILIKE %s)")
+            params.extend([f"%{text}%", f"%{text}%"])
+        params.append(limit)
+
+        cur.execute(
+            f"""
+            SELECT {EVENT_COLUMNS}
+            FROM events e
+            WHERE {" AND ".join(conditions)}
+            ORDER BY e.start_time ASC
+            LIMIT %s;
+            """,
+            params,
+        )
+        single = [(r[2], _event_row(r)) for r in cur.fetchall()]
+        recurring = (
+            (o.start, _occurrence_row(o))
+            for o in _series_occurrences(cur, start or FAR_PAST, end or FAR_FUTURE, text)
+        )
+        merged = heapq.merge(single, recurring, key=lambda x: x[0])
+        return {"events": [row for _, row in islice(merged, limit)]}
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("update_event", args_schema=UpdateEventArgs)
+def update_event(
+    id: Optional[int] = None,
+    match_text: Optional[str] = None,
+    date_local: Optional[str] = None,
+    title: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    location: Optional[str] = None,
+    notes: Optional[str] = None,
+) -> dict:
+    """
+    Atualiza (ou remarca) um compromisso existente.
+    Estratégias:
+      - Se 'id' for informado: atualiza diretamente por ID.
+      - Caso contrário: localiza o primeiro evento ativo do dia date_local que combine com match_text.
+    Ao remarcar, não aplica a mudança se o novo horário conflitar com outro evento (retorna status 'conflict').
+    """
+    if not any([title, start_time, end_time, location, notes]):
+        return {"status": "error", "message": "Nada para atualizar: forneça pelo menos um campo (title, start_time, end_time, location, notes)."}
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        target_id = id
+        if target_id is None:
+            if not match_text or not date_local:
+                return {"status": "error", "message": "Sem 'id': informe match_text E date_local para localizar o evento."}
+            target_id = _find_event_id(cur, match_text, date_local)
+            if target_id is None:
+                return {"status": "error", "message": "Nenhum evento encontrado para os filtros fornecidos."}
+
+        cur.execute(
+            "SELECT start_time, end_time FROM events WHERE id = %s AND user_id = %s AND cancelled_at IS NULL;",
+            (target_id, get_user_id()),
+        )
+        current = cur.fetchone()
+        if not current:
+            return {"status": "error", "message": "Evento não encontrado ou cancelado."}
+
+        new_start = _parse_local_ts(start_time) if start_time else current[0]
+        if end_time:
+            new_end = _parse_local_ts(end_time)
+        elif start_time and current[1]:
+            # Remarcação sem fim explícito preserva a duração original
+            new_end = new_start + (current[1] - current[0])
+        else:
+            new_end = current[1]
+        if new_end is not None and new_end < new_start:
+            return {"status": "error", "message": "end_time deve ser posterior a start_time."}
+
+        if start_time or end_time:
+            conflicts = _overlapping_events(cur, new_start, new_end, exclude_id=target_id)
+            if conflicts:
+                return {"status": "conflict", "id": target_id, "conflicts": conflicts}
+
+        sets = ["start_time = %s", "end_time = %s"]
+        params: List[object] = [new_start, new_end]
+        if title is not None:
+            sets.append("title = %s")
+            params.append(title)
+        if location is not None:
+            sets.append("location = %s")
+            params.append(location)
+        if notes is not None:
+            sets.append("notes = %s")
+            params.append(notes)
+        params.extend([target_id, get_user_id()])
+
+        cur.execute(
+            f"""
+            UPDATE events e SET {', '.join(sets)}
+            WHERE e.id = %s AND e.user_id = %s
+            RETURNING {EVENT_COLUMNS};
+            """,
+            params,
+        )
+        r = cur.fetchone()
+        conn.commit()
+        return {"status": "ok", "id": target_id, "updated": _event_row(r) if r else None}
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("cancel_event", args_schema=CancelEventArgs)
+def cancel_event(
+    id: Optional[int] = None,
+    match_text: Optional[str] = None,
+    date_local: Optional[str] = None,
+) -> dict:
+    """
+    Cancela um compromisso (o registro é mantido com cancelled_at preenchido).
+    Use 'id' ou (match_text + date_local) para localizar o evento.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        target_id = id
+        if target_id is None:
+            if not match_text or not date_local:
+                return {"status": "error", "message": "Sem 'id': informe match_text E date_local para localizar o evento."}
+            target_id = _find_event_id(cur, match_text, date_local)
+            if target_id is None:
+                return {"status": "error", "message": "Nenhum evento encontrado para os filtros fornecidos."}
+
+        cur.execute(
+            f"""
+            UPDATE events e SET cancelled_at = NOW()
+            WHERE e.id = %s AND e.user_id = %s AND e.cancelled_at IS NULL
+            RETURNING {EVENT_COLUMNS};
+            """,
+            (target_id, get_user_id()),
+        )
+        r = cur.fetchone()
+        conn.commit()
+        if not r:
+            return {"status": "error", "message": "Evento não encontrado ou já cancelado."}
+        return {"status": "ok", "id": target_id, "cancelled": _event_row(r)}
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("find_conflicts", args_schema=FindConflictsArgs)
+def find_conflicts(
+    start_time: str,
+    end_time: Optional[str] = None,
+    exclude_id: Optional[int] = None,
+) -> dict:
+    """
+    Verifica se há compromissos ativos sobrepondo a janela [start_time, end_time)
+    (ou o instante start_time, ex.: "tenho algo amanhã às 9h?"). Retorna os eventos conflitantes.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        start = _parse_local_ts(start_time)
+        end = _parse_local_ts(end_time) if end_time else None
+        conflicts = _overlapping_events(cur, start, end, exclude_id=exclude_id)
+        return {"has_conflict": bool(conflicts), "conflicts": conflicts}
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("create_recurring_event", args_schema=CreateRecurringEventArgs)
+def create_recurring_event(
+    title: str,
+    start_time: str,
+    freq: str,
+    source_text: str,
+    freq_interval: int = 1,
+    by_weekday: Optional[List[int]] = None,
+    duration_minutes: int = DEFAULT_DURATION_MINUTES,
+    until_local: Optional[str] = None,
+    count: Optional[int] = None,
+    location: Optional[str] = None,
+    notes: Optional[str] = None,
+) -> dict:
+    """
+    Cria um compromisso recorrente (ex.: "toda segunda às 8h"). A série é gravada uma única vez;
+    as ocorrências aparecem em list_events, find_conflicts e find_free_slots.
+    """
+    freq = freq.strip().upper()
+    if freq not in FREQS:
+        return {"status": "error", "message": f"freq inválida (use {' | '.join(FREQS)})."}
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        dtstart = _parse_local_ts(start_time)
+        until = _parse_local_ts(until_local) + timedelta(days=1) - timedelta(microseconds=1) if until_local else None
+        cur.execute(
+            """
+            INSERT INTO event_series
+                (user_id, title, dtstart, duration, freq, freq_interval, by_weekday, until, count, location, notes, source_text)
+            VALUES
+                (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id;
+            """,
+            (get_user_id(), title, dtstart, timedelta(minutes=duration_minutes), freq, freq_interval, by_weekday,
+             until, count, location, notes, source_text),
+        )
+        new_id = cur.fetchone()[0]
+        conn.commit()
+        return {"status": "ok", "series_id": new_id}
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("update_occurrence", args_schema=UpdateOccurrenceArgs)
+def update_occurrence(
+    series_id: int,
+    occurrence_start: str,
+    cancel: bool = False,
+    new_start: Optional[str] = None,
+    new_end: Optional[str] = None,
+    title: Optional[str] = None,
+) -> dict:
+    """
+    Cancela ou remarca UMA ocorrência de um compromisso recorrente, sem alterar as demais.
+    occurrence_start é o início original retornado por list_events.
+    """
+    if not cancel and not any([new_start, new_end, title]):
+        return {"status": "error", "message": "Nada para alterar: use cancel=True ou informe new_start/new_end/title."}
+
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO event_exceptions (user_id, series_id, original_start, cancelled, new_start, new_end, title)
+            SELECT s.user_id, s.id, %s, %s, %s, %s, %s
+            FROM event_series s
+            WHERE s.id = %s AND s.user_id = %s
+            ON CONFLICT (series_id, original_start) DO UPDATE
+              SET cancelled = EXCLUDED.cancelled,
+                  new_start = EXCLUDED.new_start,
+                  new_end = EXCLUDED.new_end,
+                  title = EXCLUDED.title;
+            """,
+            (
+                _parse_local_ts(occurrence_start),
+                cancel,
+                _parse_local_ts(new_start) if new_start else None,
+                _parse_local_ts(new_end) if new_end else None,
+                title,
+                series_id,
+                get_user_id(),
+            ),
+        )
+        if not cur.rowcount:
+            conn.rollback()
+            return {"status": "error", "message": "Série não encontrada."}
+        conn.commit()
+        return {"status": "ok", "series_id": series_id, "occurrence_start": occurrence_start, "cancelled": cancel}
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("cancel_series", args_schema=CancelSeriesArgs)
+def cancel_series(series_id: int) -> dict:
+    """
+    Cancela um compromisso recorrente inteiro (todas as ocorrências futuras e passadas deixam de aparecer).
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "UPDATE event_series SET cancelled_at = NOW() WHERE id = %s AND user_id = %s AND cancelled_at IS NULL;",
+            (series_id, get_user_id()),
+        )
+        rows_affected = cur.rowcount
+        conn.commit()
+        if not rows_affected:
+            return {"status": "error", "message": "Série não encontrada ou já cancelada."}
+        return {"status": "ok", "series_id": series_id}
+
+    except Exception as e:
+        conn.rollback()
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+@tool("find_free_slots", args_schema=FindFreeSlotsArgs)
+def find_free_slots(
+    date_from_local: str,
+    date_to_local: Optional[str] = None,
+    min_duration_minutes: int = 30,
+    work_start: str = "08:00",
+    work_end: str = "18:00",
+    include_weekends: bool = True,
+    limit: int = 10,
+) -> dict:
+    """
+    Retorna os horários livres (disponibilidade) entre as datas locais informadas, dentro do expediente
+    work_start–work_end e com pelo menos min_duration_minutes cada. Ex.: "tenho janela amanhã à tarde?".
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        window_start, window_end = _local_day_window(date_from_local, date_to_local or date_from_local)
+        cur.execute(
+            """
+            SELECT lower(e.span), upper(e.span)
+            FROM events e
+            WHERE e.user_id = %s
+              AND e.cancelled_at IS NULL
+              AND e.span && tstzrange(%s, %s, '[)');
+            """,
+            (get_user_id(), window_start, window_end),
+        )
+        busy = cur.fetchall()
+        busy.extend((o.start, o.end) for o in _series_occurrences(cur, window_start, window_end))
+
+        slots = free_slots(
+            busy,
+            window_start,
+            window_end,
+            min_duration=timedelta(minutes=min_duration_minutes),
+            work_start=time.fromisoformat(work_start),
+            work_end=time.fromisoformat(work_end),
+            include_weekends=include_weekends,
+            limit=limit,
+        )
+        return {"free_slots": [
+            {"start": s.astimezone(TZ).isoformat(), "end": e.astimezone(TZ).isoformat()}
+            for s, e in slots
+        ]}
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+AGENDA_TOOLS = [
+    create_event,
+    list_events,
+    update_event,
+    cancel_event,
+    find_conflicts,
+    find_free_slots,
+    create_recurring_event,
+    update_occurrence,
+    cancel_series,
+]
+
+READ_ONLY_AGENDA_TOOLS = [
+    list_events,
+    find_conflicts,
+    find_free_slots,
+]
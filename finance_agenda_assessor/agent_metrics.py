@@ -0,0 +1,55 @@
+import threading
+from typing import Dict, List
+
+# Início do texto devolvido pelo AgentExecutor quando max_iterations interrompe o turno (early_stopping_method="force")
+STOPPED_PREFIX = "Agent stopped due to"
+
+
+def is_capped(resposta: dict) -> bool:
+    return str(resposta.get("output", "")).startswith(STOPPED_PREFIX)
+
+
+def count_iterations(resposta: dict) -> int:
+    """
+    Rodadas de LLM de um turno do AgentExecutor (precisa de return_intermediate_steps=True).
+    Tool calls emitidas na mesma resposta do modelo contam como uma rodada; a resposta final soma mais uma.
+    """
+    rounds = set()
+    for action, _ in resposta.get("intermediate_steps", []):
+        log = getattr(action, "message_log", None)
+        # Cada ação carrega sua cópia da mensagem do modelo; os ids das tool calls identificam a rodada
+        calls = getattr(log[-1], "tool_calls", None) if log else None
+        rounds.add(tuple(c.get("id") for c in calls) if calls else id(action))
+    return len(rounds) + (0 if is_capped(resposta) else 1)
+
+
+class IterationStats:
+    """Iterações por turno de cada especialista e quantos turnos bateram no teto."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: Dict[str, List[int]] = {}
+        self._capped: Dict[str, int] = {}
+
+    def record(self, route: str, resposta: dict) -> int:
+        iterations = count_iterations(resposta)
+        with self._lock:
+            self._turns.setdefault(route, []).append(iterations)
+            if is_capped(resposta):
+                self._capped[route] = self._capped.get(route, 0) + 1
+        return iterations
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for route, turns in self._turns.items():
+                out[route] = {
+                    "turnos": len(turns),
+                    "iteracoes_media": round(sum(turns) / len(turns), 2),
+                    "iteracoes_max": max(turns),
+                    "turnos_no_teto": self._capped.get(route, 0),
+                }
+            return out
+
+
+iteration_stats = IterationStats()
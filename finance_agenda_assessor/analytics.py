@@ -0,0 +1,218 @@
+from datetime import date, datetime
+from typing import Dict, NamedTuple, Optional
+from zoneinfo import ZoneInfo
+import numpy as np
+from langchain.tools import tool
+from pydantic import BaseModel, Field
+from pg_tools import get_conn, close_conn
+from ledger_snapshot import snapshot_for_analytics
+from session_context import get_user_id
+
+TZ = ZoneInfo("America/Sao_Paulo")
+EPOCH = date(1970, 1, 1)
+
+INCOME, EXPENSES, TRANSFER = 1, 2, 3
+
+
+class Ledger(NamedTuple):
+    """Histórico de transações em colunas NumPy, ordenado por dia local."""
+    day: np.ndarray        # int32, dias desde 1970-01-01 (America/Sao_Paulo)
+    amount: np.ndarray     # float64
+    type: np.ndarray       # int8 (1=INCOME, 2=EXPENSES, 3=TRANSFER)
+    category: np.ndarray   # int16, 0 = sem categoria
+
+
+def epoch_day(d: date) -> int:
+    return (d - EPOCH).days
+
+
+def ledger_from_rows(rows) -> Ledger:
+    if not rows:
+        return Ledger(np.empty(0, np.int32), np.empty(0, np.float64), np.empty(0, np.int8), np.empty(0, np.int16))
+    day, amount, type_, category = zip(*rows)
+    return Ledger(
+        np.asarray(day, dtype=np.int32),
+        np.asarray(amount, dtype=np.float64),
+        np.asarray(type_, dtype=np.int8),
+        np.asarray(category, dtype=np.int16),
+    )
+
+
+def load_ledger(cur, user_id: str) -> Ledger:
+    """Carrega todo o histórico do usuário numa única consulta, já convertido para colunas numéricas."""
+    cur.execute(
+        """
+        SELECT ((t.occurred_at AT TIME ZONE 'America/Sao_Paulo')::date - DATE '1970-01-01') AS epoch_day,
+               t.amount::float8,
+               t.type,
+               COALESCE(t.category_id, 0)
+        FROM transactions t
+        WHERE t.user_id = %s
+        ORDER BY t.occurred_at;
+        """,
+        (user_id,),
+    )
+    return ledger_from_rows(cur.fetchall())
+
+
+def signed_amounts(ledger: Ledger) -> np.ndarray:
+    """INCOME positivo, EXPENSES negativo, TRANSFER zero."""
+    return np.where(ledger.type == INCOME, ledger.amount, np.where(ledger.type == EXPENSES, -ledger.amount, 0.0))
+
+
+def daily_totals(ledger: Ledger, first_day: int, last_day: int, type_id: Optional[int] = None) -> np.ndarray:
+    """Soma por dia em [first_day, last_day]; sem type_id, usa o saldo (INCOME - EXPENSES)."""
+    mask = (ledger.day >= first_day) & (ledger.day <= last_day)
+    weights = signed_amounts(ledger) if type_id is None else np.where(ledger.type == type_id, ledger.amount, 0.0)
+    return np.bincount(ledger.day[mask] - first_day, weights=weights[mask], minlength=last_day - first_day + 1)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Média móvel por soma acumulada; as primeiras window-1 posições usam a janela parcial."""
+    csum = np.cumsum(np.insert(values, 0, 0.0))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (csum[idx] - csum[lo]) / (idx - lo)
+
+
+def month_index(days: np.ndarray) -> np.ndarray:
+    """Meses desde 1970-01 para cada dia epoch."""
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def monthly_totals(ledger: Ledger, first_month: int, n_months: int, type_id: int) -> np.ndarray:
+    months = month_index(ledger.day) - first_month
+    mask = (ledger.type == type_id) & (months >= 0) & (months < n_months)
+    return np.bincount(months[mask], weights=ledger.amount[mask], minlength=n_months)
+
+
+def category_month_matrix(ledger: Ledger, first_month: int, n_months: int, n_categories: int,
+                          type_id: int = EXPENSES) -> np.ndarray:
+    """Matriz (categoria x mês) de totais, montada com um único bincount."""
+    months = month_index(ledger.day) - first_month
+    mask = (ledger.type == type_id) & (months >= 0) & (months < n_months) & (ledger.category < n_categories)
+    flat = ledger.category[mask].astype(np.int64) * n_months + months[mask]
+    return np.bincount(flat, weights=ledger.amount[mask], minlength=n_categories * n_months).reshape(n_categories, n_months)
+
+
+def linear_trend(matrix: np.ndarray) -> np.ndarray:
+    """Inclinação por linha (variação por mês) via mínimos quadrados, vetorizada sobre todas as linhas."""
+    x = np.arange(matrix.shape[1], dtype=np.float64)
+    x -= x.mean()
+    denom = (x ** 2).sum()
+    if denom == 0:
+        return np.zeros(matrix.shape[0])
+    return (matrix - matrix.mean(axis=1, keepdims=True)) @ x / denom
+
+
+def month_end_projection(ledger: Ledger, today: date, type_id: int = EXPENSES, lookback_days: int = 90) -> Dict[str, float]:
+    """
+    Projeção de fim de mês: acumulado do mês + média diária recente x dias restantes.
+    A média vem dos lookback_days anteriores ao mês corrente, para não depender de poucos dias do mês.
+    """
+    month_start = today.replace(day=1)
+    next_month = date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+    first, t, end = epoch_day(month_start), epoch_day(today), epoch_day(next_month) - 1
+
+    month_to_date = float(daily_totals(ledger, first, t, type_id).sum())
+    history = daily_totals(ledger, first - lookback_days, first - 1, type_id)
+    daily_avg = float(history.mean()) if history.size else 0.0
+    elapsed = t - first + 1
+    remaining = end - t
+    run_rate = month_to_date / elapsed
+    return {
+        "acumulado_mes": round(month_to_date, 2),
+        "media_diaria_historica": round(daily_avg, 2),
+        "ritmo_diario_mes": round(run_rate, 2),
+        "projecao_fim_mes": round(month_to_date + daily_avg * remaining, 2),
+        "projecao_ritmo_atual": round(month_to_date + run_rate * remaining, 2),
+    }
+
+
+def health_report(ledger: Ledger, today: date, category_names: Dict[int, str], months: int = 6) -> dict:
+    """Tendências mês a mês, médias móveis, tendência por categoria e projeção do mês corrente."""
+    current_month = month_index(np.asarray([epoch_day(today)]))[0]
+    first_month = current_month - months + 1
+
+    income = monthly_totals(ledger, first_month, months, INCOME)
+    expenses = monthly_totals(ledger, first_month, months, EXPENSES)
+
+    t = epoch_day(today)
+    net_daily = daily_totals(ledger, t - 89, t)
+    expenses_daily = daily_totals(ledger, t - 89, t, EXPENSES)
+
+    n_categories = int(max(category_names, default=0)) + 1
+    if ledger.category.size:
+        n_categories = max(n_categories, int(ledger.category.max()) + 1)
+    matrix = category_month_matrix(ledger, first_month, months, n_categories)
+    # O mês corrente ainda está incompleto; a tendência usa só os meses fechados
+    closed = matrix[:, :-1] if months > 1 else matrix
+    slopes = linear_trend(closed)
+    order = np.argsort(-slopes)
+    trends = [
+        {
+            "categoria": category_names.get(int(c), "sem categoria"),
+            "variacao_mensal": round(float(slopes[c]), 2),
+            "media_mensal": round(float(closed[c].mean()), 2),
+        }
+        for c in order if matrix[c].any()
+    ]
+
+    labels = (np.arange(first_month, current_month + 1)).astype("datetime64[M]").astype(str)
+    # Mês a mês compara os dois últimos meses fechados; o corrente entra só na projeção
+    last_closed, prev_closed = (expenses[-2], expenses[-3]) if months > 2 else (0.0, 0.0)
+    closed_income = income[:-1].sum()
+    return {
+        "meses": [
+            {"mes": str(m), "receitas": round(float(i), 2), "despesas": round(float(e), 2), "saldo": round(float(i - e), 2)}
+            for m, i, e in zip(labels, income, expenses)
+        ],
+        "variacao_despesas_mes_a_mes": (
+            round(float((last_closed - prev_closed) / prev_closed), 4) if prev_closed else None
+        ),
+        "taxa_poupanca_meses_fechados": (
+            round(float((closed_income - expenses[:-1].sum()) / closed_income), 4) if closed_income else None
+        ),
+        "media_movel_despesa_diaria": {
+            "7d": round(float(rolling_mean(expenses_daily, 7)[-1]), 2),
+            "30d": round(float(rolling_mean(expenses_daily, 30)[-1]), 2),
+            "90d": round(float(expenses_daily.mean()), 2),
+        },
+        "saldo_90d": round(float(net_daily.sum()), 2),
+        "tendencia_categorias": trends,
+        "projecao": month_end_projection(ledger, today),
+    }
+
+
+class FinancialHealthArgs(BaseModel):
+    months: int = Field(default=6, description="Quantidade de meses (incluindo o atual) na análise de tendência.")
+    today_local: Optional[str] = Field(default=None, description="Data de referência YYYY-MM-DD (padrão: hoje).")
+
+
+@tool("financial_health", args_schema=FinancialHealthArgs)
+def financial_health(months: int = 6, today_local: Optional[str] = None) -> dict:
+    """
+    Resumo da saúde financeira: receitas/despesas/saldo mês a mês, variação contra o mês anterior,
+    taxa de poupança, médias móveis de despesa diária, categorias em alta/baixa e projeção de gastos
+    até o fim do mês. Use para "como está minha saúde financeira?" ou "vou fechar o mês no azul?".
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        today = date.fromisoformat(today_local) if today_local else datetime.now(TZ).date()
+        snap = snapshot_for_analytics(cur)
+        ledger = Ledger(*snap.columns()) if snap is not None else load_ledger(cur, get_user_id())
+        cur.execute("SELECT id, name FROM categories WHERE user_id IS NULL OR user_id = %s;", (get_user_id(),))
+        category_names = dict(cur.fetchall())
+        return health_report(ledger, today, category_names, max(1, months))
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
+
+ANALYTICS_TOOLS = [
+    financial_health,
+]
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("America/Sao_Paulo")
+
+Interval = Tuple[datetime, datetime]
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """
+    Une intervalos ocupados sobrepostos ou encostados (varredura única após ordenar por início).
+    Intervalos de duração zero são mantidos, pois um instante ocupado também bloqueia a agenda.
+    """
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def working_windows(
+    window_start: datetime,
+    window_end: datetime,
+    work_start: time = time(8, 0),
+    work_end: time = time(18, 0),
+    include_weekends: bool = True,
+    tz: ZoneInfo = TZ,
+) -> List[Interval]:
+    """Janelas de expediente de cada dia local, recortadas a [window_start, window_end)."""
+    windows: List[Interval] = []
+    day = window_start.astimezone(tz).date()
+    last_day = window_end.astimezone(tz).date()
+    while day <= last_day:
+        if include_weekends or day.weekday() < 5:
+            start = max(datetime.combine(day, work_start, tzinfo=tz), window_start)
+            end = min(datetime.combine(day, work_end, tzinfo=tz), window_end)
+            if start < end:
+                windows.append((start, end))
+        day += timedelta(days=1)
+    return windows
+
+
+def free_slots(
+    busy: Iterable[Interval],
+    window_start: datetime,
+    window_end: datetime,
+    min_duration: timedelta = timedelta(minutes=30),
+    work_start: time = time(8, 0),
+    work_end: time = time(18, 0),
+    include_weekends: bool = True,
+    limit: Optional[int] = None,
+    tz: ZoneInfo = TZ,
+) -> List[Interval]:
+    """
+    Calcula os horários livres dentro do expediente entre window_start e window_end.
+
+    Os intervalos ocupados são unidos uma vez e percorridos junto com as janelas diárias
+    por um único ponteiro, então janelas de vários dias custam O(eventos + dias).
+    """
+    merged = merge_intervals(busy)
+    slots: List[Interval] = []
+    i = 0
+    for day_start, day_end in working_windows(window_start, window_end, work_start, work_end, include_weekends, tz):
+        # Ocupações que terminam antes desta janela não afetam as próximas
+        while i < len(merged) and merged[i][1] <= day_start:
+            i += 1
+        cursor = day_start
+        j = i
+        while j < len(merged) and merged[j][0] < day_end:
+            b_start, b_end = merged[j]
+            if b_start - cursor >= min_duration:
+                slots.append((cursor, b_start))
+            if b_end > cursor:
+                cursor = b_end
+            j += 1
+        if day_end - cursor >= min_duration:
+            slots.append((cursor, day_end))
+        if limit is not None and len(slots) >= limit:
+            return slots[:limit]
+    return slots
@@ -0,0 +1,73 @@
+"""
+Benchmark do módulo analytics sobre 10 anos de transações sintéticas.
+
+Uso: python bench_analytics.py [transacoes_por_dia]
+"""
+import sys
+import time as clock
+from datetime import date, timedelta
+
+import numpy as np
+
+from analytics import (
+    EPOCH, EXPENSES, INCOME, Ledger, category_month_matrix, epoch_day, health_report, month_index, monthly_totals,
+)
+
+CATEGORIES = {i + 1: name for i, name in enumerate(
+    ["comida", "besteira", "estudo", "férias", "transporte", "moradia", "saúde", "lazer", "contas",
+     "investimento", "presente", "outros"]
+)}
+
+
+def synthetic_ledger(per_day: int, years: int = 10, seed: int = 42) -> Ledger:
+    rng = np.random.default_rng(seed)
+    first = epoch_day(date(2016, 1, 1))
+    days = years * 365
+    n = per_day * days
+    day = np.sort(rng.integers(first, first + days, n)).astype(np.int32)
+    type_ = np.where(rng.random(n) < 0.1, INCOME, EXPENSES).astype(np.int8)
+    amount = np.where(type_ == INCOME, rng.gamma(2.0, 1500.0, n), rng.gamma(1.5, 60.0, n)).round(2)
+    category = rng.integers(0, len(CATEGORIES) + 1, n).astype(np.int16)
+    return Ledger(day, amount, type_, category)
+
+
+def python_monthly_totals(ledger: Ledger, first_month: int, n_months: int, type_id: int):
+    """Referência em Python puro (laço por transação), equivalente a agregar linha a linha."""
+    totals = [0.0] * n_months
+    for d, a, t in zip(ledger.day.tolist(), ledger.amount.tolist(), ledger.type.tolist()):
+        if t != type_id:
+            continue
+        day = EPOCH + timedelta(days=d)
+        m = (day.year - 1970) * 12 + day.month - 1 - first_month
+        if 0 <= m < n_months:
+            totals[m] += a
+    return totals
+
+
+def timed(fn, repeat=5):
+    t0 = clock.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (clock.perf_counter() - t0) / repeat * 1e3
+
+
+if __name__ == "__main__":
+    per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    ledger = synthetic_ledger(per_day)
+    today = date(2025, 12, 20)
+    n_months = 120
+    first_month = month_index(np.asarray([epoch_day(today)]))[0] - n_months + 1
+    print(f"{len(ledger.day):,} transações em 10 anos ({ledger.day.nbytes + ledger.amount.nbytes + ledger.type.nbytes + ledger.category.nbytes:,} bytes em colunas)")
+
+    vec, t_vec = timed(lambda: monthly_totals(ledger, first_month, n_months, EXPENSES))
+    print(f"monthly_totals (120 meses)          {t_vec:9.2f} ms")
+
+    _, t_matrix = timed(lambda: category_month_matrix(ledger, first_month, n_months, len(CATEGORIES) + 1))
+    print(f"category_month_matrix (13 x 120)    {t_matrix:9.2f} ms")
+
+    _, t_report = timed(lambda: health_report(ledger, today, CATEGORIES, months=12))
+    print(f"health_report (12 meses)            {t_report:9.2f} ms")
+
+    ref, t_ref = timed(lambda: python_monthly_totals(ledger, first_month, n_months, EXPENSES), repeat=1)
+    assert np.allclose(ref, vec), "monthly_totals diverge da referência em Python"
+    print(f"monthly_totals em Python puro       {t_ref:9.2f} ms (resultado conferido)")
@@ -0,0 +1,77 @@
+"""
+Benchmark do motor de disponibilidade com milhares de eventos sintéticos.
+
+Uso: python bench_availability.py [n_eventos] [dias]
+"""
+import random
+import sys
+import time as clock
+from datetime import datetime, timedelta
+
+from availability import TZ, free_slots, merge_intervals
+
+
+def synthetic_events(n: int, days: int, seed: int = 42):
+    rnd = random.Random(seed)
+    origin = datetime(2025, 1, 1, tzinfo=TZ)
+    events = []
+    for _ in range(n):
+        start = origin + timedelta(days=rnd.randrange(days), minutes=rnd.randrange(6 * 60, 21 * 60, 15))
+        events.append((start, start + timedelta(minutes=rnd.choice([15, 30, 45, 60, 90, 120]))))
+    return origin, events
+
+
+def naive_free_slots(busy, window_start, window_end, min_duration):
+    """Referência minuto a minuto, usada só para conferir o resultado em janelas pequenas."""
+    slots, cursor, run_start = [], window_start, None
+    while cursor < window_end:
+        local = cursor.astimezone(TZ)
+        in_work = 8 <= local.hour < 18
+        occupied = any(s <= cursor < e or s == e == cursor for s, e in busy)
+        if in_work and not occupied:
+            run_start = run_start or cursor
+        elif run_start:
+            if cursor - run_start >= min_duration:
+                slots.append((run_start, cursor))
+            run_start = None
+        cursor += timedelta(minutes=1)
+    if run_start and window_end - run_start >= min_duration:
+        slots.append((run_start, window_end))
+    return slots
+
+
+def bench(n_events: int, days: int, repeat: int = 20):
+    origin, events = synthetic_events(n_events, days)
+    window_end = origin + timedelta(days=days)
+    min_duration = timedelta(minutes=30)
+
+    t0 = clock.perf_counter()
+    for _ in range(repeat):
+        merged = merge_intervals(events)
+    t_merge = (clock.perf_counter() - t0) / repeat
+
+    t0 = clock.perf_counter()
+    for _ in range(repeat):
+        slots = free_slots(events, origin, window_end, min_duration)
+    t_slots = (clock.perf_counter() - t0) / repeat
+
+    print(f"{n_events:>7} eventos / {days:>4} dias: merge {t_merge * 1e3:8.2f} ms "
+          f"({len(merged)} blocos), free_slots {t_slots * 1e3:8.2f} ms ({len(slots)} livres)")
+
+
+def check(days: int = 3):
+    origin, events = synthetic_events(20, days, seed=7)
+    window_end = origin + timedelta(days=days)
+    expected = naive_free_slots(events, origin, window_end, timedelta(minutes=30))
+    got = free_slots(events, origin, window_end, timedelta(minutes=30))
+    assert got == expected, "free_slots diverge da referência"
+    print(f"conferência com referência minuto a minuto: ok ({len(got)} livres)")
+
+
+if __name__ == "__main__":
+    check()
+    if len(sys.argv) > 1:
+        bench(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 365)
+    else:
+        for n, d in [(1_000, 30), (5_000, 365), (20_000, 365), (50_000, 3650)]:
+            bench(n, d)
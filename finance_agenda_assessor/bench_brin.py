@@ -0,0 +1,167 @@
+"""
+Benchmark do perfil BRIN x B-tree para occurred_at em transactions.
+
+Cria um schema descartável (bench_brin) no banco de DATABASE_URL com duas cópias da tabela, com
+poucos usuários intercalados (cenário do perfil BRIN: poucos usuários por shard): uma com as B-trees
+de tempo do perfil 'btree' ((user_id, occurred_at), occurred_at e dia local) e outra com o BRIN em
+(user_id, occurred_at) de set_transactions_index_profile('brin'). Compara tamanho dos índices, vazão
+de inserção em ordem de tempo e latência da consulta das tools (user_id + intervalo de dias locais), e
+confere pelo EXPLAIN que o planner usa o BRIN nela. O schema é removido no final.
+
+Uso: python bench_brin.py [anos] [transacoes_por_dia] [usuarios]
+"""
+import json
+import statistics
+import sys
+import time as clock
+
+from psycopg2.extras import execute_values
+
+from pg_tools import _local_range_filter_sql, get_conn
+
+SCHEMA = "bench_brin"
+
+COLUMNS = """
+    id BIGSERIAL PRIMARY KEY, user_id TEXT NOT NULL, amount NUMERIC(14,2) NOT NULL, type INT NOT NULL, category_id INT,
+    description TEXT, payment_method VARCHAR(32), occurred_at TIMESTAMPTZ NOT NULL, source_text TEXT NOT NULL
+"""
+
+PROFILES = {
+    "tx_btree": [
+        "CREATE INDEX tx_btree_user_time ON {t} (user_id, occurred_at DESC)",
+        "CREATE INDEX tx_btree_occurred_at ON {t} (occurred_at DESC)",
+        "CREATE INDEX tx_btree_localday ON {t} (user_id, ((occurred_at AT TIME ZONE 'America/Sao_Paulo')::date))",
+    ],
+    "tx_brin": [
+        "CREATE INDEX tx_brin_user_time ON {t} USING BRIN (user_id, occurred_at) WITH (pages_per_range = 32, autosummarize = on)",
+        "ALTER TABLE {t} SET (fillfactor = 100)",
+    ],
+}
+
+QUERY = """
+SELECT
+    COALESCE(SUM(CASE WHEN t.type = 1 THEN t.amount END), 0)
+    - COALESCE(SUM(CASE WHEN t.type = 2 THEN t.amount END), 0)
+FROM {table} t
+WHERE t.user_id = %s AND {where}
+"""
+
+WINDOWS = [
+    ("1 dia", "2024-03-15", "2024-03-15"),
+    ("1 semana", "2024-03-11", "2024-03-17"),
+    ("1 mês", "2024-03-01", "2024-03-31"),
+]
+
+BULK_SQL = """
+INSERT INTO {t} (user_id, amount, type, category_id, description, payment_method, occurred_at, source_text)
+SELECT 'u' || (g %% %s), round((random() * 300)::numeric, 2),
+       CASE WHEN random() < 0.1 THEN 1 ELSE 2 END,
+       1 + (random() * 11)::int, 'sintético', 'pix',
+       %s::timestamptz + (g::float8 / %s) * INTERVAL '1 day',
+       'bench'
+FROM generate_series(%s, %s - 1) AS g
+"""
+
+
+def setup(cur, years: int, per_day: int, users: int) -> dict:
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+    origin = f"{2025 - years}-01-01 00:00-03"
+    total = years * 365 * per_day
+    chunk = 30 * per_day
+    bulk = {}
+    for table, ddl in PROFILES.items():
+        t = f"{SCHEMA}.{table}"
+        cur.execute(f"CREATE TABLE {t} ({COLUMNS});")
+        for stmt in ddl:
+            cur.execute(stmt.format(t=t))
+        # Carga em lotes mensais, em ordem de tempo, com os índices já presentes (como em produção)
+        t0 = clock.perf_counter()
+        for lo in range(0, total, chunk):
+            cur.execute(BULK_SQL.format(t=t), (users, origin, per_day, lo, min(lo + chunk, total)))
+        bulk[table] = total / (clock.perf_counter() - t0)
+        # VACUUM também sumariza os intervalos do BRIN ainda não cobertos
+        cur.execute(f"VACUUM ANALYZE {t};")
+    return bulk
+
+
+def single_row_inserts(cur, table: str, n: int = 2000) -> float:
+    """Vazão de inserções pequenas no fim da tabela, como as de add_transaction."""
+    cur.execute(f"SELECT max(occurred_at) FROM {SCHEMA}.{table}")
+    last = cur.fetchone()[0]
+    rows = [("u0", 12.5, 2, 1, "bench", "pix", last, "bench")] * n
+    t0 = clock.perf_counter()
+    for i in range(0, n, 10):
+        execute_values(
+            cur,
+            f"INSERT INTO {SCHEMA}.{table} (user_id, amount, type, category_id, description, payment_method, occurred_at, source_text) VALUES %s",
+            rows[i:i + 10],
+        )
+    return n / (clock.perf_counter() - t0)
+
+
+def index_sizes(cur, table: str) -> int:
+    cur.execute(
+        """
+        SELECT COALESCE(SUM(pg_relation_size(i.indexrelid)), 0)
+        FROM pg_index i
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+        """,
+        (f"{SCHEMA}.{table}",),
+    )
+    return int(cur.fetchone()[0])
+
+
+def plan_index_names(plan) -> set:
+    found, stack = set(), [plan]
+    while stack:
+        node = stack.pop()
+        if "Index Name" in node:
+            found.add(node["Index Name"])
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+def measure(cur, table: str, date_from: str, date_to: str, repeat: int = 15):
+    sql = QUERY.format(table=f"{SCHEMA}.{table}", where=_local_range_filter_sql("t.occurred_at"))
+    params = ("u0", date_from, date_to)
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    timings = []
+    for _ in range(repeat):
+        t0 = clock.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchone()
+        timings.append((clock.perf_counter() - t0) * 1e3)
+    return statistics.median(timings), plan_index_names(plan[0]["Plan"])
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        bulk = setup(cur, years, per_day, users)
+        print(f"{years * 365 * per_day:,} transações de {users} usuários em {years} anos\n")
+        for table in PROFILES:
+            print(f"{table:<9} índices de tempo: {index_sizes(cur, table) / 1024:10.1f} KB | "
+                  f"carga em lote: {bulk[table]:10,.0f} linhas/s | "
+                  f"inserções pequenas: {single_row_inserts(cur, table):8,.0f} linhas/s")
+        for table in PROFILES:
+            cur.execute(f"VACUUM ANALYZE {SCHEMA}.{table};")
+
+        print(f"\n{'janela':<10} {'B-tree':>12} {'BRIN':>12}  índice usado (BRIN)")
+        for label, date_from, date_to in WINDOWS:
+            btree_ms, _ = measure(cur, "tx_btree", date_from, date_to)
+            brin_ms, used = measure(cur, "tx_brin", date_from, date_to)
+            print(f"{label:<10} {btree_ms:>9.2f} ms {brin_ms:>9.2f} ms  {', '.join(sorted(used)) or 'nenhum'}")
+            # Conferência do planner: a consulta das tools (user_id + intervalo) precisa ser atendida pelo BRIN
+            assert "tx_brin_user_time" in used, f"planner não usou o BRIN para {label}"
+        print("\nplanner: consultas por usuário e intervalo usam tx_brin_user_time (ok)")
+    finally:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        cur.close()
+        conn.close()
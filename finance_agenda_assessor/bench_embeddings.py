@@ -0,0 +1,102 @@
+"""
+Benchmark dos backends de embedding sobre o corpus do FAQ (mesmos chunks do faq_tools).
+
+Para cada backend mede:
+- o tempo para embedar todos os chunks (ingestão);
+- a latência de embedar uma pergunta (mediana e p95) — é o custo pago a cada consulta ao FAQ;
+- recall@1, @3 e @TOP_K da busca vetorial pura (sem BM25) num conjunto de perguntas parafraseadas,
+  em que o gabarito são os chunks que contêm um trecho característico da resposta.
+
+O backend "gemini" só roda com GEMINI_API_KEY e acesso à rede; sem isso é pulado.
+
+Uso: python bench_embeddings.py [backend ...]   (padrão: local gemini)
+"""
+import statistics
+import sys
+import time as clock
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.vectorstores import FAISS
+
+import embedding_backends
+from faq_tools import PDF_PATH, TOP_K, _splitter
+
+# (pergunta, trecho que identifica os chunks que respondem)
+QUERIES = [
+    ("Posso apagar um lançamento que registrei errado?", "Não é possível excluir, apagar"),
+    ("O assistente consegue ler planilhas ou PDFs que eu mandar?", "Não há leitura, abertura, extração"),
+    ("Ele faz pagamentos ou transferências por mim?", "Não há execução de pagamentos"),
+    ("Qual o telefone de atendimento?", "4000-1234"),
+    ("Como falo com o suporte por e-mail?", "suporte@assessoria.ai"),
+    ("Meus dados pessoais são repassados para outras empresas?", "Não há compartilhamento de dados pessoais"),
+    ("O assistente manda convite de reunião para outras pessoas?", "Não há envio de convites"),
+    ("O serviço vai pedir a senha do meu banco?", "não solicita senhas"),
+    ("O que significa período relativo?", "Período relativo"),
+    ("O Assessor substitui um contador?", "profissional qualificado, como contador"),
+    ("Quais exemplos de pedidos são permitidos?", "6.3.1. Permitido"),
+    ("O assistente faz tarefas sozinho em segundo plano?", "Não há execução autônoma"),
+    ("Quem deve conferir os valores e datas informados?", "revisar, confirmar e validar"),
+    ("Qual a data de vigência do documento?", "Data de vigência"),
+    ("O que acontece quando falta alguma informação no pedido?", "apenas o mínimo necessário"),
+    ("O assistente lembra do que falei antes na conversa?", "contexto recente"),
+]
+
+
+def load_chunks():
+    return _splitter.split_documents(PyPDFLoader(PDF_PATH).load())
+
+
+def evaluate(backend: str, chunks) -> dict:
+    embeddings = embedding_backends.get_embeddings(backend)
+    texts = [c.page_content for c in chunks]
+
+    t0 = clock.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    ingest_ms = (clock.perf_counter() - t0) * 1e3
+    db = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings)
+
+    latencies = []
+    recall = {1: [], 3: [], TOP_K: []}
+    for question, needle in QUERIES:
+        relevant = {t for t in texts if needle in t}
+        assert relevant, f"trecho ausente do corpus: {needle!r}"
+        t0 = clock.perf_counter()
+        vector = embeddings.embed_query(question)
+        latencies.append((clock.perf_counter() - t0) * 1e3)
+        ranked = [d.page_content for d in db.similarity_search_by_vector(vector, k=TOP_K)]
+        for k in recall:
+            recall[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+
+    latencies.sort()
+    return {
+        "ingestao_ms": ingest_ms,
+        "consulta_mediana_ms": statistics.median(latencies),
+        "consulta_p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        **{f"recall@{k}": sum(v) / len(v) for k, v in recall.items()},
+    }
+
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or ["local", "gemini"]
+    chunks = load_chunks()
+    print(f"{len(chunks)} chunks, {len(QUERIES)} perguntas, modelo local {embedding_backends.model_name('local')}\n")
+
+    results = {}
+    for backend in backends:
+        if backend == "gemini" and not embedding_backends.GEMINI_API_KEY:
+            print("gemini: pulado (sem GEMINI_API_KEY)")
+            continue
+        try:
+            results[backend] = evaluate(backend, chunks)
+        except Exception as e:
+            print(f"{backend}: falhou ({type(e).__name__}: {e})")
+
+    columns = ["ingestao_ms", "consulta_mediana_ms", "consulta_p95_ms", "recall@1", "recall@3", f"recall@{TOP_K}"]
+    print(f"\n{'backend':<8}" + "".join(f"{c:>21}" for c in columns))
+    for backend, r in results.items():
+        print(f"{backend:<8}" + "".join(f"{r[c]:>21.3f}" for c in columns))
+
+    if "local" in results and "gemini" in results:
+        speedup = results["gemini"]["consulta_mediana_ms"] / results["local"]["consulta_mediana_ms"]
+        print(f"\nlocal embeda a pergunta {speedup:.0f}x mais rápido; "
+              f"recall@{TOP_K} {results['local'][f'recall@{TOP_K}']:.2f} vs {results['gemini'][f'recall@{TOP_K}']:.2f}")
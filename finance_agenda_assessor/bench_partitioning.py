@@ -0,0 +1,123 @@
+"""
+Benchmark de consultas por intervalo: transactions em heap único x particionada por mês.
+
+Cria um schema descartável (bench_partitioning) no banco de DATABASE_URL com as duas variantes
+preenchidas com o mesmo histórico sintético, roda as consultas de saldo por intervalo usadas pelas tools
+(user_id + intervalo de dias locais, como nas tools) e mostra latência mediana e quantas partições cada
+plano lê. O schema é removido no final.
+
+Uso: python bench_partitioning.py [anos] [transacoes_por_dia] [usuarios]
+"""
+import json
+import statistics
+import sys
+import time as clock
+
+from pg_tools import _local_range_filter_sql, get_conn
+
+SCHEMA = "bench_partitioning"
+
+QUERY = """
+SELECT
+    COALESCE(SUM(CASE WHEN t.type = 1 THEN t.amount END), 0)
+    - COALESCE(SUM(CASE WHEN t.type = 2 THEN t.amount END), 0)
+FROM {table} t
+WHERE t.user_id = %s AND {where}
+"""
+
+WINDOWS = [
+    ("1 dia", "2024-03-15", "2024-03-15"),
+    ("1 mês", "2024-03-01", "2024-03-31"),
+    ("1 trimestre", "2024-01-01", "2024-03-31"),
+    ("1 ano", "2023-01-01", "2023-12-31"),
+]
+
+
+def setup(cur, years: int, per_day: int, users: int):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+    columns = """
+        id BIGINT NOT NULL, user_id TEXT NOT NULL, amount NUMERIC(14,2) NOT NULL, type INT NOT NULL, category_id INT,
+        description TEXT, payment_method VARCHAR(32), occurred_at TIMESTAMPTZ NOT NULL, source_text TEXT NOT NULL
+    """
+    cur.execute(f"CREATE TABLE {SCHEMA}.tx_plain ({columns}, PRIMARY KEY (id));")
+    cur.execute(f"CREATE TABLE {SCHEMA}.tx_part ({columns}, PRIMARY KEY (id, occurred_at)) PARTITION BY RANGE (occurred_at);")
+    cur.execute(f"""
+        DO $$
+        DECLARE m DATE := DATE '2025-01-01' - make_interval(years => {years});
+        BEGIN
+          WHILE m < DATE '2025-02-01' LOOP
+            EXECUTE format('CREATE TABLE {SCHEMA}.%I PARTITION OF {SCHEMA}.tx_part FOR VALUES FROM (%L) TO (%L)',
+                           'tx_part_' || to_char(m, 'YYYYMM'),
+                           m::timestamp AT TIME ZONE 'America/Sao_Paulo',
+                           (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'America/Sao_Paulo');
+            m := (m + INTERVAL '1 month')::date;
+          END LOOP;
+        END $$;
+    """)
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.tx_plain
+        SELECT g,
+               'u' || (g % {users}),
+               round((random() * 300)::numeric, 2),
+               CASE WHEN random() < 0.1 THEN 1 ELSE 2 END,
+               1 + (random() * 11)::int,
+               'sintético', 'pix',
+               (TIMESTAMPTZ '2025-01-01 00:00-03' - make_interval(years => {years}))
+                 + (g::float8 / {per_day}) * INTERVAL '1 day',
+               'bench'
+        FROM generate_series(0, {years} * 365 * {per_day} - 1) AS g;
+    """)
+    cur.execute(f"INSERT INTO {SCHEMA}.tx_part SELECT * FROM {SCHEMA}.tx_plain;")
+    for table in ("tx_plain", "tx_part"):
+        cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} (user_id, occurred_at DESC);")
+        cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} (user_id, category_id, occurred_at DESC);")
+        cur.execute(f"ANALYZE {SCHEMA}.{table};")
+
+
+def scanned_relations(plan) -> set:
+    found = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "Relation Name" in node:
+            found.add(node["Relation Name"])
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+def measure(cur, table: str, date_from: str, date_to: str, repeat: int = 15):
+    sql = QUERY.format(table=f"{SCHEMA}.{table}", where=_local_range_filter_sql("t.occurred_at"))
+    params = ("u0", date_from, date_to)
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    relations = scanned_relations(plan[0]["Plan"])
+    timings = []
+    for _ in range(repeat):
+        t0 = clock.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchone()
+        timings.append((clock.perf_counter() - t0) * 1e3)
+    return statistics.median(timings), len(relations)
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    conn = get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        t0 = clock.perf_counter()
+        setup(cur, years, per_day, users)
+        print(f"{years * 365 * per_day:,} transações de {users} usuários em {years} anos carregadas em {clock.perf_counter() - t0:.1f}s\n")
+        print(f"{'janela':<12} {'heap único':>14} {'particionada':>14} {'partições lidas':>16}")
+        for label, date_from, date_to in WINDOWS:
+            plain_ms, _ = measure(cur, "tx_plain", date_from, date_to)
+            part_ms, n_parts = measure(cur, "tx_part", date_from, date_to)
+            print(f"{label:<12} {plain_ms:>11.2f} ms {part_ms:>11.2f} ms {n_parts:>16}")
+    finally:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        cur.close()
+        conn.close()
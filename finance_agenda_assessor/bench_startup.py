@@ -0,0 +1,84 @@
+"""
+Benchmark de partida a frio do assessor.
+
+Mede, em processos novos:
+- o tempo de `import main` (mediana de várias execuções, descontado o interpretador vazio);
+- o tempo até os agentes estarem prontos (`main.warm_up()`), que é o custo pago no primeiro turno;
+- os módulos mais caros do `import main` segundo `python -X importtime`.
+
+Também confere que `import main` não carrega LangChain, clientes Gemini, tools de banco nem a pilha do FAQ,
+e falha se o import passar do orçamento — serve para pegar regressões (um import pesado voltando ao topo).
+
+Uso: python bench_startup.py [execucoes] [orcamento_ms]
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time as clock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Não podem aparecer em sys.modules logo após `import main`
+HEAVY_MODULES = [
+    "langchain", "langchain_core", "langchain_google_genai", "langchain_community", "langchain_text_splitters",
+    "faiss", "pypdf", "numpy", "psycopg2", "pg_tools", "agenda_tools", "analytics", "faq_tools", "embedding_backends",
+    "resilient_llm", "ingestion",
+]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "bench"), PYTHONWARNINGS="ignore")
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=HERE, env=env, capture_output=True, text=True, check=True)
+
+
+def wall_ms(code: str, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        t0 = clock.perf_counter()
+        run(code)
+        timings.append((clock.perf_counter() - t0) * 1e3)
+    return statistics.median(timings)
+
+
+def importtime_top(code: str, n: int = 10):
+    """(cumulativo_ms, módulo) dos imports mais caros feitos por main (ou fora dele), e o total em ms."""
+    stderr = run(code, "-X", "importtime").stderr
+    top, total_us = [], 0
+    for line in stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, module = int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)
+        total_us += self_us
+        if indent <= 3 and module != "main":
+            top.append((cumulative_us / 1e3, module))
+    return sorted(top, reverse=True)[:n], total_us / 1e3
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 300.0
+
+    loaded = run(
+        "import sys, main; print(' '.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    ).stdout.split()
+
+    baseline = wall_ms("pass", runs)
+    import_ms = wall_ms("import main", runs) - baseline
+    ready_ms = wall_ms("import main; main.warm_up()", max(1, runs // 2)) - baseline
+    top, total_ms = importtime_top("import main")
+
+    print(f"interpretador vazio           {baseline:9.1f} ms")
+    print(f"import main                   {import_ms:9.1f} ms (orçamento {budget_ms:.0f} ms)")
+    print(f"import main + warm_up()       {ready_ms:9.1f} ms")
+    print(f"\n-X importtime: {total_ms:.1f} ms no total; imports mais caros:")
+    for cumulative_ms, module in top:
+        print(f"  {cumulative_ms:9.1f} ms  {module}")
+
+    assert not loaded, f"import main carregou módulos pesados: {', '.join(loaded)}"
+    assert import_ms <= budget_ms, f"import main levou {import_ms:.1f} ms (orçamento {budget_ms:.0f} ms)"
+    print("\nimport main leve e dentro do orçamento (ok)")
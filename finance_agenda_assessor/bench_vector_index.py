@@ -0,0 +1,124 @@
+"""
+Benchmark dos índices vetoriais compactos (vector_index) contra o flat float32, num corpus sintético
+do tamanho de uma base de conhecimento grande (vetores normalizados agrupados em tópicos).
+
+Para cada tipo mede:
+- tamanho do arquivo e tempo de construção (treino + inserção);
+- memória de um processo worker novo depois de carregar o índice e responder às consultas:
+  RssAnon é memória privada do processo (o flat carregado como no LangChain vai todo para ela);
+  RssFile são páginas do arquivo mapeado, divididas entre todos os workers que abrem o mesmo índice;
+- latência por consulta (uma pergunta por vez, como no FAQ), mediana e p95;
+- recall@k em relação à busca exata do flat.
+
+Uso: python bench_vector_index.py [vetores] [dimensao] [k]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time as clock
+
+import faiss
+import numpy as np
+
+import vector_index
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+N_QUERIES = 300
+
+
+def synthetic_corpus(n: int, d: int, topics: int = 500, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, d)).astype(np.float32)
+    def sample(m):
+        x = centers[rng.integers(0, topics, m)] + 0.6 * rng.standard_normal((m, d)).astype(np.float32)
+        faiss.normalize_L2(x)
+        return x
+    return sample(n), sample(N_QUERIES)
+
+
+def rss_kb():
+    status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+    return int(status["RssAnon"].split()[0]), int(status["RssFile"].split()[0])
+
+
+def worker(path: str, queries_path: str, out_path: str, k: int):
+    """Roda num processo novo: carrega o índice, responde às consultas uma a uma e relata memória e latência."""
+    queries = np.load(queries_path)
+    anon0, file0 = rss_kb()
+    index = faiss.read_index(path) if path.endswith("index.faiss") else vector_index.read(path)
+    latencies, ids = [], []
+    for q in queries:
+        t0 = clock.perf_counter()
+        _, found = index.search(q[None, :], k)
+        latencies.append((clock.perf_counter() - t0) * 1e3)
+        ids.append(found[0])
+    anon1, file1 = rss_kb()
+    np.save(out_path, np.asarray(ids))
+    latencies.sort()
+    print(json.dumps({
+        "anon_mb": (anon1 - anon0) / 1024, "file_mb": (file1 - file0) / 1024,
+        "p50_ms": statistics.median(latencies), "p95_ms": latencies[int(0.95 * len(latencies))],
+    }))
+
+
+def run_worker(path: str, queries_path: str, k: int):
+    out = path + ".ids.npy"
+    stdout = subprocess.run(
+        [sys.executable, __file__, "--worker", path, queries_path, out, str(k)],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(stdout.strip().splitlines()[-1]), np.load(out)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--worker"]:
+        worker(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]))
+        sys.exit(0)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    d = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    corpus, queries = synthetic_corpus(n, d)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queries_path = os.path.join(tmp, "queries.npy")
+        np.save(queries_path, queries)
+        flat = faiss.IndexFlatL2(d)
+        flat.add(corpus)
+        _, truth = flat.search(queries, k)
+
+        rows = {}
+        for kind in vector_index.INDEX_TYPES:
+            t0 = clock.perf_counter()
+            index = flat if kind == "flat" else vector_index.build(flat, kind)
+            build_s = clock.perf_counter() - t0
+            path = os.path.join(tmp, "index.faiss" if kind == "flat" else vector_index.filename(kind))
+            faiss.write_index(index, path)
+            stats, found = run_worker(path, queries_path, k)
+            rows[kind] = {
+                "estrutura": "Flat" if kind == "flat" else vector_index.factory_string(kind, n, d),
+                "arquivo_mb": os.path.getsize(path) / 2**20, "construcao_s": build_s, **stats,
+                "recall": recall_at_k(found, truth),
+            }
+
+    print(f"{n:,} vetores x {d} dimensões, {N_QUERIES} consultas, k={k}, "
+          f"nprobe={vector_index.IVF_NPROBE}, efSearch={vector_index.HNSW_EF_SEARCH}\n")
+    print(f"{'tipo':<9}{'estrutura':<16}{'arquivo MB':>11}{'construção s':>13}{'RssAnon MB':>11}{'RssFile MB':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{f'recall@{k}':>11}")
+    for kind, r in rows.items():
+        print(f"{kind:<9}{r['estrutura']:<16}{r['arquivo_mb']:>11.1f}{r['construcao_s']:>13.2f}{r['anon_mb']:>11.1f}"
+              f"{r['file_mb']:>11.1f}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['recall']:>11.3f}")
+
+    flat_row = rows["flat"]
+    for kind in ("ivf-sq8", "hnsw-sq8", "ivf-pq"):
+        assert rows[kind]["arquivo_mb"] < flat_row["arquivo_mb"], f"{kind} não ficou menor que o flat"
+        assert rows[kind]["anon_mb"] < flat_row["anon_mb"], f"{kind} não foi mapeado do disco"
+    print(f"\nmemória privada por worker: flat {flat_row['anon_mb']:.1f} MB, "
+          + ", ".join(f"{kind} {rows[kind]['anon_mb']:.1f} MB" for kind in ("ivf-sq8", "hnsw-sq8", "ivf-pq")))
@@ -0,0 +1,117 @@
+import math
+import os
+import re
+import unicodedata
+import zlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from llm_scheduler import estimate_tokens, scheduler
+
+load_dotenv()
+
+# "gemini" (API remota) ou "local" (n-gramas com hashing, CPU, sem rede)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini").strip().lower()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "1024"))
+# Textos por requisição do GoogleGenerativeAIEmbeddings.embed_documents
+GEMINI_TEXTS_PER_REQUEST = 100
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Embeddings locais e determinísticos: n-gramas de caracteres (sem acento) de cada palavra, mais a palavra
+    inteira, projetados por hashing (crc32) num vetor de `dim` posições. Pesos log(1 + tf), norma L2 = 1,
+    então a distância L2 do FAISS ordena como similaridade de cosseno. Não precisa de treino nem de rede.
+    """
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, ngram_range: Tuple[int, int] = (3, 5), word_weight: float = 2.0):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.word_weight = word_weight
+        self._features = lru_cache(maxsize=65536)(self._word_features)
+
+    @property
+    def model_name(self) -> str:
+        lo, hi = self.ngram_range
+        return f"local:hashed-ngram-{lo}-{hi}-w{self.word_weight:g}-d{self.dim}"
+
+    def _word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        padded = f" {word} "
+        grams = [f"w:{word}"]
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        cols = np.fromiter((zlib.crc32(g.encode()) % self.dim for g in grams), dtype=np.int64, count=len(grams))
+        weights = np.ones(len(grams), dtype=np.float32)
+        weights[0] = self.word_weight
+        return cols, weights
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        rows, cols, vals = [], [], []
+        for r, text in enumerate(texts):
+            folded = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+            for word in re.findall(r"[a-z0-9]+", folded):
+                c, w = self._features(word)
+                rows.append(np.full(len(c), r, dtype=np.int64))
+                cols.append(c)
+                vals.append(w)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.concatenate(rows), np.concatenate(cols)), np.concatenate(vals))
+        np.log1p(matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Embeddings remotos que esperam a vez no llm_scheduler (cota do modelo, prioridade, rodízio entre sessões)."""
+
+    def __init__(self, embeddings: Embeddings, model: str, texts_per_request: int = GEMINI_TEXTS_PER_REQUEST):
+        self.embeddings = embeddings
+        self.model = model
+        self.texts_per_request = texts_per_request
+
+    def _acquire(self, texts: List[str]):
+        tokens = sum(estimate_tokens(len(t)) for t in texts)
+        scheduler.acquire(self.model, tokens, requests=max(1, math.ceil(len(texts) / self.texts_per_request)))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._acquire(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._acquire([text])
+        return self.embeddings.embed_query(text)
+
+
+def model_name(backend: str = EMBEDDING_BACKEND) -> str:
+    """Identifica o modelo de embedding em uso; entra nas configurações do índice (trocar de backend o refaz)."""
+    if backend == "gemini":
+        return GEMINI_EMBEDDING_MODEL
+    if backend == "local":
+        return HashedNgramEmbeddings().model_name
+    raise ValueError(f"EMBEDDING_BACKEND inválido: {backend!r} (use 'gemini' ou 'local').")
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    if backend == "gemini":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        remote = GoogleGenerativeAIEmbeddings(model=GEMINI_EMBEDDING_MODEL, google_api_key=GEMINI_API_KEY, transport="rest")
+        return ScheduledEmbeddings(remote, GEMINI_EMBEDDING_MODEL)
+    if backend == "local":
+        return HashedNgramEmbeddings()
+    raise ValueError(f"EMBEDDING_BACKEND inválido: {backend!r} (use 'gemini' ou 'local').")
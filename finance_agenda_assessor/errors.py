@@ -0,0 +1,33 @@
+import re
+
+# Limite de taxa / indisponibilidade temporária, por tipo de exceção ou status HTTP (google.api_core expõe em .code)
+RETRYABLE_ERRORS = {"ResourceExhausted", "ServiceUnavailable", "TooManyRequests", "DeadlineExceeded", "InternalServerError",
+                    "GatewayTimeout", "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout"}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# A lib do Gemini às vezes embrulha o erro original só na mensagem ("Error embedding content: 429 Resource has
+# been exhausted"): vale o status no início da mensagem original, no formato do google.api_core
+WRAPPED_STATUS = re.compile(r"(?:^|: )(\d{3}) [A-Z]")
+
+
+class CircuitOpenError(RuntimeError):
+    """O modelo falhou seguidamente e o circuito está aberto: a chamada nem é feita."""
+
+
+def _status_code(e: BaseException):
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(e, "response", None), "status_code", None)
+
+
+def is_retryable(e: Exception) -> bool:
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        if type(e).__name__ in RETRYABLE_ERRORS or _status_code(e) in RETRYABLE_STATUS:
+            return True
+        wrapped = WRAPPED_STATUS.search(str(e))
+        if wrapped and int(wrapped.group(1)) in RETRYABLE_STATUS:
+            return True
+        e = e.__cause__ or e.__context__
+    return False
@@ -1,25 +1,280 @@
-import os 
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+from typing import Dict, List, NamedTuple, Optional
+import faiss
+from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import embedding_backends
+import ingestion
+import vector_index
+from lexical_index import Bm25Index, exact_terms, reciprocal_rank_fusion
 
-PDF_PATH = "../FAQ_assesspr_v1.1.pdf"
+load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")  
+HERE = os.path.dirname(os.path.abspath(__file__))
+PDF_PATH = os.getenv("FAQ_PDF_PATH", os.path.join(HERE, "..", "FAQ_assessor_v1.pdf"))
+INDEX_DIR = os.getenv("FAQ_INDEX_DIR", os.path.join(HERE, ".faq_index"))
+# Índice servido às consultas: "flat" (float32 exato) ou um compacto quantizado e mapeado do disco (ver vector_index)
+INDEX_TYPE = vector_index.check_type(os.getenv("FAQ_INDEX_TYPE", "flat").strip().lower())
 
+EMBEDDING_MODEL = embedding_backends.model_name()
+CHUNK_SIZE = 700
+CHUNK_OVERLAP = 150
+TOP_K = 6
+# Candidatos de cada ranking (vetorial e BM25) antes da fusão
+FUSION_CANDIDATES = 12
+
+# Mudar qualquer um destes invalida todos os chunks: o índice é refeito do zero
+SETTINGS = {"embedding_model": EMBEDDING_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+class FaqIndex(NamedTuple):
+    db: FAISS
+    pages: Dict[str, List[str]]  # hash do texto da página -> ids (hash do texto) dos seus chunks
+    settings: dict
+    version: str
+    source: tuple  # (mtime_ns, tamanho) do PDF indexado
+    lexical: Bm25Index  # BM25 sobre os mesmos chunks do FAISS, reconstruído a cada versão
+    chunks: dict  # id do chunk -> Document
+
+
+def _chunk_docs(db: FAISS) -> dict:
+    return {doc_id: db.docstore.search(doc_id) for doc_id in db.index_to_docstore_id.values()}
+
+
+def _make_index(db: FAISS, pages, settings, version, source) -> "FaqIndex":
+    chunks = _chunk_docs(db)
+    lexical = Bm25Index((doc_id, doc.page_content) for doc_id, doc in chunks.items())
+    return FaqIndex(db, pages, settings, version, source, lexical, chunks)
+
+
+# Índice servido às consultas; só é trocado por inteiro (referência nova), nunca alterado no lugar
+_active: Optional[FaqIndex] = None
+_refresh_lock = threading.Lock()
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _stat(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _embeddings():
+    return embedding_backends.get_embeddings()
+
+
+def _load_compact(path: str) -> FAISS:
+    """Docstore do pickle + índice compacto mapeado do disco (gerado a partir do flat se ainda não existir)."""
+    compact = os.path.join(path, vector_index.filename(INDEX_TYPE))
+    if not os.path.exists(compact):
+        flat = faiss.read_index(os.path.join(path, "index.faiss"))
+        vector_index.write(vector_index.build(flat, INDEX_TYPE), compact)
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(_embeddings(), vector_index.read(compact), docstore, index_to_docstore_id)
+
+
+def _load_version(version: str, for_update: bool = False) -> Optional[FaqIndex]:
+    """Versão gravada em disco; `for_update` carrega o flat (editável) mesmo quando o servido é compacto."""
+    path = os.path.join(INDEX_DIR, version)
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if for_update or INDEX_TYPE == "flat":
+            db = FAISS.load_local(path, _embeddings(), allow_dangerous_deserialization=True)
+        else:
+            db = _load_compact(path)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    return _make_index(db, manifest["pages"], manifest["settings"], version, tuple(manifest["source"]))
+
+
+def _load_current() -> Optional[FaqIndex]:
+    try:
+        with open(os.path.join(INDEX_DIR, "CURRENT"), encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return _load_version(version)
 
-def get_faq_context(question: str) -> str:
-    loader = PyPDFLoader(PDF_PATH)
-    docs = loader.load()
 
-    splitter = RecursiveCharacterTextSplitter(chunck_size=700, chunck_overlap=150)
-    chunks = splitter.split_documents(docs)
-    
-    embeddings = GoogleGenerativeAIEmbeddings(model = "models/text-embedding-004", google_api_key = DATABASE_URL, transport="rest")
+def _persist(index: FaqIndex):
+    """Grava a versão num diretório próprio e só então aponta CURRENT para ela (os.replace é atômico)."""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    final = os.path.join(INDEX_DIR, index.version)
+    manifest = {"pages": index.pages, "settings": index.settings, "source": list(index.source)}
+    try:
+        with open(os.path.join(final, "manifest.json"), encoding="utf-8") as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = None
+    if existing is not None and existing["pages"] == index.pages and existing["settings"] == index.settings:
+        # A versão é o hash das páginas e configurações: o diretório já tem esse conteúdo (e pode ser o em uso,
+        # que não deve ser apagado); no máximo o manifest é regravado com o novo stat do PDF
+        if existing["source"] != manifest["source"]:
+            tmp = os.path.join(final, f".manifest-{os.getpid()}")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp, os.path.join(final, "manifest.json"))
+    else:
+        tmp = os.path.join(INDEX_DIR, f".tmp-{index.version}-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        index.db.save_local(tmp)
+        if INDEX_TYPE != "flat":
+            vector_index.write(vector_index.build(index.db.index, INDEX_TYPE), os.path.join(tmp, vector_index.filename(INDEX_TYPE)))
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
 
-    db = FAISS.from_documents(chunks, embeddings)
-    results = db.similarity_search(question, k=6)
+    pointer = os.path.join(INDEX_DIR, f".CURRENT-{os.getpid()}")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(index.version)
+    os.replace(pointer, os.path.join(INDEX_DIR, "CURRENT"))
 
+
+def _prune(keep: set):
+    for name in os.listdir(INDEX_DIR):
+        path = os.path.join(INDEX_DIR, name)
+        if os.path.isdir(path) and name not in keep and not name.startswith("."):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def refresh_index(pdf_path: str = PDF_PATH) -> dict:
+    """
+    Atualiza o índice para a versão atual do PDF, reprocessando só o que mudou.
+
+    Cada página é identificada pelo hash do seu texto; só páginas novas/alteradas são divididas em chunks.
+    Cada chunk é identificado pelo hash do seu texto: chunks que já existiam (em qualquer página) reaproveitam
+    o vetor, chunks que sumiram têm o vetor removido e só os inéditos são enviados para embedding — em lotes
+    concorrentes, gravados em INDEX_DIR/.embeddings conforme terminam; se a atualização for interrompida,
+    a próxima retoma de onde parou.
+    A atualização é feita numa cópia da versão em uso, gravada em disco e trocada de uma vez.
+    """
+    global _active
+    with _refresh_lock:
+        source = _stat(pdf_path)
+        current = _active or _load_current()
+        pages = PyPDFLoader(pdf_path).load()
+
+        old_pages = current.pages if current is not None and current.settings == SETTINGS else {}
+        new_pages: Dict[str, List[str]] = {}
+        new_chunks = {}
+        changed_pages = 0
+        for page in pages:
+            page_hash = _sha(page.page_content)
+            if page_hash in new_pages:
+                continue
+            if page_hash in old_pages:
+                new_pages[page_hash] = old_pages[page_hash]
+                continue
+            changed_pages += 1
+            ids = []
+            for chunk in _splitter.split_documents([page]):
+                chunk_id = _sha(chunk.page_content)
+                ids.append(chunk_id)
+                new_chunks.setdefault(chunk_id, chunk)
+            new_pages[page_hash] = ids
+
+        old_ids = {cid for ids in old_pages.values() for cid in ids}
+        new_ids = {cid for ids in new_pages.values() for cid in ids}
+        to_add = [cid for cid in new_chunks if cid not in old_ids]
+        to_delete = sorted(old_ids - new_ids)
+        stats = {
+            "paginas": len(pages),
+            "paginas_alteradas": changed_pages,
+            "chunks": len(new_ids),
+            "chunks_embedados": len(to_add),
+            "chunks_removidos": len(to_delete),
+        }
+
+        if current is not None and old_pages and not to_add and not to_delete and new_pages.keys() == old_pages.keys():
+            _active = current._replace(source=source)
+            return {**stats, "versao": current.version}
+        if not new_ids:
+            raise ValueError(f"Nenhum texto extraído de {pdf_path}.")
+
+        # Cópia da versão em uso: consultas em andamento continuam no objeto antigo até a troca
+        db = _load_version(current.version, for_update=True).db if old_pages else None
+        if db is not None and to_delete:
+            db.delete(to_delete)
+        store = ingestion.EmbeddingStore(os.path.join(INDEX_DIR, ".embeddings", _sha(EMBEDDING_MODEL)[:16]))
+        if to_add:
+            vectors, ingest_stats = ingestion.embed_texts(
+                [(cid, new_chunks[cid].page_content) for cid in to_add], _embeddings(), store
+            )
+            stats.update(ingest_stats)
+            pairs = [(new_chunks[cid].page_content, vectors[cid]) for cid in to_add]
+            metadatas = [new_chunks[cid].metadata for cid in to_add]
+            if db is None:
+                db = FAISS.from_embeddings(pairs, _embeddings(), metadatas=metadatas, ids=to_add)
+            else:
+                db.add_embeddings(pairs, metadatas=metadatas, ids=to_add)
+
+        version = _sha("".join(sorted(new_pages)) + json.dumps(SETTINGS, sort_keys=True))[:16]
+        index = _make_index(db, new_pages, dict(SETTINGS), version, source)
+        _persist(index)
+        store.clear()
+        _active = index if INDEX_TYPE == "flat" else _load_version(version)
+        _prune({version, current.version} if current is not None else {version})
+        return {**stats, "versao": version}
+
+
+def _current_index() -> FaqIndex:
+    global _active
+    if _active is None:
+        loaded = _load_current()
+        if loaded is not None and _active is None:
+            _active = loaded
+    index = _active
+    if index is None or index.source != _stat(PDF_PATH):
+        refresh_index(PDF_PATH)
+        index = _active
+    return index
+
+
+def retrieve(question: str, k: int = TOP_K) -> list:
+    """
+    Chunks mais relevantes para a pergunta.
+
+    Se a pergunta cita termos literais (código de seção, e-mail, sigla) e todos existem no índice, usa só o
+    BM25 e não gera embedding da pergunta. Caso contrário, funde os rankings vetorial e BM25 por RRF.
+    """
+    index = _current_index()
+    terms = exact_terms(question)
+    lexical = [doc_id for doc_id, _ in index.lexical.search(question, FUSION_CANDIDATES)]
+    if terms and all(index.lexical.contains(t) for t in terms):
+        return [index.chunks[doc_id] for doc_id in lexical[:k]]
+
+    vector = [_sha(doc.page_content) for doc in index.db.similarity_search(question, k=FUSION_CANDIDATES)]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    return [index.chunks[doc_id] for doc_id in fused[:k] if doc_id in index.chunks]
+
+
+def lexical_context(question: str, k: int = 3) -> str:
+    """Trechos só pelo BM25, sem embedding da pergunta: usado quando o modelo está indisponível."""
+    index = _current_index()
+    return "\n\n".join(index.chunks[doc_id].page_content for doc_id, _ in index.lexical.search(question, k))
+
+
+def get_faq_context(question: str) -> str:
+    results = retrieve(question)
     context_text = "\n\n".join([r.page_content for r in results])
-    return context_text
\ No newline at end of file
+    return context_text
+
+
+if __name__ == "__main__":
+    # Publicar nova versão: substitua o PDF em FAQ_PDF_PATH e rode `python faq_tools.py`
+    # (sem isso, a primeira consulta após a troca faz a mesma atualização)
+    print(json.dumps(refresh_index(), ensure_ascii=False))
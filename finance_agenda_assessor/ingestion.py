@@ -0,0 +1,138 @@
+import hashlib
+import os
+import random
+import shutil
+import threading
+import time as clock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from errors import is_retryable
+from llm_scheduler import PRIORITY_BACKGROUND, priority
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "40000"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+
+def make_batches(items: List[Tuple[str, str]], max_items: int = EMBED_BATCH_SIZE,
+                 max_chars: int = EMBED_BATCH_MAX_CHARS) -> List[List[Tuple[str, str]]]:
+    """Agrupa (id, texto) em lotes com no máximo `max_items` textos e `max_chars` caracteres (um texto maior vai sozinho)."""
+    batches, current, chars = [], [], 0
+    for item in items:
+        size = len(item[1])
+        if current and (len(current) >= max_items or chars + size > max_chars):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(item)
+        chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingStore:
+    """
+    Vetores já calculados, gravados em disco um arquivo .npz por lote concluído (tmp + os.replace).
+    Uma ingestão interrompida recomeça embedando só os ids que ainda não estão aqui.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, np.ndarray]:
+        done = {}
+        if not os.path.isdir(self.path):
+            return done
+        for name in os.listdir(self.path):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                with np.load(os.path.join(self.path, name)) as data:
+                    done.update(zip(data["ids"].tolist(), data["vectors"]))
+            except (OSError, ValueError, KeyError):
+                continue  # arquivo corrompido: o lote é refeito
+        return done
+
+    def save_batch(self, ids: List[str], vectors: List[List[float]]):
+        os.makedirs(self.path, exist_ok=True)
+        key = hashlib.sha256("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+        final = os.path.join(self.path, f"batch-{key}.npz")
+        tmp = os.path.join(self.path, f".tmp-{key}-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp, "wb") as f:
+            np.savez(f, ids=np.asarray(ids), vectors=np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp, final)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class _Backoff:
+    """Pausa compartilhada: quando um worker leva limite de taxa, todos esperam antes do próximo envio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self):
+        delay = self._until - clock.monotonic()
+        if delay > 0:
+            clock.sleep(delay)
+
+    def trip(self, attempt: int) -> float:
+        delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * (0.5 + random.random() / 2)
+        with self._lock:
+            self._until = max(self._until, clock.monotonic() + delay)
+        return delay
+
+
+def embed_texts(items: List[Tuple[str, str]], embeddings: Embeddings, store: EmbeddingStore,
+                max_workers: int = EMBED_MAX_WORKERS, max_retries: int = EMBED_MAX_RETRIES,
+                progress=None) -> Tuple[Dict[str, List[float]], dict]:
+    """
+    Embeda (id, texto) em lotes concorrentes, com retentativa exponencial em erros de limite de taxa.
+    Cada lote concluído vai para o `store` antes de seguir; ids já presentes nele não são reenviados.
+    `progress(concluidos, total)` é chamado a cada lote. Devolve {id: vetor} e estatísticas da ingestão.
+    """
+    done = store.load()
+    wanted = {item_id for item_id, _ in items}
+    pending = [(item_id, text) for item_id, text in dict(items).items() if item_id not in done]
+    batches = make_batches(pending)
+    stats = {"lotes": len(batches), "textos_retomados": len(wanted & done.keys()), "retentativas": 0}
+    backoff, lock = _Backoff(), threading.Lock()
+    completed = [0]
+
+    def run(batch):
+        ids, texts = [i for i, _ in batch], [t for _, t in batch]
+        for attempt in range(max_retries + 1):
+            backoff.wait()
+            try:
+                # Ingestão é trabalho de fundo: na fila de cota, perde a vez para as chamadas do chat
+                with priority(PRIORITY_BACKGROUND):
+                    vectors = embeddings.embed_documents(texts)
+                break
+            except Exception as e:
+                if attempt == max_retries or not is_retryable(e):
+                    raise
+                with lock:
+                    stats["retentativas"] += 1
+                backoff.trip(attempt)
+        store.save_batch(ids, vectors)
+        with lock:
+            completed[0] += 1
+            if progress is not None:
+                progress(completed[0], len(batches))
+        return dict(zip(ids, vectors))
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as pool:
+            for future in as_completed([pool.submit(run, b) for b in batches]):
+                done.update(future.result())
+
+    return {item_id: list(map(float, done[item_id])) for item_id in wanted}, stats
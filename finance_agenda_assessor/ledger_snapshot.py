@@ -0,0 +1,304 @@
+import os
+import threading
+import time as clock
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from session_context import get_user_id
+
+TZ = ZoneInfo("America/Sao_Paulo")
+EPOCH = date(1970, 1, 1)
+INCOME, EXPENSES = 1, 2
+
+SNAPSHOT_ENABLED = os.getenv("LEDGER_SNAPSHOT", "0").lower() in ("1", "true", "yes")
+SNAPSHOT_MAX_BYTES = int(os.getenv("LEDGER_SNAPSHOT_MAX_BYTES", str(256 * 1024 * 1024)))
+# Escritas de outros processos (ou direto no banco) não passam por apply_committed: a cada CHECK_S o snapshot
+# é conferido contra (count, max(id)) do usuário, o que pega inserções e exclusões; edições de linhas
+# existentes só são pegas pelo TTL, que força recarregar o snapshot.
+SNAPSHOT_CHECK_S = float(os.getenv("LEDGER_SNAPSHOT_CHECK_S", "5"))
+SNAPSHOT_TTL_S = float(os.getenv("LEDGER_SNAPSHOT_TTL_S", "300"))
+
+SNAPSHOT_COLUMNS = """
+    t.id, t.occurred_at, t.amount::float8, t.type, COALESCE(t.category_id, 0),
+    t.description, t.payment_method, t.source_text
+"""
+
+
+# Bytes por linha nos arrays (id, ts, day, amount, type, category) e custo fixo estimado dos objetos Python
+ARRAY_BYTES_PER_ROW = 8 + 8 + 4 + 8 + 1 + 2
+OBJECT_BYTES_PER_ROW = 200
+
+
+def _row_bytes(description: Optional[str], source_text: Optional[str]) -> int:
+    # Objetos Python (str/datetime) custam bem mais que seus caracteres; estimativa conservadora por linha
+    return ARRAY_BYTES_PER_ROW + OBJECT_BYTES_PER_ROW + len(description or "") + len(source_text or "")
+
+
+def _local_day(ts: datetime) -> int:
+    return (ts.astimezone(TZ).date() - EPOCH).days
+
+
+def _day(value: str) -> int:
+    return (date.fromisoformat(value) - EPOCH).days
+
+
+class LedgerSnapshot:
+    """
+    Cópia colunar do histórico de transações em memória, ordenada por occurred_at.
+
+    Colunas numéricas ficam em arrays NumPy (consultas por intervalo via searchsorted no índice de dias);
+    textos ficam em listas paralelas, usadas só pela busca.
+    """
+
+    def __init__(self, rows, type_names: Dict[int, str]):
+        self.type_names = type_names
+        self.lock = threading.RLock()
+        rows = sorted(rows, key=lambda r: (r[1], r[0]))
+        self.id = np.asarray([r[0] for r in rows], dtype=np.int64)
+        self.ts = np.asarray([r[1].timestamp() for r in rows], dtype=np.float64)
+        self.day = np.asarray([_local_day(r[1]) for r in rows], dtype=np.int32)
+        self.amount = np.asarray([r[2] for r in rows], dtype=np.float64)
+        self.type = np.asarray([r[3] for r in rows], dtype=np.int8)
+        self.category = np.asarray([r[4] for r in rows], dtype=np.int16)
+        self.description: List[Optional[str]] = [r[5] for r in rows]
+        self.payment_method: List[Optional[str]] = [r[6] for r in rows]
+        self.source_text: List[str] = [r[7] for r in rows]
+        self.occurred_at: List[datetime] = [r[1] for r in rows]
+        self._nbytes = sum(_row_bytes(r[5], r[7]) for r in rows)
+        self.loaded_at = self.checked_at = clock.monotonic()
+
+    @classmethod
+    def load(cls, cur, user_id: str) -> "LedgerSnapshot":
+        cur.execute("SELECT id, type FROM transaction_types;")
+        type_names = dict(cur.fetchall())
+        cur.execute(
+            f"SELECT {SNAPSHOT_COLUMNS} FROM transactions t WHERE t.user_id = %s ORDER BY t.occurred_at, t.id;",
+            (user_id,),
+        )
+        return cls(cur.fetchall(), type_names)
+
+    def watermark(self) -> Tuple[int, int]:
+        """(count, max(id)) das linhas do snapshot, comparável a read_watermark."""
+        with self.lock:
+            return len(self.id), int(self.id.max()) if len(self.id) else 0
+
+    def nbytes(self) -> int:
+        """Tamanho estimado, mantido a cada linha carregada/aplicada (não percorre as linhas)."""
+        return self._nbytes
+
+    # ---- manutenção incremental ----
+
+    def _delete_at(self, i: int):
+        self._nbytes -= _row_bytes(self.description[i], self.source_text[i])
+        for name in ("id", "ts", "day", "amount", "type", "category"):
+            setattr(self, name, np.delete(getattr(self, name), i))
+        for col in (self.description, self.payment_method, self.source_text, self.occurred_at):
+            del col[i]
+
+    def upsert(self, row) -> int:
+        """
+        Aplica uma linha (mesma ordem de SNAPSHOT_COLUMNS) recém-commitada, mantendo a ordenação.
+        Devolve a variação de nbytes(), para o registro manter o total sem recalcular.
+        """
+        with self.lock:
+            before = self._nbytes
+            hit = np.flatnonzero(self.id == row[0])
+            if hit.size:
+                self._delete_at(int(hit[0]))
+            ts = row[1].timestamp()
+            i = int(np.searchsorted(self.ts, ts, side="right"))
+            self.id = np.insert(self.id, i, row[0])
+            self.ts = np.insert(self.ts, i, ts)
+            self.day = np.insert(self.day, i, _local_day(row[1]))
+            self.amount = np.insert(self.amount, i, row[2])
+            self.type = np.insert(self.type, i, row[3])
+            self.category = np.insert(self.category, i, row[4] or 0)
+            self.description.insert(i, row[5])
+            self.payment_method.insert(i, row[6])
+            self.source_text.insert(i, row[7])
+            self.occurred_at.insert(i, row[1])
+            self._nbytes += _row_bytes(row[5], row[7])
+            return self._nbytes - before
+
+    # ---- consultas ----
+
+    def _day_slice(self, first_day: Optional[int], last_day: Optional[int]) -> slice:
+        lo = 0 if first_day is None else int(np.searchsorted(self.day, first_day, side="left"))
+        hi = len(self.day) if last_day is None else int(np.searchsorted(self.day, last_day, side="right"))
+        return slice(lo, hi)
+
+    def total(self, type_id: Optional[int] = None, date_from_local: Optional[str] = None,
+              date_to_local: Optional[str] = None) -> float:
+        """Soma de um tipo no intervalo de dias locais; sem type_id, saldo INCOME - EXPENSES."""
+        with self.lock:
+            sl = self._day_slice(
+                _day(date_from_local) if date_from_local else None,
+                _day(date_to_local) if date_to_local else None,
+            )
+            amount, type_ = self.amount[sl], self.type[sl]
+            if type_id is not None:
+                return float(amount[type_ == type_id].sum())
+            return float(amount[type_ == INCOME].sum() - amount[type_ == EXPENSES].sum())
+
+    def search(self, text: Optional[str] = None, type_name: Optional[str] = None, date_local: Optional[str] = None,
+               date_from_local: Optional[str] = None, date_to_local: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """Mesma semântica e formato de saída de query_transactions."""
+        with self.lock:
+            # Como no SQL, dia e intervalo se somam (AND): vale a interseção dos dois
+            first_day = last_day = None
+            if date_local:
+                first_day = last_day = _day(date_local)
+            if date_from_local and date_to_local:
+                lo, hi = _day(date_from_local), _day(date_to_local)
+                first_day = lo if first_day is None else max(first_day, lo)
+                last_day = hi if last_day is None else min(last_day, hi)
+            sl = self._day_slice(first_day, last_day)
+            idx = np.arange(sl.start, sl.stop)
+
+            if type_name:
+                wanted = [tid for tid, name in self.type_names.items() if type_name.lower() in name.lower()]
+                idx = idx[np.isin(self.type[idx], wanted)]
+
+            ascending = bool(date_from_local and date_to_local)
+            if not ascending:
+                idx = idx[::-1]
+
+            needle = text.lower() if text else None
+            out: List[dict] = []
+            for i in idx:
+                if needle and needle not in (self.source_text[i] or "").lower() \
+                        and needle not in (self.description[i] or "").lower():
+                    continue
+                out.append({
+                    "id": int(self.id[i]),
+                    "amount": float(self.amount[i]),
+                    "type_name": int(self.type[i]),
+                    "category_id": int(self.category[i]) or None,
+                    "description": self.description[i],
+                    "payment_method": self.payment_method[i],
+                    "occurred_at": self.occurred_at[i].isoformat(),
+                    "source_text": self.source_text[i],
+                })
+                if len(out) >= limit:
+                    break
+            return out
+
+    def columns(self):
+        """(day, amount, type, category) para o módulo analytics."""
+        with self.lock:
+            return self.day, self.amount, self.type, self.category
+
+
+# ---- registro global por usuário (LRU com teto de memória) ----
+
+_snapshots: "OrderedDict[str, LedgerSnapshot]" = OrderedDict()
+_registry_lock = threading.Lock()
+# Soma de nbytes() dos snapshots registrados; atualizada a cada carga, linha aplicada e remoção
+_total_bytes = 0
+
+
+def _register(user_id: str, snap: LedgerSnapshot):
+    global _total_bytes
+    old = _snapshots.pop(user_id, None)
+    if old is not None:
+        _total_bytes -= old.nbytes()
+    _snapshots[user_id] = snap
+    _total_bytes += snap.nbytes()
+
+
+def _unregister(user_id: str):
+    global _total_bytes
+    old = _snapshots.pop(user_id, None)
+    if old is not None:
+        _total_bytes -= old.nbytes()
+
+
+def _evict_over_cap():
+    global _total_bytes
+    while _snapshots and _total_bytes > SNAPSHOT_MAX_BYTES:
+        _, evicted = _snapshots.popitem(last=False)
+        _total_bytes -= evicted.nbytes()
+
+
+def read_watermark(cur, user_id: str) -> Tuple[int, int]:
+    cur.execute("SELECT count(*), COALESCE(max(id), 0) FROM transactions WHERE user_id = %s;", (user_id,))
+    count, max_id = cur.fetchone()
+    return int(count), int(max_id)
+
+
+def active_snapshot(read_db_watermark: Optional[Callable[[str], Tuple[int, int]]] = None) -> Optional[LedgerSnapshot]:
+    """
+    Snapshot já carregado do usuário da sessão atual, ou None.
+    Vencido o TTL, o snapshot é descartado; com read_db_watermark, a cada SNAPSHOT_CHECK_S ele é conferido
+    contra o banco e descartado se houver linhas que não passaram por apply_committed.
+    """
+    if not SNAPSHOT_ENABLED:
+        return None
+    user_id = get_user_id()
+    with _registry_lock:
+        snap = _snapshots.get(user_id)
+        if snap is None:
+            return None
+        _snapshots.move_to_end(user_id)
+    now = clock.monotonic()
+    if now - snap.loaded_at > SNAPSHOT_TTL_S:
+        _discard(user_id, snap)
+        return None
+    if read_db_watermark is not None and now - snap.checked_at >= SNAPSHOT_CHECK_S:
+        try:
+            db_watermark = read_db_watermark(user_id)
+        except Exception:
+            # Sem banco para conferir, o snapshot segue servindo até a próxima conferência
+            return snap
+        if db_watermark != snap.watermark():
+            _discard(user_id, snap)
+            return None
+        snap.checked_at = now
+    return snap
+
+
+def _discard(user_id: str, snap: LedgerSnapshot):
+    with _registry_lock:
+        if _snapshots.get(user_id) is snap:
+            _unregister(user_id)
+
+
+def snapshot_for_analytics(cur) -> Optional[LedgerSnapshot]:
+    """Snapshot do usuário da sessão atual, carregando-o com cur na primeira requisição analítica (ou se vencido)."""
+    if not SNAPSHOT_ENABLED:
+        return None
+    snap = active_snapshot(lambda user_id: read_watermark(cur, user_id))
+    if snap is not None:
+        return snap
+    user_id = get_user_id()
+    snap = LedgerSnapshot.load(cur, user_id)
+    with _registry_lock:
+        _register(user_id, snap)
+        _evict_over_cap()
+    return snap
+
+
+def apply_committed(row):
+    """Propaga uma transação inserida/atualizada (já commitada) ao snapshot do usuário, se carregado."""
+    global _total_bytes
+    snap = active_snapshot()
+    if snap is None:
+        return
+    with _registry_lock:
+        # Sob o lock do registro: a variação só entra no total se o snapshot ainda estiver registrado
+        delta = snap.upsert(row)
+        if _snapshots.get(get_user_id()) is snap:
+            _total_bytes += delta
+            _evict_over_cap()
+
+
+def evict(user_id: Optional[str] = None):
+    global _total_bytes
+    with _registry_lock:
+        if user_id is None:
+            _snapshots.clear()
+            _total_bytes = 0
+        else:
+            _unregister(user_id)
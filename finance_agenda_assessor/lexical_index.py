@@ -0,0 +1,99 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+STOPWORDS = set("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para pra com sem
+e ou que se nao ao aos como mas mais muito ja so tambem ate entre sobre quando qual quais quem onde
+eu tu ele ela nos vos eles elas voce voces me te lhe lhes meu minha meus minhas seu sua seus suas
+este esta estes estas esse essa esses essas isso isto aquele aquela aquilo
+e sao foi ser tem ha sera esta estao pode posso
+""".split())
+
+SECTION_CODE = re.compile(r"^\d+(\.\d+)+$")
+ACRONYM = re.compile(r"\b[A-Z]{2,}\b")
+TOKEN = re.compile(r"[a-z0-9@._-]+")
+
+
+def fold(text: str) -> str:
+    return unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokens sem acento e em minúsculas. Códigos de seção ("6.2.1") e e-mails ficam inteiros;
+    e-mails e palavras compostas também geram as partes ("suporte@assessor.ai" → "suporte", "assessor", "ai").
+    """
+    tokens = []
+    for raw in TOKEN.findall(fold(text)):
+        tok = raw.strip("._-")
+        if not tok:
+            continue
+        if SECTION_CODE.match(tok):
+            tokens.append(tok)
+            continue
+        if tok not in STOPWORDS:
+            tokens.append(tok)
+        if re.search(r"[@._-]", tok):
+            tokens.extend(p for p in re.split(r"[@._-]+", tok) if p and p not in STOPWORDS)
+    return tokens
+
+
+def exact_terms(text: str) -> List[str]:
+    """Termos que pedem correspondência literal: códigos de seção, e-mails e siglas (LGPD, FAQ)."""
+    terms = [tok for tok in tokenize(text) if SECTION_CODE.match(tok) or "@" in tok]
+    terms.extend(t for t in map(fold, ACRONYM.findall(text)) if t not in STOPWORDS)
+    return list(dict.fromkeys(terms))
+
+
+class Bm25Index:
+    """Índice invertido BM25 (Okapi) em memória sobre textos identificados por id."""
+
+    def __init__(self, docs: Iterable[Tuple[str, str]], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.ids: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, text in docs:
+            counts = Counter(tokenize(text))
+            idx = len(self.ids)
+            self.ids.append(doc_id)
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((idx, tf))
+        n = len(self.ids)
+        self.avgdl = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def contains(self, term: str) -> bool:
+        return term in self.postings
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for idx, tf in plist:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[idx] / self.avgdl)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(self.ids[idx], score) for idx, score in best]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[str]:
+    """Junta rankings (listas de ids, melhor primeiro) por RRF: score = Σ 1 / (k + posição)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
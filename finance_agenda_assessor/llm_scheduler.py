@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import threading
+import time as clock
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from session_context import current_session_id
+
+# Prioridades: menor número sai primeiro. Etapas que o usuário espera (router, especialistas, orquestrador,
+# FAQ) são interativas; execução especulativa vem depois; ingestão e outras tarefas de fundo por último.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SPECULATIVE = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interativa", PRIORITY_SPECULATIVE: "especulativa", PRIORITY_BACKGROUND: "fundo"}
+
+# Requisições e tokens por minuto de cada modelo (ajuste ao nível da conta); LLM_BUDGETS (JSON) sobrescreve,
+# ex.: LLM_BUDGETS='{"gemini-2.5-flash": {"rpm": 150, "tpm": 1000000}}'
+DEFAULT_BUDGETS = {
+    "gemini-2.5-flash": {"rpm": 1000, "tpm": 1_000_000},
+    "gemini-2.0-flash": {"rpm": 2000, "tpm": 4_000_000},
+    "models/text-embedding-004": {"rpm": 1500, "tpm": 1_000_000},
+}
+FALLBACK_BUDGET = {"rpm": 60, "tpm": 250_000}
+# Rajada permitida: fração do limite por minuto que pode sair de uma vez (o resto é reposto continuamente)
+LLM_BURST_FRACTION = float(os.getenv("LLM_BURST_FRACTION", "0.1"))
+CHARS_PER_TOKEN = 4
+
+current_priority: ContextVar[int] = ContextVar("current_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Chamadas ao modelo feitas dentro do bloco entram na fila com esta prioridade."""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def estimate_tokens(chars: int) -> int:
+    return max(1, chars // CHARS_PER_TOKEN)
+
+
+def load_budgets() -> Dict[str, dict]:
+    budgets = {model: dict(limits) for model, limits in DEFAULT_BUDGETS.items()}
+    for model, limits in json.loads(os.getenv("LLM_BUDGETS", "{}")).items():
+        budgets.setdefault(model, dict(FALLBACK_BUDGET)).update(limits)
+    return budgets
+
+
+class TokenBucket:
+    """Balde reposto a `rate` unidades/s até `capacity`; o saldo pode ficar negativo ao acertar o consumo real."""
+
+    def __init__(self, per_minute: float, burst_fraction: float = LLM_BURST_FRACTION):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute * burst_fraction)
+        self.level = self.capacity
+        self._updated = clock.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Waiter:
+    __slots__ = ("model", "tokens", "requests", "enqueued", "notify", "granted")
+
+    def __init__(self, model: str, tokens: int, requests: int, notify):
+        self.model = model
+        self.tokens = tokens
+        self.requests = requests
+        self.enqueued = clock.monotonic()
+        self.notify = notify
+        self.granted = False
+
+
+class LlmScheduler:
+    """
+    Fila única para todas as chamadas a modelos remotos (chat e embeddings).
+
+    Cada modelo tem dois baldes (requisições e tokens por minuto); a chamada só sai quando os dois têm saldo,
+    e até lá espera na fila em vez de tomar 429. A fila respeita prioridade estrita (um modelo com chamada
+    interativa esperando não atende as de fundo) e, dentro de cada prioridade, alterna entre sessões
+    (round-robin), para uma sessão com muitas chamadas não atrasar as outras.
+    Serve a threads e a event loops diferentes: quem libera a vez é o próprio despacho, sob um lock.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, dict]] = None):
+        self.budgets = budgets if budgets is not None else load_budgets()
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, tuple] = {}
+        self._queues: Dict[int, "OrderedDict[str, deque]"] = {}
+        self._timer_at = float("inf")
+        self._stats: Dict[str, dict] = {}
+
+    def _buckets_for(self, model: str) -> tuple:
+        if model not in self._buckets:
+            limits = self.budgets.get(model, FALLBACK_BUDGET)
+            self._buckets[model] = (TokenBucket(limits["rpm"]), TokenBucket(limits["tpm"]))
+        return self._buckets[model]
+
+    def _wait_time(self, waiter: _Waiter, now: float) -> float:
+        requests, tokens = self._buckets_for(waiter.model)
+        return max(requests.wait_time(waiter.requests, now), tokens.wait_time(waiter.tokens, now))
+
+    def _grant(self, waiter: _Waiter, now: float):
+        requests, tokens = self._buckets_for(waiter.model)
+        requests.take(waiter.requests)
+        tokens.take(waiter.tokens)
+        waiter.granted = True
+        stats = self._stats.setdefault(waiter.model, {"concedidas": 0, "esperaram": 0, "espera_total_s": 0.0, "espera_max_s": 0.0})
+        waited = now - waiter.enqueued
+        stats["concedidas"] += 1
+        if waited > 0.001:
+            stats["esperaram"] += 1
+            stats["espera_total_s"] += waited
+            stats["espera_max_s"] = max(stats["espera_max_s"], waited)
+        waiter.notify()
+
+    def _dispatch_locked(self):
+        now = clock.monotonic()
+        blocked: Dict[str, float] = {}
+        for level in sorted(self._queues):
+            queue = self._queues[level]
+            progressed = True
+            while progressed and queue:
+                progressed = False
+                for session in list(queue):
+                    waiter = queue[session][0]
+                    if waiter.model in blocked:
+                        continue
+                    wait = self._wait_time(waiter, now)
+                    if wait > 0:
+                        blocked[waiter.model] = wait
+                        continue
+                    queue[session].popleft()
+                    if queue[session]:
+                        queue.move_to_end(session)
+                    else:
+                        del queue[session]
+                    self._grant(waiter, now)
+                    progressed = True
+        if blocked:
+            self._schedule_locked(now + min(blocked.values()))
+
+    def _schedule_locked(self, at: float):
+        if at >= self._timer_at:
+            return
+        self._timer_at = at
+        timer = threading.Timer(max(0.0, at - clock.monotonic()), self._on_timer)
+        timer.daemon = True
+        timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer_at = float("inf")
+            self._dispatch_locked()
+
+    def _enqueue(self, model: str, tokens: int, requests: int, notify) -> _Waiter:
+        waiter = _Waiter(model, tokens, requests, notify)
+        level = current_priority.get()
+        session = current_session_id.get() or "_sem_sessao"
+        with self._lock:
+            self._queues.setdefault(level, OrderedDict()).setdefault(session, deque()).append(waiter)
+            self._dispatch_locked()
+        return waiter
+
+    def _withdraw(self, waiter: _Waiter):
+        """Chamada cancelada: sai da fila ou, se já tinha a vez, devolve o saldo."""
+        with self._lock:
+            if waiter.granted:
+                requests, tokens = self._buckets_for(waiter.model)
+                requests.adjust(-waiter.requests)
+                tokens.adjust(-waiter.tokens)
+            else:
+                for queue in self._queues.values():
+                    for session, waiters in list(queue.items()):
+                        if waiter in waiters:
+                            waiters.remove(waiter)
+                            if not waiters:
+                                del queue[session]
+            self._dispatch_locked()
+
+    def acquire(self, model: str, tokens: int, requests: int = 1):
+        """Bloqueia a thread até a chamada ter saldo nos baldes do modelo."""
+        event = threading.Event()
+        waiter = self._enqueue(model, tokens, requests, event.set)
+        try:
+            event.wait()
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+
+    async def aacquire(self, model: str, tokens: int, requests: int = 1):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(model, tokens, requests, notify)
+        try:
+            await future
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+
+    def try_acquire(self, model: str, tokens: int, requests: int = 1) -> bool:
+        """Pega saldo só se houver agora e ninguém estiver na fila (para chamadas opcionais, como hedges)."""
+        with self._lock:
+            if any(self._queues.values()):
+                return False
+            waiter = _Waiter(model, tokens, requests, lambda: None)
+            now = clock.monotonic()
+            if self._wait_time(waiter, now) > 0:
+                return False
+            self._grant(waiter, now)
+            return True
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Acerta o balde de tokens com o consumo informado pela API (a estimativa é só pelo tamanho do texto)."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self._buckets_for(model)[1].adjust(actual_tokens - estimated_tokens)
+            self._dispatch_locked()
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            queued: Dict[str, Dict[str, int]] = {}
+            for level, queue in self._queues.items():
+                for waiters in queue.values():
+                    for waiter in waiters:
+                        per_model = queued.setdefault(waiter.model, {})
+                        per_model[PRIORITY_NAMES.get(level, str(level))] = per_model.get(PRIORITY_NAMES.get(level, str(level)), 0) + 1
+            out = {}
+            for model, stats in self._stats.items():
+                out[model] = {
+                    "concedidas": stats["concedidas"],
+                    "esperaram": stats["esperaram"],
+                    "espera_media_ms": round(stats["espera_total_s"] / stats["esperaram"] * 1e3, 1) if stats["esperaram"] else 0.0,
+                    "espera_max_ms": round(stats["espera_max_s"] * 1e3, 1),
+                    "na_fila": queued.get(model, {}),
+                }
+            return out
+
+
+scheduler = LlmScheduler()
@@ -1,52 +1,72 @@
+import asyncio
+import json
 import os
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    HumanMessagePromptTemplate,
-    AIMessagePromptTemplate
-)
-from langchain.prompts.few_shot import FewShotChatMessagePromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from pg_tools import TOOLS
+import re
+import sys
+import threading
+import time as clock
 from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional
 from zoneinfo import ZoneInfo
-from operator import itemgetter
-from faq_tools import get_faq_context
+from dotenv import load_dotenv
+from route_predictor import predict_route, speculation_stats
+from agent_metrics import is_capped, iteration_stats
+from session_context import bind_session
+from errors import CircuitOpenError, is_retryable
+from llm_scheduler import PRIORITY_SPECULATIVE, priority, scheduler
 
+# LangChain, clientes Gemini, tools e a pilha do FAQ são importados só no primeiro uso (builders abaixo):
+# importar este módulo não deve custar segundos nem abrir clientes.
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 
+# Modo especulativo (opt-in): o especialista previsto localmente começa junto com o router
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "0").lower() in ("1", "true", "yes")
+SPECULATIVE_MIN_CONFIDENCE = float(os.getenv("SPECULATIVE_MIN_CONFIDENCE", "0.7"))
+# Teto de rodadas LLM↔tools por turno de especialista
+AGENT_MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "5"))
+
 TZ = ZoneInfo("America/Sao_Paulo")
-today = datetime.now(TZ).date()
+
+
+def today_local() -> str:
+    return datetime.now(TZ).date().isoformat()
 
 
 store = {}
-def get_session_history(session_id) -> ChatMessageHistory:
+def get_session_history(session_id):
+    from langchain_core.chat_history import InMemoryChatMessageHistory
+
     if session_id not in store:
-        store[session_id] = ChatMessageHistory()
+        store[session_id] = InMemoryChatMessageHistory()
     return store[session_id]
 
 
+@lru_cache(maxsize=None)
+def get_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from resilient_llm import ResilientLLM
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.7,
-    top_p=0.95,
-    google_api_key=api_key
-)
+    return ResilientLLM(ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0.7,
+        top_p=0.95,
+        google_api_key=api_key
+    ), name="gemini-2.5-flash")
 
-fast_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0, 
-    google_api_key=api_key
-)
+
+@lru_cache(maxsize=None)
+def get_fast_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from resilient_llm import ResilientLLM
+
+    return ResilientLLM(ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0, 
+        google_api_key=api_key
+    ), name="gemini-2.0-flash")
 
 
 system_router_prompt = ("system",
@@ -62,7 +82,7 @@ Você é o Assessor.AI — um assistente pessoal de compromissos e finanças. É
 
 ### PAPEL
 - Acolher o usuário e manter o foco em FINANÇAS ou AGENDA/compromissos.
-- Decidir a rota: {{financeiro | agenda | faq}} ou se a pergunta é fora do escopo.
+- Decidir a(s) rota(s): {{financeiro | agenda | faq}} ou se a pergunta é fora do escopo.
 - Responder diretamente em:
   (a) saudações/small talk, ou 
   (b) fora de escopo (redirecionando para finanças/agenda).
@@ -75,15 +95,15 @@ Você é o Assessor.AI — um assistente pessoal de compromissos e finanças. É
 - Seja breve, educado e objetivo.
 - Se faltar um dado absolutamente essencial para decidir a rota, faça UMA pergunta mínima (CLARIFY). Caso contrário, deixe CLARIFY vazio.
 - Responda de forma textual.
-- Se a men
-- Se a mensagem do usuario for uma dúvida geral sobre o sistema, funcionalidades, regras ou politicas -> ROUTE-faq 
+- Se a mensagem do usuario for uma dúvida geral sobre o sistema, funcionalidades, regras ou politicas -> ROUTE=faq 
 - Se for uma operação financeira, orçamento, transação -> ROUTE=financeiro 
-- Se for sobre compromissos, eventos, lembretes > ROUTE-agenda 
+- Se for sobre compromissos, eventos, lembretes -> ROUTE=agenda 
+- Se a mesma mensagem tiver uma parte financeira E uma de agenda (ex.: "paguei a academia e marca treino amanhã às 7h") -> ROUTE=financeiro,agenda (os dois especialistas atendem em paralelo)
 - Se não se encaixar em nenhum desses casos continue conversa até 0 usuårio a conversar sobre finanças ou agenda/compromisso.
 
 
 ### PROTOCOLO DE ENCAMINHAMENTO (texto puro)
-ROUTE=<financeiro|agenda>
+ROUTE=<financeiro|agenda|faq>[,<outra rota>]
 PERGUNTA_ORIGINAL=<mensagem completa do usuário, sem edições>
 PERSONA=<copie o bloco "PERSONA SISTEMA" daqui>
 CLARIFY=<pergunta mínima se precisar; senão deixe vazio>
@@ -99,11 +119,6 @@ CLARIFY=<pergunta mínima se precisar; senão deixe vazio>
 """
 )
 
-example_prompt_base = ChatPromptTemplate.from_messages([
-    HumanMessagePromptTemplate.from_template("{human}"),
-    AIMessagePromptTemplate.from_template("{ai}"),
-])
-
 shots_router = [
     {
         "human": "Oi, tudo bem?",
@@ -125,17 +140,16 @@ shots_router = [
         "human": "Tenho reunião amanhã às 9h?",
         "ai": "ROUTE=agenda\nPERGUNTA_ORIGINAL=Tenho reunião amanhã às 9h?\nPERSONA={PERSONA_SISTEMA}\nCLARIFY="
     },
+    {
+        "human": "Paguei R$ 120 da academia e marca treino amanhã às 7h",
+        "ai": "ROUTE=financeiro,agenda\nPERGUNTA_ORIGINAL=Paguei R$ 120 da academia e marca treino amanhã às 7h\nPERSONA={PERSONA_SISTEMA}\nCLARIFY="
+    },
     {
         "human": "Qual e-mail de suporte?",
         "ai": "ROUTE=faq\nPERGUNTA_ORIGINAL=Qual e-mail de suporte?\nPERSONA={{PERSONA_SISTEMA}}\nCLARIFY="
     },
 ]
 
-fewshots_router = FewShotChatMessagePromptTemplate(
-    examples=shots_router,
-    example_prompt=example_prompt_base
-)
-
 
 system_prompt_finance = ("system",
     """
@@ -144,6 +158,11 @@ system_prompt_finance = ("system",
     A saída SEMPRE é JSON (contrato abaixo) para o Orquestrador.
 
     ### TAREFAS
+    - Para totais por categoria, forma de pagamento ou maiores gastos de um período, use spending_breakdown
+      (uma chamada já traz os agregados; não some transações de query_transactions).
+    - Para saúde financeira, tendências, médias ou "vou fechar o mês no azul?", use financial_health.
+    - Quando precisar de mais de uma consulta (ex.: lançamentos do período + total + saldo), faça UMA chamada a batch_query
+      com todas elas, em vez de chamar as tools de consulta uma a uma.
 
     ### CONTEXTO
     - Hoje é {today_local} (America/Sao_Paulo). Interprete datas relativas a partir desta data.
@@ -156,6 +175,7 @@ system_prompt_finance = ("system",
 
     ### REGRAS
     - Use o {chat_history} para resolver referências ao contexto recente.
+    - Se a PERGUNTA_ORIGINAL também pedir algo de agenda, ignore essa parte: o especialista de agenda cuida dela em paralelo.
 
     ### SAÍDA (JSON)
     Campos mínimos para enviar para o orquestrador:
@@ -191,11 +211,6 @@ shots_finance = [
     },
 ]
 
-fewshots_finance = FewShotChatMessagePromptTemplate(
-    examples=shots_finance,
-    example_prompt=example_prompt_base,
-)
-
 system_prompt_agenda = ("system",
     """
     ### OBJETIVO
@@ -204,7 +219,14 @@ system_prompt_agenda = ("system",
 
 
     ### TAREFAS
-
+    - Use as tools de `events`: create_event, list_events, update_event, cancel_event, find_conflicts e find_free_slots.
+    - Para compromissos que se repetem ("toda segunda às 8h"), use create_recurring_event (não crie um evento por ocorrência);
+      para mudar só uma data da série, use update_occurrence; para encerrar a série, cancel_series.
+    - Para disponibilidade ("tenho janela amanhã à tarde?"), use find_free_slots e cite os horários retornados; não calcule por conta própria.
+    - Antes de criar ou remarcar, verifique conflitos; se houver, informe e sugira outro horário.
+    - Para perguntas como "tenho algo amanhã às 9h?", use find_conflicts com o instante ou a janela citada.
+    - Quando precisar de mais de uma consulta (ex.: list_events da semana + find_free_slots de amanhã), faça UMA
+      chamada a batch_query com todas elas.
 
 
     ### CONTEXTO
@@ -218,6 +240,7 @@ system_prompt_agenda = ("system",
 
     ### REGRAS
     - Use o {chat_history} para resolver referências ao contexto recente.
+    - Se a PERGUNTA_ORIGINAL também falar de finanças (pagamentos, gastos), ignore essa parte: o especialista financeiro cuida dela em paralelo.
 
 
     ### SAÍDA (JSON)
@@ -253,11 +276,6 @@ shots_agenda = [
     },
 ]
 
-fewshots_agenda = FewShotChatMessagePromptTemplate(
-    examples=shots_agenda,
-    example_prompt=example_prompt_base,
-)
-
 
 system_prompt_faq = ("system",
 """
@@ -279,11 +297,10 @@ system_prompt_faq = ("system",
     - CLARIFY=... (se preenchido, responda primeiro)
 """)
  
-prompt_faq = ChatPromptTemplate.from_messages([
-    system_prompt_faq,
+human_prompt_faq = (
     "human",
     "Pergunta do usuário:\n{question}\n\nCONTEXTO (trechos do documento):\n{context}\n\nResponda com base APENAS no CONTEXTO."
-])
+)
 
 system_prompt_orquestrador = ("system",
     """
@@ -295,12 +312,14 @@ Você é o Agente Orquestrador do Assessor.AI. Sua função é entregar a respos
 - ESPECIALISTA_JSON contendo chaves como:
   dominio, intencao, resposta, recomendacao (opcional), acompanhamento (opcional),
   esclarecer (opcional), janela_tempo (opcional), evento (opcional), escrita (opcional), indicadores (opcional).
+- Mensagens mistas trazem mais de um bloco ESPECIALISTA_JSON (ex.: financeiro e agenda); trate todos numa única resposta.
 
 
 ### REGRAS
 - Use **exatamente** `resposta` do especialista como a **primeira linha** do output.
 - Se `recomendacao` existir e não for vazia, inclua a seção *Recomendação*; caso contrário, **omita**.
 - Para *Acompanhamento*: se houver `esclarecer`, use-o; senão, se houver `acompanhamento`, use-o; caso contrário, **omita** a seção.
+- Com mais de um ESPECIALISTA_JSON, a primeira linha junta as `resposta` na ordem recebida, e cada seção traz uma linha por especialista que a preencheu.
 - Não reescreva números/datas se já vierem prontos. Não invente dados. Seja conciso.
 - Não retorne JSON; **sempre** retorne no FORMATO DE SAÍDA.
 
@@ -333,141 +352,341 @@ shots_orquestrador = [
         "human": """ESPECIALISTA_JSON:\n{{"dominio":"agenda","intencao":"criar","resposta":"Posso criar 'Reunião com João' amanhã 09:00–10:00.","recomendacao":"Confirmo o envio do convite?","janela_tempo":{{"de":"2025-09-29T09:00","ate":"2025-09-29T10:00","rotulo":"amanhã 09:00–10:00"}},"evento":{{"titulo":"Reunião com João","data":"2025-09-29","inicio":"09:00","fim":"10:00","local":"online"}}}}""",
         "ai": """Posso criar 'Reunião com João' amanhã 09:00–10:00.\n- *Recomendação*:\nConfirmo o envio do convite?"""
     },
+
+    {
+        "human": """ESPECIALISTA_JSON:\n{{"dominio":"financeiro","intencao":"inserir","resposta":"Lancei R$ 120,00 de academia hoje.","recomendacao":""}}\n\nESPECIALISTA_JSON:\n{{"dominio":"agenda","intencao":"criar","resposta":"Treino marcado amanhã 07:00–08:00.","recomendacao":"Quer repetir toda semana?"}}""",
+        "ai": """Lancei R$ 120,00 de academia hoje. Treino marcado amanhã 07:00–08:00.\n- *Recomendação*:\nQuer repetir toda semana?"""
+    },
 ]
 
-fewshots_orquestrador = FewShotChatMessagePromptTemplate(
-    examples=shots_orquestrador,
-    example_prompt=example_prompt_base,
-)
 
+PROMPT_SPECS = {
+    # nome: (system, few-shots, usa agent_scratchpad)
+    "router": (system_router_prompt, shots_router, False),
+    "orchestrator": (system_prompt_orquestrador, shots_orquestrador, False),
+    "financeiro": (system_prompt_finance, shots_finance, True),
+    "agenda": (system_prompt_agenda, shots_agenda, True),
+}
 
-prompt_router = ChatPromptTemplate.from_messages([
-    system_router_prompt,
-    fewshots_router,
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}"),
-]).partial(today_local=today.isoformat())
-
-prompt_orchestrator = ChatPromptTemplate.from_messages([
-    system_prompt_orquestrador,
-    fewshots_orquestrador,
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}"),
-]).partial(today_local=today.isoformat())
-
-prompt_schedule_agent = ChatPromptTemplate.from_messages([
-    system_prompt_agenda,
-    fewshots_agenda,
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}"),
-    MessagesPlaceholder("agent_scratchpad"),
-]).partial(today_local=today.isoformat())
-
-prompt_finance_agent = ChatPromptTemplate.from_messages([
-    system_prompt_finance,
-    fewshots_finance,
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}"),
-    MessagesPlaceholder("agent_scratchpad"), 
-]).partial(today_local=today.isoformat())
-
-
-finance_agent = create_tool_calling_agent(llm, TOOLS, prompt_finance_agent)
-finance_agent_executor = AgentExecutor(agent=finance_agent, tools=TOOLS, verbose=False)
-finance_agent = RunnableWithMessageHistory(
-    finance_agent_executor,
-    get_session_history=get_session_history,
-    input_messages_key="input",
-    history_messages_key="chat_history",
-    verbose=False,
-    handle_parsing_errors=False,
-    return_intermediate_steps=False,
-)
 
+@lru_cache(maxsize=None)
+def get_prompt(name: str):
+    from langchain_core.prompts import (
+        AIMessagePromptTemplate,
+        ChatPromptTemplate,
+        FewShotChatMessagePromptTemplate,
+        HumanMessagePromptTemplate,
+        MessagesPlaceholder,
+    )
 
-schedule_agent = create_tool_calling_agent(llm, TOOLS, prompt_schedule_agent)
-schedule_agent_executor = AgentExecutor(agent=schedule_agent, tools=TOOLS, verbose=False)
-schedule_agent = RunnableWithMessageHistory(
-    schedule_agent_executor,
-    get_session_history=get_session_history,
-    input_messages_key="input",
-    history_messages_key="chat_history",
-    verbose=False,
-    handle_parsing_errors=False,
-    return_intermediate_steps=False,
-)
+    system, shots, with_scratchpad = PROMPT_SPECS[name]
+    example_prompt_base = ChatPromptTemplate.from_messages([
+        HumanMessagePromptTemplate.from_template("{human}"),
+        AIMessagePromptTemplate.from_template("{ai}"),
+    ])
+    messages = [
+        system,
+        FewShotChatMessagePromptTemplate(examples=shots, example_prompt=example_prompt_base),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ]
+    if with_scratchpad:
+        messages.append(MessagesPlaceholder("agent_scratchpad"))
+    return ChatPromptTemplate.from_messages(messages).partial(today_local=today_local)
 
-router_chain = RunnableWithMessageHistory(
-    prompt_router | fast_llm,
-    get_session_history=get_session_history,
-    input_messages_key="input",
-    history_messages_key="chat_history"
-)
 
-orchestrator_agent = RunnableWithMessageHistory(
-    prompt_orchestrator | fast_llm | StrOutputParser(),
-    get_session_history=get_session_history,
-    input_messages_key="input",
-    history_messages_key="chat_history"
-)
+def _specialist_tools(route: str, read_only: bool):
+    if route == "financeiro":
+        from pg_tools import READ_ONLY_TOOLS, TOOLS
+        from analytics import ANALYTICS_TOOLS
+
+        return (READ_ONLY_TOOLS if read_only else TOOLS) + ANALYTICS_TOOLS
+    from agenda_tools import AGENDA_TOOLS, READ_ONLY_AGENDA_TOOLS
+    from pg_tools import batch_query
+
+    return (READ_ONLY_AGENDA_TOOLS if read_only else AGENDA_TOOLS) + [batch_query]
 
-faq_chain_core = (
-    RunnablePassthrough.assign(
-        question = itemgetter("input"),
-        context=lambda x: get_faq_context(x["input"])
+
+@lru_cache(maxsize=None)
+def get_executor(route: str, read_only: bool = False):
+    """
+    AgentExecutor do especialista. read_only=True (execução especulativa) só recebe tools de leitura
+    e é usado sem histórico gravado: pode ser descartado se o router discordar.
+    """
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+
+    tools = _specialist_tools(route, read_only)
+    return AgentExecutor(
+        agent=create_tool_calling_agent(get_llm(), tools, get_prompt(route)),
+        tools=tools,
+        verbose=False,
+        max_iterations=AGENT_MAX_ITERATIONS,
+        return_intermediate_steps=True,
     )
-    | prompt_faq | fast_llm | StrOutputParser()
-)
 
-def execute_assessor_flow(user_question: str, session_id: str):
+
+@lru_cache(maxsize=None)
+def get_specialist(route: str):
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+
+    return RunnableWithMessageHistory(
+        get_executor(route),
+        get_session_history=get_session_history,
+        input_messages_key="input",
+        output_messages_key="output",
+        history_messages_key="chat_history",
+        verbose=False,
+        handle_parsing_errors=False,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_router_chain():
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+
+    return RunnableWithMessageHistory(
+        get_prompt("router") | get_fast_llm() | StrOutputParser(),
+        get_session_history=get_session_history,
+        input_messages_key="input",
+        history_messages_key="chat_history"
+    )
+
+
+@lru_cache(maxsize=None)
+def get_orchestrator_agent():
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+
+    return RunnableWithMessageHistory(
+        get_prompt("orchestrator") | get_fast_llm() | StrOutputParser(),
+        get_session_history=get_session_history,
+        input_messages_key="input",
+        history_messages_key="chat_history"
+    )
+
+
+@lru_cache(maxsize=None)
+def get_faq_chain():
+    """Chain do FAQ; só aqui a pilha de PDF/embeddings/FAISS é importada."""
+    from operator import itemgetter
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import RunnablePassthrough
+    from faq_tools import get_faq_context
+
+    prompt_faq = ChatPromptTemplate.from_messages([system_prompt_faq, human_prompt_faq])
+    return (
+        RunnablePassthrough.assign(
+            question = itemgetter("input"),
+            context=lambda x: get_faq_context(x["input"])
+        )
+        | prompt_faq | get_fast_llm() | StrOutputParser()
+    )
+
+
+def warm_up():
+    """Constrói router, orquestrador e especialistas (não o FAQ), para tirar esse custo do primeiro turno."""
+    get_router_chain()
+    get_orchestrator_agent()
+    for route in ("financeiro", "agenda"):
+        get_specialist(route)
+        if SPECULATIVE_ROUTING:
+            get_executor(route, read_only=True)
+
+
+ROUTES = ("financeiro", "agenda", "faq")
+
+
+def parse_routes(response_router: str) -> List[str]:
+    """Rotas da linha ROUTE= do roteador (ex.: "financeiro,agenda"), na ordem e sem repetição."""
+    match = re.search(r"^ROUTE=(.*)$", response_router, re.MULTILINE)
+    if not match:
+        return []
+    routes = []
+    for route in re.split(r"[,|\s]+", match.group(1).strip().lower()):
+        if route in ROUTES and route not in routes:
+            routes.append(route)
+    return routes
+
+
+def _specialist_input(response_router: str, route: str) -> str:
+    """Mensagem do roteador com ROUTE reduzido ao domínio do especialista."""
+    return re.sub(r"^ROUTE=.*$", f"ROUTE={route}", response_router, count=1, flags=re.MULTILINE)
+
+
+async def _run_specialist(route: str, response_router: str, user_question: str, config: dict) -> str:
+    if route in ("financeiro", "agenda"):
+        resposta = await get_specialist(route).ainvoke(input={"input": _specialist_input(response_router, route)}, config=config)
+        return _specialist_output(route, resposta)
+    resposta = await get_faq_chain().ainvoke(input={"input": user_question}, config=config)
+    return json.dumps({"dominio": "faq", "intencao": "consultar", "resposta": resposta, "recomendacao": ""}, ensure_ascii=False)
+
+
+def _clarify(response_router: str) -> str:
+    match = re.search(r"^CLARIFY=(.*)$", response_router, re.MULTILINE)
+    return match.group(1).strip() if match else ""
+
+
+def _specialist_output(route: str, resposta: dict) -> str:
+    """Saída do especialista para o orquestrador; turno interrompido pelo teto vira um JSON pedindo detalhes."""
+    iteration_stats.record(route, resposta)
+    if is_capped(resposta):
+        return json.dumps({
+            "dominio": route,
+            "intencao": "consultar",
+            "resposta": "Não consegui concluir esse pedido em poucas etapas.",
+            "recomendacao": "",
+            "esclarecer": "Pode detalhar o período ou dividir o pedido em partes menores?",
+        }, ensure_ascii=False)
+    return resposta["output"]
+
+
+async def _speculate(route: str, speculative_input: str, session_id: str) -> str:
+    history = list(get_session_history(session_id).messages)
+    # Palpite pode ser descartado: na fila de cota, perde a vez para router, especialistas e orquestrador
+    with priority(PRIORITY_SPECULATIVE):
+        resposta = await get_executor(route, read_only=True).ainvoke({"input": speculative_input, "chat_history": history})
+    return _specialist_output(route, resposta)
+
+
+def _start_speculation(user_question: str, session_id: str):
+    """Dispara o especialista previsto quando o palpite local é confiável e a mensagem é só de consulta."""
+    if not SPECULATIVE_ROUTING:
+        return None
+    prediction = predict_route(user_question)
+    if prediction.route is None or not prediction.read_only or prediction.confidence < SPECULATIVE_MIN_CONFIDENCE:
+        return None
+    speculative_input = f"ROUTE={prediction.route}\nPERGUNTA_ORIGINAL={user_question}\nPERSONA=\nCLARIFY="
+    task = asyncio.create_task(_speculate(prediction.route, speculative_input, session_id))
+    return prediction.route, speculative_input, task, clock.perf_counter()
+
+
+async def _settle_speculation(speculation, routes: List[str], response_router: str, session_id: str) -> Optional[str]:
     """
-    Função que controla o fluxo do assessor com base no retorno do router (se ele encaminhará para um dos agentes de acordo com a pergunta o usuário).
+    Usa a resposta especulativa se o router confirmou a rota (sem CLARIFY); caso contrário cancela a tarefa.
+    Devolve a saída do especialista no acerto, ou None.
     """
-    response_router = router_chain.invoke(input={"input": user_question},
-                                        config={"configurable": {"session_id": session_id}})
-    
-    if not "ROUTE=" in response_router:
-        return response_router
-    else:
-        
-        if "ROUTE=financeiro" in response_router:
-            resposta_finance = finance_agent.invoke(input={"input": response_router},
-                                        config={"configurable": {"session_id": session_id}})
-            output_orchestrator = orchestrator_agent.invoke(input={"input": resposta_finance["output"]},
-                                        config={"configurable": {"session_id": session_id}})
-            
-            print(output_orchestrator)
-            return output_orchestrator
-        
-        elif "ROUTE=agenda" in response_router:
-            resposta_schedule = schedule_agent.invoke(input={"input": response_router},
-                                        config={"configurable": {"session_id": session_id}})
-            
-            output_orchestrator = orchestrator_agent.invoke(input={"input": resposta_schedule["output"]},
-                                        config={"configurable": {"session_id": session_id}})
-            
-            print(output_orchestrator)
-            return output_orchestrator
-        
-        elif "ROUTE=faq" in response_router:
-            response_faq = faq_chain_core.invoke(input={"input": user_question},
-                                        config={"configurable": {"session_id": session_id}})
-            
-            print(response_faq)
-            return response_faq
-
-while True:
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    route, speculative_input, task, started = speculation
+    router_done = clock.perf_counter()
+    if route in routes and not _clarify(response_router):
+        try:
+            output = await task
+        except Exception:
+            speculation_stats.record_miss(route, (router_done - started) * 1e3)
+            return None
+        # Economia = trabalho do especialista já feito enquanto o router respondia
+        speculation_stats.record_hit(route, (min(router_done, clock.perf_counter()) - started) * 1e3)
+        get_session_history(session_id).add_messages([HumanMessage(content=speculative_input), AIMessage(content=output)])
+        return output
+
+    task.cancel()
+    speculation_stats.record_miss(route, (router_done - started) * 1e3)
+    return None
+
+
+DEGRADED_REPLY = "Estou com instabilidade para gerar respostas agora. Tente de novo em instantes."
+
+
+def _degraded_reply(user_question: str) -> str:
+    """Resposta sem LLM quando o modelo está fora: os trechos do FAQ mais próximos da pergunta (só BM25)."""
     try:
-        user_input = input("> | ")
-        if user_input.lower() in ("sair", "end", "fim", "tchau", "bye", "tchautchau"):
-            print("Encerrando a conversa")
-            break
-        
-        resposta = execute_assessor_flow(
-            user_question=user_input,
-            session_id="PRECISA_MAS_NÃO_IMPORTA"
-        )
-        
-        print(resposta)
+        from faq_tools import lexical_context
+
+        context = lexical_context(user_question)
+    except Exception:
+        context = ""
+    if not context:
+        return DEGRADED_REPLY
+    return f"{DEGRADED_REPLY}\nEnquanto isso, veja o que o nosso FAQ diz sobre o assunto:\n\n{context}"
+
+
+async def aexecute_assessor_flow(user_question: str, session_id: str, user_id: Optional[str] = None):
+    """
+    Fluxo do assessor: o router decide uma ou mais rotas; os especialistas pedidos rodam em paralelo
+    (a latência fica próxima à do mais lento, não à soma) e o orquestrador junta as respostas numa única passada.
+    Com SPECULATIVE_ROUTING, o especialista previsto localmente já roda durante o router.
+    Se o modelo estiver fora (circuito aberto ou erro transitório depois das retentativas), a resposta degrada
+    para os trechos do FAQ.
+    """
+    try:
+        return await _assessor_flow(user_question, session_id, user_id)
     except Exception as e:
-        print("Erro ao consumir a API: ", e)
+        if not isinstance(e, CircuitOpenError) and not is_retryable(e):
+            raise
+        return _degraded_reply(user_question)
+
+
+async def _assessor_flow(user_question: str, session_id: str, user_id: Optional[str]):
+    config = {"configurable": {"session_id": session_id}}
+    with bind_session(session_id, user_id):
+        speculation = _start_speculation(user_question, session_id)
+        response_router = await get_router_chain().ainvoke(input={"input": user_question}, config=config)
+
+        routes = parse_routes(response_router)
+        outputs = {}
+        if speculation is not None:
+            output = await _settle_speculation(speculation, routes, response_router, session_id)
+            if output is not None:
+                outputs[speculation[0]] = output
+        if not routes:
+            return response_router
+        if routes == ["faq"]:
+            return await get_faq_chain().ainvoke(input={"input": user_question}, config=config)
+
+        pending = [route for route in routes if route not in outputs]
+        results = await asyncio.gather(
+            *(_run_specialist(route, response_router, user_question, config) for route in pending),
+            return_exceptions=True,
+        )
+        outputs.update(zip(pending, results))
+        especialistas = []
+        for route in routes:
+            result = outputs[route]
+            if isinstance(result, Exception):
+                # Falha de um especialista não derruba a parte que o outro já resolveu
+                result = json.dumps({
+                    "dominio": route,
+                    "intencao": "consultar",
+                    "resposta": f"Não consegui concluir a parte de {route} agora.",
+                    "recomendacao": "Tente de novo em instantes.",
+                }, ensure_ascii=False)
+            especialistas.append(f"ESPECIALISTA_JSON:\n{result}")
+
+        return await get_orchestrator_agent().ainvoke(input={"input": "\n\n".join(especialistas)}, config=config)
+
+
+def execute_assessor_flow(user_question: str, session_id: str, user_id: Optional[str] = None):
+    """Versão síncrona de aexecute_assessor_flow, usada pelo chat de terminal."""
+    return asyncio.run(aexecute_assessor_flow(user_question, session_id, user_id))
+
+def run_chat():
+    # Os clientes e agentes são montados em segundo plano enquanto o usuário digita a primeira mensagem
+    threading.Thread(target=warm_up, daemon=True).start()
+    while True:
+        try:
+            user_input = input("> | ")
+            if user_input.lower() in ("sair", "end", "fim", "tchau", "bye", "tchautchau"):
+                print("Encerrando a conversa")
+                print("Iterações por turno:", json.dumps(iteration_stats.report(), ensure_ascii=False))
+                if SPECULATIVE_ROUTING:
+                    print("Execução especulativa:", json.dumps(speculation_stats.report(), ensure_ascii=False))
+                print("Fila de cota:", json.dumps(scheduler.report(), ensure_ascii=False))
+                if "resilient_llm" in sys.modules:
+                    print("Chamadas ao modelo:", json.dumps(sys.modules["resilient_llm"].llm_stats.report(), ensure_ascii=False))
+                break
+
+            resposta = execute_assessor_flow(
+                user_question=user_input,
+                session_id="PRECISA_MAS_NÃO_IMPORTA"
+            )
+
+            print(resposta)
+        except Exception as e:
+            print("Erro ao consumir a API: ", e)
+
+
+if __name__ == "__main__":
+    run_chat()
@@ -1,24 +1,57 @@
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from datetime import date
 from dotenv import load_dotenv
 import psycopg2
-from typing import Optional
+import psycopg2.extensions
+from typing import List, Optional
 from langchain.tools import tool
 from pydantic import BaseModel, Field
+import ledger_snapshot
+import shard_router
+from session_context import get_user_id
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")  
+TRANSACTIONS_PARTITIONED = os.getenv("TRANSACTIONS_PARTITIONED", "0").lower() in ("1", "true", "yes")
+
+BATCH_QUERY_MAX_WORKERS = int(os.getenv("BATCH_QUERY_MAX_WORKERS", "4"))
+BATCH_QUERY_MAX_QUERIES = 8
+
+# Conexão imposta às tools por batch_query (todas leem o mesmo snapshot); None = conexão própria
+_bound_conn: ContextVar = ContextVar("bound_conn", default=None)
 
 def get_conn():
-    return psycopg2.connect(DATABASE_URL)
+    """Conexão com o shard do usuário da sessão atual."""
+    bound = _bound_conn.get()
+    if bound is not None:
+        return bound
+    return psycopg2.connect(shard_router.dsn_for(get_user_id()))
 
 def close_conn(conn):
+    if conn is not None and conn is _bound_conn.get():
+        return
     try:
         if conn:
             conn.close()
     except Exception:
         pass
 
+def _snapshot():
+    """Snapshot do usuário (ver ledger_snapshot), conferido contra o banco quando a conferência vence."""
+    def read_db_watermark(user_id):
+        conn = get_conn()
+        cur = conn.cursor()
+        try:
+            return ledger_snapshot.read_watermark(cur, user_id)
+        finally:
+            cur.close()
+            close_conn(conn)
+    return ledger_snapshot.active_snapshot(read_db_watermark)
+
 class AddTransactionArgs(BaseModel):
     amount: float = Field(..., description="Valor da transação (use positivo).")
     source_text: str = Field(..., description="Texto original do usuário.")
@@ -63,6 +96,61 @@ class UpdateTransactionArgs(BaseModel):
     payment_method: Optional[str] = Field(default=None, description="Novo meio de pagamento.")
     occurred_at: Optional[str] = Field(default=None, description="Novo timestamp ISO 8601.")
 
+class SubQuery(BaseModel):
+    tool: str = Field(..., description="Nome de uma tool de consulta (ex.: query_transactions, total_balance, spending_breakdown, financial_health, list_events).")
+    args_json: str = Field(
+        default="{}",
+        description='Argumentos da tool em JSON, ex.: {"date_from_local": "2025-09-01", "date_to_local": "2025-09-30"}.'
+    )
+
+class BatchQueryArgs(BaseModel):
+    queries: List[SubQuery] = Field(..., description="Consultas a executar juntas (máx. 8).")
+
+class SpendingBreakdownArgs(BaseModel):
+    date_from_local: str = Field(..., description="Data inicial local YYYY-MM-DD (America/Sao_Paulo).")
+    date_to_local: str = Field(..., description="Data final local YYYY-MM-DD (America/Sao_Paulo), inclusiva.")
+    type_name: str = Field(default="EXPENSES", description="Tipo agregado: INCOME | EXPENSES | TRANSFER.")
+    category_id: Optional[int] = Field(default=None, description="Restringe a uma categoria (id) (opcional).")
+    category_name: Optional[str] = Field(default=None, description="Restringe a uma categoria (nome) (opcional).")
+    top_n: int = Field(default=5, description="Quantidade de estabelecimentos/descrições no ranking.")
+
+LOCAL_TZ = "America/Sao_Paulo"
+
+def _local_range_filter_sql(column: str) -> str:
+    """
+    Filtro por intervalo de dias locais (2 parâmetros YYYY-MM-DD, inclusivos) escrito direto sobre a coluna,
+    para que os índices em occurred_at (e a poda de partições) possam ser usados.
+    """
+    return (
+        f"{column} >= (%s::date::timestamp AT TIME ZONE '{LOCAL_TZ}') "
+        f"AND {column} < ((%s::date + 1)::timestamp AT TIME ZONE '{LOCAL_TZ}')"
+    )
+
+_partitions_checked_month = None
+
+def _ensure_partitions(cur):
+    """Com transactions particionada, garante as partições dos próximos meses uma vez por mês por processo."""
+    global _partitions_checked_month
+    month = date.today().replace(day=1)
+    if not TRANSACTIONS_PARTITIONED or _partitions_checked_month == month:
+        return
+    cur.execute("SELECT ensure_transactions_partitions(CURRENT_DATE, 3);")
+    _partitions_checked_month = month
+
+def _get_category_id(cur, category_name: str) -> Optional[int]:
+    # Categoria própria do usuário tem precedência sobre a padrão (user_id NULL) de mesmo nome
+    cur.execute(
+        """
+        SELECT id FROM categories
+        WHERE LOWER(name) = LOWER(%s) AND (user_id IS NULL OR user_id = %s)
+        ORDER BY user_id NULLS LAST
+        LIMIT 1;
+        """,
+        (category_name.strip(), get_user_id()),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
 def _resolve_type_id(cur, type_id: Optional[int], type_name: Optional[str]) -> Optional[int]:
     if type_name:
         t = type_name.strip().upper()
@@ -96,32 +184,36 @@ def add_transaction(
         resolved_type_id = _resolve_type_id(cur, type_id, type_name)
         if not resolved_type_id:
             return {"status": "error", "message": "Tipo inválido (use type_id ou type_name: INCOME/EXPENSES/TRANSFER)."}
+        _ensure_partitions(cur)
 
         if occurred_at:
             cur.execute(
                 """
                 INSERT INTO transactions
-                    (amount, type, category_id, description, payment_method, occurred_at, source_text)
+                    (user_id, amount, type, category_id, description, payment_method, occurred_at, source_text)
                 VALUES
-                    (%s, %s, %s, %s, %s, %s::timestamptz, %s)
+                    (%s, %s, %s, %s, %s, %s, %s::timestamptz, %s)
                 RETURNING id, occurred_at;
                 """,
-                (amount, resolved_type_id, category_id, description, payment_method, occurred_at, source_text),
+                (get_user_id(), amount, resolved_type_id, category_id, description, payment_method, occurred_at, source_text),
             )
         else:
             cur.execute(
                 """
                 INSERT INTO transactions
-                    (amount, type, category_id, description, payment_method, occurred_at, source_text)
+                    (user_id, amount, type, category_id, description, payment_method, occurred_at, source_text)
                 VALUES
-                    (%s, %s, %s, %s, %s, NOW(), %s)
+                    (%s, %s, %s, %s, %s, %s, NOW(), %s)
                 RETURNING id, occurred_at;
                 """,
-                (amount, resolved_type_id, category_id, description, payment_method, source_text),
+                (get_user_id(), amount, resolved_type_id, category_id, description, payment_method, source_text),
             )
 
         new_id, occurred = cur.fetchone()
         conn.commit()
+        ledger_snapshot.apply_committed(
+            (new_id, occurred, float(amount), resolved_type_id, category_id, description, payment_method, source_text)
+        )
         return {"status": "ok", "id": new_id, "occurred_at": str(occurred)}
 
     except Exception as e:
@@ -147,17 +239,21 @@ def query_transactions(
     Os dados devem vir na seguinte ordem:
      - Intervalo (date_from_local/date_to_local): ASC (cronológico).
      - Caso contrário: DESC (mais recente primeiro)"""
-     
+    snap = _snapshot()
+    if snap is not None:
+        return {"transactions": snap.search(text, type_name, date_local, date_from_local, date_to_local, limit)}
+
     conn = get_conn()
     cur = conn.cursor()
 
     try:
         base_query = """
-        SELECT * FROM transactions t
+        SELECT t.id, t.amount, t.type, t.category_id, t.description, t.payment_method, t.occurred_at, t.source_text
+        FROM transactions t
         JOIN transaction_types tt ON tt.id = t.type
-        WHERE 1=1
+        WHERE t.user_id = %s
         """
-        conditions, params = [], []
+        conditions, params = [], [get_user_id()]
 
         if text:
             conditions.append("(t.source_text ILIKE %s OR t.description ILIKE %s)")
@@ -168,19 +264,17 @@ def query_transactions(
             params.append(f"%{type_name}%")
 
         if date_local:
-            conditions.append("t.occurred_at::date = (%s::date AT TIME ZONE 'America/Sao_Paulo')")
-            params.append(date_local)
+            conditions.append(_local_range_filter_sql("t.occurred_at"))
+            params.extend([date_local, date_local])
 
         if date_from_local and date_to_local:
-            conditions.append("""t.occurred_at::date BETWEEN
-                                (%s::date AT TIME ZONE 'America/Sao_Paulo')
-                                AND (%s::date AT TIME ZONE 'America/Sao_Paulo')""")
+            conditions.append(_local_range_filter_sql("t.occurred_at"))
             params.extend([date_from_local, date_to_local])
             order_clause = "ORDER BY t.occurred_at ASC"
         else:
             order_clause = "ORDER BY t.occurred_at DESC"
 
-        query = base_query + " AND ".join(conditions) + f" {order_clause} LIMIT %s"
+        query = base_query + "".join(f" AND {c}" for c in conditions) + f" {order_clause} LIMIT %s"
         params.append(limit)
 
         cur.execute(query, params)
@@ -213,6 +307,10 @@ def total_balance() -> dict:
     """
     Retorna o saldo total (INCOME - EXPENSES) em todo o histórico (ignora TRANSFER).
     """
+    snap = _snapshot()
+    if snap is not None:
+        return {"saldo_total": snap.total()}
+
     conn = get_conn()
     cur = conn.cursor()
     try:
@@ -222,7 +320,8 @@ def total_balance() -> dict:
                 - COALESCE(SUM(CASE WHEN tt.type = 'EXPENSES' THEN t.amount END), 0) AS balance
             FROM transactions t
             JOIN transaction_types tt ON tt.id = t.type
-            """)
+            WHERE t.user_id = %s
+            """, (get_user_id(),))
         return {"saldo_total": float(cur.fetchone()[0])}
 
     except Exception as e:
@@ -237,17 +336,21 @@ def daily_balance(date_local: str) -> dict:
     Retorna o saldo (INCOME - EXPENSES) do dia local informado (YYYY-MM-DD) em America_Sao_Paulo.
     Ignora TRANSFER (type=3).
     """
+    snap = _snapshot()
+    if snap is not None:
+        return {"saldo_dia": snap.total(None, date_local, date_local), "date": date_local}
+
     conn = get_conn()
     cur = conn.cursor()
     try:
-        cur.execute("""
+        cur.execute(f"""
         SELECT 
             COALESCE(SUM(CASE WHEN tt.type = 'INCOME' THEN t.amount END), 0)
             - COALESCE(SUM(CASE WHEN tt.type = 'EXPENSES' THEN t.amount END), 0) AS balance
         FROM transactions t
         JOIN transaction_types tt ON tt.id = t.type
-        WHERE t.occurred_at::date = %s::date
-        """, (date_local,))
+        WHERE t.user_id = %s AND {_local_range_filter_sql("t.occurred_at")}
+        """, (get_user_id(), date_local, date_local))
         return {"saldo_dia": float(cur.fetchone()[0]), "date": date_local}
 
     except Exception as e:
@@ -262,17 +365,21 @@ def in_time_interval_balance(date_from_local: str, date_to_local: str) -> dict:
     Retorna o saldo (INCOME - EXPENSES) do intervalo de datas local informado (YYYY-MM-DD) em America_Sao_Paulo.
     Ignora TRANSFER (type=3).
     """
+    snap = _snapshot()
+    if snap is not None:
+        return {"saldo_intervalo": snap.total(None, date_from_local, date_to_local), "date_from": date_from_local, "date_to": date_to_local}
+
     conn = get_conn()
     cur = conn.cursor()
     try:
-        cur.execute("""
+        cur.execute(f"""
         SELECT 
             COALESCE(SUM(CASE WHEN tt.type = 'INCOME' THEN t.amount END), 0)
             - COALESCE(SUM(CASE WHEN tt.type = 'EXPENSES' THEN t.amount END), 0) AS balance
         FROM transactions t
         JOIN transaction_types tt ON tt.id = t.type
-        WHERE t.occurred_at::date BETWEEN %s::date AND %s::date
-        """, (date_from_local, date_to_local))
+        WHERE t.user_id = %s AND {_local_range_filter_sql("t.occurred_at")}
+        """, (get_user_id(), date_from_local, date_to_local))
         return {"saldo_intervalo": float(cur.fetchone()[0]), "date_from": date_from_local, "date_to": date_to_local}
 
     except Exception as e:
@@ -286,16 +393,20 @@ def in_time_interval_income(date_from_local: str, date_to_local: str) -> dict:
     """
     Retorna o total de INCOME do intervalo de datas local informado (YYYY-MM-DD) em America_Sao_Paulo.
     """
+    snap = _snapshot()
+    if snap is not None:
+        return {"total_income": snap.total(ledger_snapshot.INCOME, date_from_local, date_to_local), "date_from": date_from_local, "date_to": date_to_local}
+
     conn = get_conn()
     cur = conn.cursor()
     try:
-        cur.execute("""
+        cur.execute(f"""
         SELECT 
             COALESCE(SUM(CASE WHEN tt.type = 'INCOME' THEN t.amount END), 0)
         FROM transactions t
         JOIN transaction_types tt ON tt.id = t.type
-        WHERE t.occurred_at::date BETWEEN %s::date AND %s::date
-        """, (date_from_local, date_to_local))
+        WHERE t.user_id = %s AND {_local_range_filter_sql("t.occurred_at")}
+        """, (get_user_id(), date_from_local, date_to_local))
         return {"total_income": float(cur.fetchone()[0]), "date_from": date_from_local, "date_to": date_to_local}
 
     except Exception as e:
@@ -309,23 +420,124 @@ def in_time_interval_expenses(date_from_local: str, date_to_local: str) -> dict:
     """
     Retorna o total de EXPENSES do intervalo de datas local informado (YYYY-MM-DD) em America_Sao_Paulo.
     """
+    snap = _snapshot()
+    if snap is not None:
+        return {"total_expenses": snap.total(ledger_snapshot.EXPENSES, date_from_local, date_to_local), "date_from": date_from_local, "date_to": date_to_local}
+
     conn = get_conn()
     cur = conn.cursor()
     try:
-        cur.execute("""
+        cur.execute(f"""
         SELECT 
             COALESCE(SUM(CASE WHEN tt.type = 'EXPENSES' THEN t.amount END), 0)
         FROM transactions t
         JOIN transaction_types tt ON tt.id = t.type
-        WHERE t.occurred_at::date BETWEEN %s::date AND %s::date
-        """, (date_from_local, date_to_local))
+        WHERE t.user_id = %s AND {_local_range_filter_sql("t.occurred_at")}
+        """, (get_user_id(), date_from_local, date_to_local))
         return {"total_expenses": float(cur.fetchone()[0]), "date_from": date_from_local, "date_to": date_to_local}
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
         cur.close()
         close_conn(conn)
-        
+
+@tool("spending_breakdown", args_schema=SpendingBreakdownArgs)
+def spending_breakdown(
+    date_from_local: str,
+    date_to_local: str,
+    type_name: str = "EXPENSES",
+    category_id: Optional[int] = None,
+    category_name: Optional[str] = None,
+    top_n: int = 5,
+) -> dict:
+    """
+    Retorna, para o intervalo de datas locais (America/Sao_Paulo), os totais e contagens por categoria e por
+    forma de pagamento, o top-N de estabelecimentos/descrições e o total geral, numa única consulta agrupada.
+    Use para perguntas como "quanto gastei com comida no mês passado?" em vez de somar query_transactions.
+    """
+    conn = get_conn()
+    cur = conn.cursor()
+    try:
+        resolved_type_id = _resolve_type_id(cur, None, type_name)
+        if not resolved_type_id:
+            return {"status": "error", "message": "Tipo inválido (use INCOME/EXPENSES/TRANSFER)."}
+
+        resolved_category_id = category_id
+        if category_name and not category_id:
+            resolved_category_id = _get_category_id(cur, category_name)
+            if resolved_category_id is None:
+                return {"status": "error", "message": f"Categoria não encontrada: {category_name}."}
+
+        # Com categoria, o filtro (user_id, category_id, occurred_at) é atendido por idx_transactions_category_time
+        conditions = ["t.user_id = %s", "t.type = %s", _local_range_filter_sql("t.occurred_at")]
+        params: List[object] = [get_user_id(), resolved_type_id, date_from_local, date_to_local]
+        if resolved_category_id is not None:
+            conditions.append("t.category_id = %s")
+            params.append(resolved_category_id)
+        params.append(top_n)
+
+        cur.execute(
+            f"""
+            WITH filtered AS (
+                SELECT
+                    t.amount,
+                    COALESCE(c.name, 'sem categoria') AS category,
+                    COALESCE(t.payment_method, 'não informado') AS payment_method,
+                    COALESCE(NULLIF(t.description, ''), 'sem descrição') AS merchant
+                FROM transactions t
+                LEFT JOIN categories c ON c.id = t.category_id
+                WHERE {" AND ".join(conditions)}
+            ),
+            grouped AS (
+                SELECT
+                    GROUPING(category, payment_method, merchant) AS grouping_id,
+                    category, payment_method, merchant,
+                    SUM(amount) AS total,
+                    COUNT(*) AS n
+                FROM filtered
+                GROUP BY GROUPING SETS ((category), (payment_method), (merchant), ())
+            ),
+            ranked AS (
+                SELECT g.*, ROW_NUMBER() OVER (PARTITION BY grouping_id ORDER BY total DESC) AS rn
+                FROM grouped g
+            )
+            SELECT grouping_id, category, payment_method, merchant, total, n
+            FROM ranked
+            WHERE grouping_id <> 6 OR rn <= %s
+            ORDER BY grouping_id, total DESC;
+            """,
+            params,
+        )
+
+        result = {
+            "date_from": date_from_local,
+            "date_to": date_to_local,
+            "type_name": type_name.upper(),
+            "total": 0.0,
+            "count": 0,
+            "by_category": [],
+            "by_payment_method": [],
+            "top_merchants": [],
+        }
+        # GROUPING(category, payment_method, merchant): bit ligado = coluna agregada
+        for grouping_id, category, payment_method, merchant, total, n in cur.fetchall():
+            if grouping_id == 3:
+                result["by_category"].append({"category": category, "total": float(total), "count": n})
+            elif grouping_id == 5:
+                result["by_payment_method"].append({"payment_method": payment_method, "total": float(total), "count": n})
+            elif grouping_id == 6:
+                result["top_merchants"].append({"merchant": merchant, "total": float(total), "count": n})
+            elif grouping_id == 7:
+                result["total"] = float(total or 0)
+                result["count"] = n
+        return result
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        close_conn(conn)
+
 @tool("update_transaction", args_schema=UpdateTransactionArgs)
 def update_transaction(
     id: Optional[int] = None,
@@ -363,12 +575,13 @@ def update_transaction(
                 f"""
                 SELECT t.id
                 FROM transactions t
-                WHERE (t.source_text ILIKE %s OR t.description ILIKE %s)
-                  AND {_local_date_filter_sql("t.occurred_at")}
+                WHERE t.user_id = %s
+                  AND (t.source_text ILIKE %s OR t.description ILIKE %s)
+                  AND {_local_range_filter_sql("t.occurred_at")}
                 ORDER BY t.occurred_at DESC
                 LIMIT 1;
                 """,
-                (f"%{match_text}%", f"%{match_text}%", date_local)
+                (get_user_id(), f"%{match_text}%", f"%{match_text}%", date_local, date_local)
             )
             row = cur.fetchone()
             if not row:
@@ -404,26 +617,30 @@ def update_transaction(
         if not sets:
             return {"status": "error", "message": "Nenhum campo válido para atualizar."}
  
-        params.append(target_id)
+        params.extend([target_id, get_user_id()])
  
         cur.execute(
-            f"UPDATE transactions SET {', '.join(sets)} WHERE id = %s;",
+            f"UPDATE transactions SET {', '.join(sets)} WHERE id = %s AND user_id = %s;",
             params
         )
         rows_affected = cur.rowcount
+        if not rows_affected:
+            conn.rollback()
+            return {"status": "error", "message": "Transação não encontrada."}
         conn.commit()
  
         cur.execute(
             """
             SELECT
               t.id, t.occurred_at, t.amount, tt.type AS type_name,
-              c.name AS category_name, t.description, t.payment_method, t.source_text
+              c.name AS category_name, t.description, t.payment_method, t.source_text,
+              t.type, t.category_id
             FROM transactions t
             JOIN transaction_types tt ON tt.id = t.type
             LEFT JOIN categories c ON c.id = t.category_id
-            WHERE t.id = %s;
+            WHERE t.id = %s AND t.user_id = %s;
             """,
-            (target_id,)
+            (target_id, get_user_id())
         )
         r = cur.fetchone()
         updated = None
@@ -438,6 +655,7 @@ def update_transaction(
                 "payment_method": r[6],
                 "source_text": r[7],
             }
+            ledger_snapshot.apply_committed((r[0], r[1], float(r[2]), r[8], r[9], r[5], r[6], r[7]))
  
         return {
             "status": "ok",
@@ -456,6 +674,106 @@ def update_transaction(
         except Exception:
             pass
 
+def _run_bound(conn, steps):
+    """
+    Executa (índice, tool, args) em sequência numa mesma conexão; cada worker tem a sua.
+    Cada consulta roda num SAVEPOINT: um SQL que falha é desfeito só até ali, e a transação do snapshot
+    segue válida para as próximas consultas do worker (as tools de leitura nunca fazem rollback/commit).
+    """
+    token = _bound_conn.set(conn)
+    cur = conn.cursor()
+    try:
+        outputs = []
+        for i, sub_tool, args in steps:
+            cur.execute("SAVEPOINT sq;")
+            try:
+                out = sub_tool.invoke(args)
+            except Exception as e:
+                # Argumentos inválidos numa consulta não invalidam as demais
+                out = {"status": "error", "message": str(e)}
+            if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                cur.execute("ROLLBACK TO SAVEPOINT sq;")
+            cur.execute("RELEASE SAVEPOINT sq;")
+            outputs.append((i, out))
+        return outputs
+    finally:
+        cur.close()
+        _bound_conn.reset(token)
+
+def _open_snapshot_conn(snapshot_id: str):
+    conn = psycopg2.connect(shard_router.dsn_for(get_user_id()))
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+    cur.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot_id,))
+    cur.close()
+    return conn
+
+def _batch_readers() -> dict:
+    """Tools aceitas por batch_query: as de leitura daqui, as de analytics e as de agenda que não escrevem."""
+    # Importados aqui: analytics e agenda_tools importam pg_tools
+    from analytics import ANALYTICS_TOOLS
+    from agenda_tools import READ_ONLY_AGENDA_TOOLS
+
+    tools = READ_ONLY_TOOLS + ANALYTICS_TOOLS + READ_ONLY_AGENDA_TOOLS
+    return {t.name: t for t in tools if t.name != "batch_query"}
+
+@tool("batch_query", args_schema=BatchQueryArgs)
+def batch_query(queries: List[SubQuery]) -> dict:
+    """
+    Executa várias consultas de leitura de uma vez (ex.: lançamentos do período + total de despesas + saldo,
+    financial_health, list_events ou find_free_slots), todas sobre a mesma fotografia do banco, e devolve os
+    resultados na ordem pedida. Prefira esta tool a chamar as tools de consulta uma a uma.
+    """
+    readers = _batch_readers()
+    plan = []
+    for q in queries[:BATCH_QUERY_MAX_QUERIES]:
+        q = q if isinstance(q, SubQuery) else SubQuery(**q)
+        if q.tool not in readers:
+            return {"status": "error", "message": f"Tool '{q.tool}' não é de consulta. Use: {', '.join(readers)}."}
+        try:
+            args = json.loads(q.args_json or "{}")
+        except json.JSONDecodeError as e:
+            return {"status": "error", "message": f"args_json inválido para {q.tool}: {e}"}
+        plan.append((q.tool, readers[q.tool], args))
+    if not plan:
+        return {"status": "error", "message": "Nenhuma consulta informada."}
+
+    conn = get_conn()
+    cur = conn.cursor()
+    workers = []
+    try:
+        # Uma transação REPEATABLE READ exporta o snapshot; as demais conexões o importam e rodam em paralelo
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+        cur.execute("SELECT pg_export_snapshot();")
+        snapshot_id = cur.fetchone()[0]
+        n_workers = max(1, min(BATCH_QUERY_MAX_WORKERS, len(plan)))
+        workers = [conn] + [_open_snapshot_conn(snapshot_id) for _ in range(n_workers - 1)]
+
+        steps = [(i, sub_tool, args) for i, (_, sub_tool, args) in enumerate(plan)]
+        outputs = [None] * len(plan)
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            futures = [
+                pool.submit(copy_context().run, _run_bound, worker, steps[w::n_workers])
+                for w, worker in enumerate(workers)
+            ]
+            for f in futures:
+                for i, out in f.result():
+                    outputs[i] = out
+        return {"results": [{"tool": name, "result": out} for (name, _, _), out in zip(plan, outputs)]}
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        cur.close()
+        for worker in workers[1:]:
+            try:
+                worker.rollback()
+            except Exception:
+                pass
+            close_conn(worker)
+        conn.rollback()
+        close_conn(conn)
+
 TOOLS = [
     add_transaction,
     query_transactions,
@@ -464,5 +782,19 @@ TOOLS = [
     daily_balance,
     in_time_interval_balance,
     in_time_interval_income,
-    in_time_interval_expenses
+    in_time_interval_expenses,
+    spending_breakdown,
+    batch_query
+]
+
+# Só consultas: seguras para execução especulativa (podem ser canceladas sem efeito colateral)
+READ_ONLY_TOOLS = [
+    query_transactions,
+    total_balance,
+    daily_balance,
+    in_time_interval_balance,
+    in_time_interval_income,
+    in_time_interval_expenses,
+    spending_breakdown,
+    batch_query
 ]
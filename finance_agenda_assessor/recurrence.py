@@ -0,0 +1,154 @@
+import calendar
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("America/Sao_Paulo")
+
+FREQS = ("DAILY", "WEEKLY", "MONTHLY")
+
+
+class Series(NamedTuple):
+    id: int
+    title: str
+    dtstart: datetime
+    duration: timedelta
+    freq: str
+    freq_interval: int = 1
+    by_weekday: Optional[Sequence[int]] = None  # 0=segunda ... 6=domingo (apenas WEEKLY)
+    until: Optional[datetime] = None
+    count: Optional[int] = None
+    location: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class SeriesException(NamedTuple):
+    original_start: datetime
+    cancelled: bool = False
+    new_start: Optional[datetime] = None
+    new_end: Optional[datetime] = None
+    title: Optional[str] = None
+
+
+class Occurrence(NamedTuple):
+    start: datetime
+    end: datetime
+    series_id: int
+    original_start: datetime
+    title: str
+    location: Optional[str] = None
+    notes: Optional[str] = None
+
+
+def _at_local(d: date, s: Series) -> datetime:
+    # Ocorrências mantêm o horário de parede local da primeira, não o deslocamento UTC
+    local = s.dtstart.astimezone(TZ)
+    return datetime.combine(d, local.timetz().replace(tzinfo=None), tzinfo=TZ)
+
+
+def _add_months(d: date, months: int, day: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    y += d.year
+    # "todo dia 31" cai no último dia dos meses mais curtos
+    return date(y, m + 1, min(day, calendar.monthrange(y, m + 1)[1]))
+
+
+def _candidate_starts(s: Series, first_day: date) -> Iterator[tuple]:
+    """Gera (índice_da_ocorrência, início) em ordem, a partir do primeiro período que pode tocar first_day."""
+    start_day = s.dtstart.astimezone(TZ).date()
+    step = max(1, s.freq_interval)
+    offset_days = max(0, (first_day - start_day).days)
+
+    if s.freq == "DAILY":
+        k = offset_days // step
+        while True:
+            yield k, _at_local(start_day + timedelta(days=k * step), s)
+            k += 1
+
+    elif s.freq == "WEEKLY":
+        weekdays = sorted(set(s.by_weekday or [start_day.weekday()]))
+        anchor = start_day - timedelta(days=start_day.weekday())
+        skipped = sum(1 for wd in weekdays if wd < start_day.weekday())
+        wk = offset_days // (7 * step)
+        while True:
+            for pos, wd in enumerate(weekdays):
+                d = anchor + timedelta(days=wk * 7 * step + wd)
+                if d >= start_day:
+                    yield wk * len(weekdays) + pos - skipped, _at_local(d, s)
+            wk += 1
+
+    elif s.freq == "MONTHLY":
+        months = (first_day.year - start_day.year) * 12 + first_day.month - start_day.month
+        k = max(0, months // step)
+        while True:
+            yield k, _at_local(_add_months(start_day, k * step, start_day.day), s)
+            k += 1
+
+    else:
+        raise ValueError(f"freq inválida: {s.freq} (use {', '.join(FREQS)})")
+
+
+def expand_series(
+    s: Series,
+    window_start: datetime,
+    window_end: datetime,
+    exceptions: Optional[Dict[datetime, SeriesException]] = None,
+) -> Iterator[Occurrence]:
+    """
+    Gera preguiçosamente, em ordem de início, as ocorrências da série que sobrepõem [window_start, window_end).
+
+    A expansão salta direto para o período da janela (não percorre a série desde dtstart) e para
+    assim que passa de window_end, de until ou de count. Ocorrências com exceção são omitidas aqui;
+    as remarcadas são emitidas por expand_moved.
+    """
+    exceptions = exceptions or {}
+    # Uma ocorrência que começou antes da janela ainda pode invadi-la
+    first_day = (window_start - s.duration).astimezone(TZ).date() - timedelta(days=1)
+    for index, start in _candidate_starts(s, first_day):
+        if s.count is not None and index >= s.count:
+            return
+        if start >= window_end or (s.until is not None and start > s.until):
+            return
+        if start < s.dtstart:
+            continue
+        end = start + s.duration
+        if end <= window_start and not (start == end == window_start):
+            continue
+        if start in exceptions:
+            continue
+        yield Occurrence(start, end, s.id, start, s.title, s.location, s.notes)
+
+
+def expand_moved(
+    s: Series,
+    window_start: datetime,
+    window_end: datetime,
+    exceptions: Iterable[SeriesException],
+) -> Iterator[Occurrence]:
+    """Ocorrências remarcadas (exceções não canceladas) cujo novo horário sobrepõe a janela."""
+    moved: List[Occurrence] = []
+    for x in exceptions:
+        if x.cancelled or x.new_start is None:
+            continue
+        end = x.new_end or x.new_start + s.duration
+        if x.new_start < window_end and (end > window_start or x.new_start == end == window_start):
+            moved.append(Occurrence(x.new_start, end, s.id, x.original_start, x.title or s.title, s.location, s.notes))
+    return iter(sorted(moved))
+
+
+def occurrences_in_window(
+    series: Iterable[Series],
+    window_start: datetime,
+    window_end: datetime,
+    exceptions_by_series: Optional[Dict[int, Dict[datetime, SeriesException]]] = None,
+) -> Iterator[Occurrence]:
+    """Intercala, em ordem de início, as ocorrências de várias séries sem materializá-las."""
+    exceptions_by_series = exceptions_by_series or {}
+    streams = []
+    for s in series:
+        exc = exceptions_by_series.get(s.id, {})
+        streams.append(expand_series(s, window_start, window_end, exc))
+        if exc:
+            streams.append(expand_moved(s, window_start, window_end, exc.values()))
+    return heapq.merge(*streams, key=lambda o: o.start)
@@ -0,0 +1,358 @@
+import asyncio
+import os
+import random
+import threading
+import time as clock
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextvars import copy_context
+from typing import Any, Dict, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from errors import CircuitOpenError, is_retryable
+from llm_scheduler import estimate_tokens, scheduler
+
+# Hedge: passado o p95 das últimas chamadas, dispara uma cópia da mesma chamada e fica com a que chegar primeiro
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+# Antes de juntar LLM_HEDGE_MIN_SAMPLES latências, o gatilho é fixo
+LLM_HEDGE_DEFAULT_DELAY_S = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_S", "4.0"))
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "0.3"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# No máximo esta fração de chamadas extras (hedges), para não dobrar o consumo de cota num pico de lentidão
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S = 8.0
+# Circuito abre após N falhas seguidas (já contadas as retentativas) e fica aberto por LLM_BREAKER_RESET_S
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+# Tokens de saída reservados na fila antes de a resposta informar o consumo real
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "512"))
+
+
+class CircuitBreaker:
+    """
+    Fechado -> aberto após `failures` falhas seguidas; aberto recusa tudo por `reset_s`;
+    depois deixa passar uma chamada de teste (meio-aberto), que fecha o circuito se der certo.
+    """
+
+    def __init__(self, name: str, failures: int = LLM_BREAKER_FAILURES, reset_s: float = LLM_BREAKER_RESET_S):
+        self.name = name
+        self.failures = failures
+        self.reset_s = reset_s
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "fechado"
+            return "meio-aberto" if clock.monotonic() - self._opened_at >= self.reset_s else "aberto"
+
+    def check(self):
+        """Falha já se o circuito está aberto (sem ocupar a vez de teste do meio-aberto)."""
+        if self.state == "aberto":
+            raise CircuitOpenError(f"circuito aberto para {self.name}")
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if clock.monotonic() - self._opened_at < self.reset_s or self._probing:
+                raise CircuitOpenError(f"circuito aberto para {self.name}")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """Chamada sem veredito sobre o modelo (ex.: erro de entrada): libera a vez de teste sem mudar o estado."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._probing or self._consecutive >= self.failures:
+                self._opened_at = clock.monotonic()
+            self._probing = False
+
+
+class LlmCallStats:
+    """Chamadas, latências, hedges disparados/vencidos, retentativas e rejeições do circuito, por modelo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def add(self, name: str, counter: str, n: int = 1):
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[counter] = counters.get(counter, 0) + n
+
+    def count(self, name: str, counter: str) -> int:
+        with self._lock:
+            return self._counters.get(name, {}).get(counter, 0)
+
+    def record_latency(self, name: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def quantile(self, name: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            names = sorted(set(self._counters) | set(self._latencies))
+            counters = {name: dict(self._counters.get(name, {})) for name in names}
+        out = {}
+        for name in names:
+            c = counters[name]
+            p95 = self.quantile(name, 0.95)
+            out[name] = {
+                "chamadas": c.get("chamadas", 0),
+                "hedges_disparados": c.get("hedges_disparados", 0),
+                "hedges_vencidos": c.get("hedges_vencidos", 0),
+                "retentativas": c.get("retentativas", 0),
+                "falhas": c.get("falhas", 0),
+                "rejeitadas_circuito": c.get("rejeitadas_circuito", 0),
+                "p95_ms": round(p95 * 1e3, 1) if p95 is not None else None,
+                "circuito": self.breaker(name.split("+")[0]).state,
+            }
+        return out
+
+
+llm_stats = LlmCallStats()
+
+
+def _in_thread(call) -> Future:
+    """
+    Roda call numa thread própria, com o contexto do chamador. Sem pool compartilhado: a concorrência das
+    chamadas síncronas fica só a cargo do llm_scheduler, e nenhuma espera vaga (o que comeria o prazo do hedge).
+    """
+    future: Future = Future()
+    context = copy_context()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(call))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-call", daemon=True).start()
+    return future
+
+
+def _prompt_chars(input: Any) -> int:
+    if hasattr(input, "to_messages"):
+        input = input.to_messages()
+    if isinstance(input, (list, tuple)):
+        return sum(len(str(getattr(m, "content", m))) for m in input)
+    return len(str(input))
+
+
+def _used_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class ResilientLLM(Runnable):
+    """
+    Envolve um chat model com fila de cota, hedge, retentativas e circuit breaker.
+
+    - Fila: cada tentativa espera a vez no llm_scheduler (cota de requisições/tokens do modelo, prioridade
+      e rodízio entre sessões) em vez de tomar 429.
+    - Hedge: se a chamada passa do p95 recente daquele modelo, uma cópia é disparada e vale a primeira
+      resposta (a outra é cancelada); limitado a LLM_HEDGE_BUDGET das chamadas e só com cota sobrando
+      (o hedge nunca entra na fila).
+    - Retentativas: erros transitórios (429, 503, timeout) são repetidos com backoff exponencial e jitter.
+    - Circuit breaker, compartilhado por todas as variantes do mesmo modelo (com e sem tools): aberto,
+      a chamada falha na hora com CircuitOpenError, e o fluxo pode degradar (resposta só com o FAQ).
+
+    `bind_tools` devolve outro ResilientLLM, então serve para create_tool_calling_agent.
+    """
+
+    def __init__(self, model: Runnable, name: str, breaker_name: Optional[str] = None):
+        self.model = model
+        self.name = name
+        self.breaker = llm_stats.breaker(breaker_name or name)
+
+    def bind_tools(self, tools, **kwargs) -> "ResilientLLM":
+        return ResilientLLM(self.model.bind_tools(tools, **kwargs), f"{self.name}+tools", self.breaker.name)
+
+    @property
+    def InputType(self):
+        return self.model.InputType
+
+    @property
+    def OutputType(self):
+        return self.model.OutputType
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not LLM_HEDGE_ENABLED or self.breaker.state != "fechado":
+            return None
+        calls = llm_stats.count(self.name, "chamadas")
+        if llm_stats.count(self.name, "hedges_disparados") >= LLM_HEDGE_BUDGET * calls + 1:
+            return None
+        p = llm_stats.quantile(self.name, LLM_HEDGE_QUANTILE)
+        return LLM_HEDGE_DEFAULT_DELAY_S if p is None else max(p, LLM_HEDGE_MIN_DELAY_S)
+
+    @property
+    def model_name(self) -> str:
+        return self.breaker.name
+
+    def _estimate(self, input: Any) -> int:
+        return estimate_tokens(_prompt_chars(input)) + LLM_OUTPUT_TOKENS_ESTIMATE
+
+    def _settle(self, estimated: int, result: Any) -> Any:
+        scheduler.settle(self.model_name, estimated, _used_tokens(result))
+        return result
+
+    def _backoff(self, attempt: int) -> float:
+        return min(LLM_BACKOFF_MAX_S, LLM_BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _before(self, probe: bool = True):
+        """Com probe=False só confere o circuito (antes da fila); com probe=True a chamada vai sair."""
+        try:
+            self.breaker.before_call() if probe else self.breaker.check()
+        except CircuitOpenError:
+            llm_stats.add(self.name, "rejeitadas_circuito")
+            raise
+        if probe:
+            llm_stats.add(self.name, "chamadas")
+
+    def _after(self, error: Optional[Exception]):
+        if error is None:
+            self.breaker.record_success()
+            return
+        llm_stats.add(self.name, "falhas")
+        # Erro de entrada (prompt inválido etc.) não diz nada sobre a saúde do modelo
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release_probe()
+
+    def _timed(self, call):
+        started = clock.perf_counter()
+        result = call()
+        llm_stats.record_latency(self.name, clock.perf_counter() - started)
+        return result
+
+    def _hedged(self, input: Any, config: Optional[RunnableConfig], estimated: int, **kwargs):
+        call = lambda: self._settle(estimated, self._timed(lambda: self.model.invoke(input, config, **kwargs)))
+        delay = self._hedge_delay()
+        if delay is None:
+            return call()
+        # A primária não pode rodar na thread do chamador: se o hedge vencer, o chamador precisa voltar já
+        primary = _in_thread(call)
+        done, _ = wait([primary], timeout=delay)
+        if done or not scheduler.try_acquire(self.model_name, estimated):
+            return primary.result()
+        llm_stats.add(self.name, "hedges_disparados")
+        hedge = _in_thread(call)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is hedge:
+                        llm_stats.add(self.name, "hedges_vencidos")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, input: Any, config: Optional[RunnableConfig], estimated: int, **kwargs):
+        async def call():
+            started = clock.perf_counter()
+            result = await self.model.ainvoke(input, config, **kwargs)
+            llm_stats.record_latency(self.name, clock.perf_counter() - started)
+            return self._settle(estimated, result)
+
+        delay = self._hedge_delay()
+        if delay is None:
+            return await call()
+        primary = asyncio.ensure_future(call())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not scheduler.try_acquire(self.model_name, estimated):
+            return await primary
+        llm_stats.add(self.name, "hedges_disparados")
+        hedge = asyncio.ensure_future(call())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            llm_stats.add(self.name, "hedges_vencidos")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        estimated = self._estimate(input)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            self._before(probe=False)
+            scheduler.acquire(self.model_name, estimated)
+            self._before()
+            try:
+                result = self._hedged(input, config, estimated, **kwargs)
+            except Exception as e:
+                self._after(e)
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                llm_stats.add(self.name, "retentativas")
+                clock.sleep(self._backoff(attempt))
+                continue
+            self._after(None)
+            return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        estimated = self._estimate(input)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            self._before(probe=False)
+            await scheduler.aacquire(self.model_name, estimated)
+            self._before()
+            try:
+                result = await self._ahedged(input, config, estimated, **kwargs)
+            except Exception as e:
+                self._after(e)
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                llm_stats.add(self.name, "retentativas")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._after(None)
+            return result
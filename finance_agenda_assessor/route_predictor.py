@@ -0,0 +1,106 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, NamedTuple, Optional
+
+# Radicais (sem acento) que indicam cada domínio; comparados por prefixo com os tokens da mensagem
+FINANCE_STEMS = (
+    "gast", "pague", "pagu", "pagament", "pagar", "receb", "salari", "saldo", "despes", "receit", "dinheir",
+    "cartao", "pix", "debito", "credito", "transac", "orcament", "compr", "mercado", "reais", "invest",
+    "economi", "fatura", "boleto", "categori", "financ", "extrato", "lancament",
+)
+AGENDA_STEMS = (
+    "agend", "reuni", "compromiss", "event", "marc", "horari", "calendari", "aula", "treino", "livre",
+    "janela", "disponib", "remarc", "desmarc", "lembret", "encontr", "ocupad", "expediente",
+)
+
+# Verbos de escrita: com eles a especulação (só tools de leitura) não serviria
+IMPERATIVE_WRITE_STEMS = (
+    "registr", "lanc", "anot", "adicion", "inclu", "cria", "crie", "marc", "agend", "remarc", "cancel",
+    "desmarc", "exclu", "apag", "alter", "atualiz", "mud", "transfir", "transfer",
+)
+REPORTED_WRITE_TOKENS = {"gastei", "paguei", "recebi", "comprei", "ganhei"}
+NOT_WRITE_TOKENS = {"agenda", "agendas", "marcado", "marcada", "marcados", "marcadas", "agendado", "agendada"}
+QUESTION_TOKENS = {"quanto", "quanta", "quantos", "quantas", "qual", "quais", "quando", "tenho", "existe", "onde"}
+
+
+class RoutePrediction(NamedTuple):
+    route: Optional[str]  # "financeiro" | "agenda" | None (incerto ou misto)
+    confidence: float
+    read_only: bool
+
+
+def _tokens(text: str):
+    folded = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    return re.findall(r"[a-z0-9$]+", folded)
+
+
+def _hits(tokens, stems) -> int:
+    return sum(1 for tok in tokens if tok.startswith(stems))
+
+
+def _is_read_only(tokens) -> bool:
+    for tok in tokens:
+        if tok in NOT_WRITE_TOKENS:
+            continue
+        if tok.startswith(IMPERATIVE_WRITE_STEMS):
+            return False
+    # "quanto gastei" é consulta; "gastei 50 no mercado" é lançamento
+    if any(tok in REPORTED_WRITE_TOKENS for tok in tokens):
+        return bool(tokens) and tokens[0] in QUESTION_TOKENS
+    return True
+
+
+def predict_route(text: str) -> RoutePrediction:
+    """
+    Palpite local (sem LLM) da rota do router, por contagem de radicais de cada domínio.
+    A confiança cresce com a exclusividade e com o número de evidências: 1 termo → 0.5, 2 → 0.75, 3 → 0.875.
+    """
+    tokens = _tokens(text)
+    finance, agenda = _hits(tokens, FINANCE_STEMS), _hits(tokens, AGENDA_STEMS)
+    if finance == agenda:
+        return RoutePrediction(None, 0.0, _is_read_only(tokens))
+    route, winner = ("financeiro", finance) if finance > agenda else ("agenda", agenda)
+    confidence = winner / (finance + agenda) * (1 - 0.5 ** winner)
+    return RoutePrediction(route, confidence, _is_read_only(tokens))
+
+
+class SpeculationStats:
+    """Acertos da execução especulativa e latência economizada, por rota."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, route: str) -> Dict[str, float]:
+        return self._routes.setdefault(route, {"hits": 0, "misses": 0, "saved_ms": 0.0, "wasted_ms": 0.0})
+
+    def record_hit(self, route: str, saved_ms: float):
+        with self._lock:
+            entry = self._entry(route)
+            entry["hits"] += 1
+            entry["saved_ms"] += saved_ms
+
+    def record_miss(self, route: str, wasted_ms: float):
+        with self._lock:
+            entry = self._entry(route)
+            entry["misses"] += 1
+            entry["wasted_ms"] += wasted_ms
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for route, e in self._routes.items():
+                attempts = e["hits"] + e["misses"]
+                out[route] = {
+                    "tentativas": attempts,
+                    "acertos": e["hits"],
+                    "taxa_acerto": round(e["hits"] / attempts, 3) if attempts else 0.0,
+                    "ms_economizados_total": round(e["saved_ms"], 1),
+                    "ms_economizados_por_acerto": round(e["saved_ms"] / e["hits"], 1) if e["hits"] else 0.0,
+                    "ms_descartados": round(e["wasted_ms"], 1),
+                }
+            return out
+
+
+speculation_stats = SpeculationStats()
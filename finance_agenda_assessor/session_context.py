@@ -0,0 +1,26 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID", "default")
+
+# Sessão e usuário da conversa em andamento; as tools leem daqui em vez de receber esses ids do LLM
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+
+def get_user_id() -> str:
+    """Dono dos dados da sessão atual; fora de uma sessão, DEFAULT_USER_ID (uso local/CLI)."""
+    return current_user_id.get() or DEFAULT_USER_ID
+
+
+@contextmanager
+def bind_session(session_id: str, user_id: Optional[str] = None):
+    session_token = current_session_id.set(session_id)
+    user_token = current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        current_user_id.reset(user_token)
+        current_session_id.reset(session_token)
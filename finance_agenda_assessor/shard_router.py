@@ -0,0 +1,30 @@
+import hashlib
+import os
+from typing import List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Lista de DSNs separada por vírgula; sem ela, tudo vai para DATABASE_URL (um único shard)
+SHARD_URLS: List[str] = [
+    u.strip() for u in os.getenv("DATABASE_SHARD_URLS", "").split(",") if u.strip()
+] or [os.getenv("DATABASE_URL")]
+
+
+def _score(user_id: str, shard: int) -> int:
+    digest = hashlib.blake2b(f"{shard}:{user_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_for(user_id: str) -> int:
+    """
+    Shard do usuário por rendezvous hashing: estável entre processos e, ao acrescentar um shard,
+    só ~1/N dos usuários mudam de lugar (com hash % N quase todos mudariam).
+    """
+    if len(SHARD_URLS) == 1:
+        return 0
+    return max(range(len(SHARD_URLS)), key=lambda shard: _score(user_id, shard))
+
+
+def dsn_for(user_id: str) -> str:
+    return SHARD_URLS[shard_for(user_id)]
@@ -0,0 +1,79 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+# "flat" = IndexFlatL2 do LangChain (float32, busca exata); os demais são índices compactos derivados dele
+INDEX_TYPES = ("flat", "ivf-sq8", "hnsw-sq8", "ivf-pq")
+IVF_NPROBE = int(os.getenv("FAQ_INDEX_NPROBE", "16"))
+HNSW_M = int(os.getenv("FAQ_INDEX_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("FAQ_INDEX_EF_SEARCH", "64"))
+# Bytes por vetor no PQ; precisa dividir a dimensão (senão usa o maior divisor abaixo dele)
+PQ_BYTES = int(os.getenv("FAQ_INDEX_PQ_BYTES", "96"))
+# O k-means de 8 bits do PQ precisa de pelo menos 256 vetores de treino; abaixo disso cai para SQ8
+PQ_MIN_VECTORS = 256
+
+# Dados mapeados do arquivo, e não copiados: processos diferentes dividem as mesmas páginas.
+# IVF mapeia as listas invertidas (IO_FLAG_MMAP); os códigos de SQ/HNSW precisam de IO_FLAG_MMAP_IFC.
+# As duas flags juntas não servem para IVF. A tabela pré-calculada do IVF-PQ (nlist x M x 256 floats, privada
+# de cada processo) é pulada: custaria mais memória que os próprios códigos.
+MMAP_FLAGS = {
+    "ivf": faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_SKIP_PRECOMPUTE_TABLE,
+    "codes": getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY,
+}
+
+
+def check_type(kind: str) -> str:
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"FAQ_INDEX_TYPE inválido: {kind!r} (use {', '.join(INDEX_TYPES)}).")
+    return kind
+
+
+def filename(kind: str) -> str:
+    return f"index.{kind}.faiss"
+
+
+def factory_string(kind: str, n: int, d: int) -> str:
+    """String do faiss.index_factory; corpora pequenos demais para treinar IVF/PQ ficam em SQ8 sem partição."""
+    nlist = min(int(4 * math.sqrt(n)), n // 39)
+    if kind == "hnsw-sq8":
+        return f"HNSW{HNSW_M},SQ8"
+    if nlist < 2:
+        return "SQ8"
+    if kind == "ivf-pq" and n >= PQ_MIN_VECTORS:
+        m = max(b for b in range(1, min(PQ_BYTES, d) + 1) if d % b == 0)
+        return f"IVF{nlist},PQ{m}x8"
+    return f"IVF{nlist},SQ8"
+
+
+def build(flat: faiss.Index, kind: str) -> faiss.Index:
+    """Treina e preenche o índice compacto com os vetores do flat, na mesma ordem (as posições do docstore valem)."""
+    vectors = flat.reconstruct_n(0, flat.ntotal).astype(np.float32)
+    index = faiss.index_factory(flat.d, factory_string(kind, flat.ntotal, flat.d), faiss.METRIC_L2)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def configure(index: faiss.Index) -> faiss.Index:
+    params = faiss.ParameterSpace()
+    if isinstance(index, faiss.IndexHNSW):
+        params.set_index_parameter(index, "efSearch", HNSW_EF_SEARCH)
+    elif faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", IVF_NPROBE)
+    return index
+
+
+def write(index: faiss.Index, path: str):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, path)
+
+
+def read(path: str) -> faiss.Index:
+    with open(path, "rb") as f:
+        header = f.read(4)
+    # Índices IVF gravados pelo faiss começam com "IwXX" (ex.: "IwSq" para IVF+SQ, "IwPQ" para IVF+PQ)
+    flags = MMAP_FLAGS["ivf"] if header.startswith(b"Iw") else MMAP_FLAGS["codes"]
+    return configure(faiss.read_index(path, flags))